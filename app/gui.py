@@ -14,12 +14,29 @@ from utilities.app_utils import (
     validate_year,
     validate_kind,
 )
+from utilities.database_utils import DEFAULT_DB_PATH, ReadConnectionCache
+from utilities.cancellation import cancel_all
+
+# Lines kept in the log widget; older lines are dropped as new ones arrive
+LOG_MAX_LINES = 1000
+
+# Log messages inserted per refresh, so a burst can't stall the UI
+LOG_BATCH_SIZE = 200
 
 # Add freeze_support call at module level
 freeze_support()
 
 
-def process_year(year, kind, base_path, status_callback=None, stop_event=None):
+def process_year(
+    year,
+    kind,
+    base_path,
+    status_callback=None,
+    stop_event=None,
+    db_path=None,
+    sharded=False,
+    progress=None,
+):
     """Process a single year of patent data."""
     try:
         # Unpack stop events if provided as tuple
@@ -42,6 +59,7 @@ def process_year(year, kind, base_path, status_callback=None, stop_event=None):
             kind=kind,
             callback=status_callback,
             stop_event=thread_event,  # Only pass thread event
+            progress=progress,
         )
 
         # Check stop events after download
@@ -58,6 +76,7 @@ def process_year(year, kind, base_path, status_callback=None, stop_event=None):
                 unzip_path,
                 callback=status_callback,
                 stop_event=thread_event,  # Only pass thread event
+                progress=progress,
             ):
                 return False
 
@@ -80,6 +99,9 @@ def process_year(year, kind, base_path, status_callback=None, stop_event=None):
                 stop_event=mp_event,  # Pass MP event
                 max_workers=4,
                 year=year,
+                db_path=db_path,
+                sharded=sharded,
+                progress=progress,
             )
 
             if (thread_event and thread_event.is_set()) or (
@@ -129,6 +151,18 @@ class PatentDownloaderGUI:
         main_frame.grid_rowconfigure(11, weight=1)
         main_frame.grid_columnconfigure(0, weight=1)
 
+        # Progress of the running stages, above the log
+        progress_frame = ttk.Frame(log_frame)
+        progress_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        self.progress_bar = ttk.Progressbar(
+            progress_frame, orient=tk.HORIZONTAL, mode="determinate", maximum=100
+        )
+        self.progress_bar.pack(side=tk.TOP, fill=tk.X)
+        self.progress_var = tk.StringVar(value="Ready")
+        ttk.Label(progress_frame, textvariable=self.progress_var, justify=tk.LEFT).pack(
+            side=tk.TOP, anchor=tk.W
+        )
+
         self.log_text = tk.Text(
             log_frame, height=10, width=80, wrap=tk.WORD, bg="#ffffff", fg="#000000"
         )
@@ -212,11 +246,20 @@ class PatentDownloaderGUI:
             side=tk.LEFT, padx=5
         )
 
-        # Progress
-        # self.progress_var = tk.StringVar(value="Ready")
-        # ttk.Label(main_frame, textvariable=self.progress_var).grid(
-        #     row=4, column=0, columnspan=2, pady=10, sticky=tk.N + tk.S + tk.E + tk.W
-        # )
+        # Database location (main database, shards live next to it)
+        ttk.Label(main_frame, text="Database:").grid(
+            row=4, column=0, sticky=tk.E, pady=5
+        )
+        db_frame = ttk.Frame(main_frame)
+        db_frame.grid(row=4, column=1, sticky=tk.W)
+        self.db_path = tk.StringVar(value=DEFAULT_DB_PATH)
+        # Reused by every table view, page and export (see ReadConnectionCache)
+        self.read_connections = ReadConnectionCache()
+        ttk.Entry(db_frame, textvariable=self.db_path, width=40).pack(side=tk.LEFT)
+        self.sharded = tk.BooleanVar(value=False)
+        ttk.Checkbutton(db_frame, text="Shard by year", variable=self.sharded).pack(
+            side=tk.LEFT, padx=5
+        )
 
         # Operation Buttons - Download, Unzip, Process separately
         ttk.Button(
@@ -246,6 +289,12 @@ class PatentDownloaderGUI:
         )
         ttk.Label(concurrency_frame, text="(1-8 recommended)").pack(side=tk.LEFT)
 
+        # Detailed log: every per-file/per-batch message instead of the progress bar
+        self.verbose_log = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            concurrency_frame, text="Detailed log", variable=self.verbose_log
+        ).pack(side=tk.LEFT, padx=15)
+
         # Full Operation Button (all steps at once)
         ttk.Button(
             main_frame, text="Run Complete Process", command=self.download_patents
@@ -284,6 +333,8 @@ class PatentDownloaderGUI:
         )
 
         self.log_queue = queue.Queue()
+        self.progress_queue = queue.Queue()
+        self.progress_stages = {}  # (scope, stage): latest ProgressEvent
         self.error_occurred = False  # Track if an error has occurred
         self.stop_event = threading.Event()  # Event to signal stopping the download
         self.mp_stop_event = MPEvent()  # Event for multiprocessing operations
@@ -311,14 +362,46 @@ class PatentDownloaderGUI:
             self.error_occurred = False
         self.log_queue.put(message)
 
+    def progress_sink(self):
+        """Progress argument for the utilities: None when the detailed log is on."""
+        if self.verbose_log.get():
+            return None
+        return self.progress_queue.put
+
     def process_log_queue(self):
-        """Process log messages from the queue"""
-        while not self.log_queue.empty():
-            message = self.log_queue.get()
-            self.log_text.insert(tk.END, message + "\n")
+        """Process log messages and progress events from the queues"""
+        messages = []
+        while len(messages) < LOG_BATCH_SIZE and not self.log_queue.empty():
+            messages.append(self.log_queue.get())
+        if messages:
+            self.log_text.insert(tk.END, "\n".join(messages) + "\n")
+            line_count = int(self.log_text.index("end-1c").split(".")[0])
+            if line_count > LOG_MAX_LINES:
+                self.log_text.delete("1.0", f"{line_count - LOG_MAX_LINES + 1}.0")
             self.log_text.see(tk.END)
+
+        self.update_progress()
         self.root.after(100, self.process_log_queue)
 
+    def update_progress(self):
+        """Show the latest event of each running stage; the bar follows the newest one."""
+        latest = None
+        while not self.progress_queue.empty():
+            event = self.progress_queue.get()
+            key = (event.scope, event.stage)
+            if event.finished:
+                self.progress_stages.pop(key, None)
+            else:
+                self.progress_stages[key] = event
+            latest = event
+        if latest is None:
+            return
+
+        if latest.total:
+            self.progress_bar["value"] = 100 * latest.done / latest.total
+        lines = [event.format() for event in self.progress_stages.values()]
+        self.progress_var.set("\n".join(lines) if lines else latest.format())
+
     def toggle_year_inputs(self):
         if self.year_type.get() == "single":
             self.range_year_frame.pack_forget()
@@ -341,13 +424,11 @@ class PatentDownloaderGUI:
         self.stop_event.set()  # Signal thread operations to stop
         self.mp_stop_event.set()  # Signal multiprocessing operations to stop
 
-        # Force stop any active multiprocessing pools
-        from utilities.app_utils import PoolManager
-
-        if PoolManager._pool:
-            PoolManager._pool.terminate()
-            PoolManager._pool.join()
-            PoolManager._pool = None
+        # Cancel queued work and terminate busy workers after the grace period,
+        # off the UI thread since it waits for running tasks
+        threading.Thread(
+            target=cancel_all, kwargs={"callback": self.update_log}, daemon=True
+        ).start()
 
         def check_thread():
             if self.active_thread.is_alive():
@@ -458,6 +539,7 @@ class PatentDownloaderGUI:
                         kind=kind,
                         callback=self.update_log,
                         stop_event=self.stop_event,
+                        progress=self.progress_sink(),
                     )
 
                     if downloaded:
@@ -520,7 +602,12 @@ class PatentDownloaderGUI:
                         unzip_path = os.path.join(base_path, f"patent_{kind}s_{year}")
                         self.log_queue.put(f"Unzipping patents for year {year}")
 
-                        unzip_files(download_path, unzip_path, callback=self.update_log)
+                        unzip_files(
+                            download_path,
+                            unzip_path,
+                            callback=self.update_log,
+                            progress=self.progress_sink(),
+                        )
 
                         if os.path.exists(unzip_path):
                             self.unzipped_data[year] = unzip_path
@@ -594,6 +681,9 @@ class PatentDownloaderGUI:
                                 ),  # Pass both events
                                 max_workers=int(self.concurrent_files.get()),
                                 year=year,
+                                db_path=self.db_path.get(),
+                                sharded=self.sharded.get(),
+                                progress=self.progress_sink(),
                             )
                             self.log_queue.put(f"Processing complete for year {year}")
                             success_count += 1
@@ -758,6 +848,9 @@ class PatentDownloaderGUI:
                             self.stop_event,
                             self.mp_stop_event,
                         ),  # Pass both events
+                        db_path=self.db_path.get(),
+                        sharded=self.sharded.get(),
+                        progress=self.progress_sink(),
                     ):
                         success_count += 1
 
@@ -786,34 +879,39 @@ class PatentDownloaderGUI:
         self.active_thread = threading.Thread(target=run_download)
         self.active_thread.start()
 
+    def read_connection(self):
+        """The read connection over the database and its shards, kept between views."""
+        return self.read_connections.get(self.db_path.get())
+
     def view_database_tables(self):
         """Open a new window to view database tables."""
         try:
             # First verify database connection and tables
-            with sqlite3.connect("./db/patents.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                tables = cursor.fetchall()
-                print(f"Tables in database: {tables}")  # Debug info
-
-                # Check if patent_statistics exists and has data
-                for table in ["patent_examples", "patent_statistics"]:
-                    cursor.execute(
-                        f"SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name='{table}'"
-                    )
-                    exists = cursor.fetchone()[0] > 0
-                    print(f"Table {table} exists: {exists}")
+            conn = self.read_connection()
+            cursor = conn.cursor()
+            # Sharded databases expose their tables as temp views
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' "
+                "UNION SELECT name FROM sqlite_temp_master WHERE type='view'"
+            )
+            tables = [row[0] for row in cursor.fetchall()]
+            print(f"Tables in database: {tables}")  # Debug info
 
-                    if exists:
-                        cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                        count = cursor.fetchone()[0]
-                        print(f"Table {table} has {count} rows")
+            # Check if patent_statistics exists and has data
+            for table in ["patent_examples", "patent_statistics"]:
+                exists = table in tables
+                print(f"Table {table} exists: {exists}")
 
-                        # Show sample data
-                        if count > 0:
-                            cursor.execute(f"SELECT * FROM {table} LIMIT 1")
-                            sample = cursor.fetchone()
-                            print(f"Sample from {table}: {sample}")
+                if exists:
+                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                    count = cursor.fetchone()[0]
+                    print(f"Table {table} has {count} rows")
+
+                    # Show sample data
+                    if count > 0:
+                        cursor.execute(f"SELECT * FROM {table} LIMIT 1")
+                        sample = cursor.fetchone()
+                        print(f"Sample from {table}: {sample}")
 
             # Now create the GUI
             db_window = tk.Toplevel(self.root)
@@ -888,124 +986,120 @@ class PatentDownloaderGUI:
         )
 
         # Connect to database and fetch data
-        with sqlite3.connect("./db/patents.db") as conn:
-            cursor = conn.cursor()
+        conn = self.read_connection()
+        cursor = conn.cursor()
+
+        # Get column info and set up treeview columns
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        columns = [col[1] for col in cursor.fetchall()]
+        tree["columns"] = columns
+        tree["show"] = "headings"  # Hide the first empty column
+
+        # Configure columns with better spacing and alignment based on content type
+        for col in columns:
+            tree.heading(
+                col,
+                text=col.replace("_", " ").title(),
+                anchor="center",  # Center-align headers
+                command=lambda c=col: self.sort_treeview(tree, c, False),
+            )
 
-            # Get column info and set up treeview columns
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = [col[1] for col in cursor.fetchall()]
-            tree["columns"] = columns
-            tree["show"] = "headings"  # Hide the first empty column
-
-            # Configure columns with better spacing and alignment based on content type
-            for col in columns:
-                tree.heading(
-                    col,
-                    text=col.replace("_", " ").title(),
-                    anchor="center",  # Center-align headers
-                    command=lambda c=col: self.sort_treeview(tree, c, False),
-                )
+            # Set initial column width and alignment based on content type
+            if col in ["id", "year"]:
+                tree.column(col, width=80, anchor="center")
+            elif "percentage" in col.lower():
+                tree.column(col, width=120, anchor="center")
+            elif col in ["patent_number"]:
+                tree.column(col, width=150, anchor="w")  # Left-align
+            elif col in ["example_content", "tense_breakdown"]:
+                tree.column(col, width=400, anchor="w")  # Left-align, wider for text
+            else:
+                tree.column(col, width=200, anchor="w")  # Default width and left-align
 
-                # Set initial column width and alignment based on content type
-                if col in ["id", "year"]:
-                    tree.column(col, width=80, anchor="center")
-                elif "percentage" in col.lower():
-                    tree.column(col, width=120, anchor="center")
-                elif col in ["patent_number"]:
-                    tree.column(col, width=150, anchor="w")  # Left-align
-                elif col in ["example_content", "tense_breakdown"]:
-                    tree.column(
-                        col, width=400, anchor="w"
-                    )  # Left-align, wider for text
-                else:
-                    tree.column(
-                        col, width=200, anchor="w"
-                    )  # Default width and left-align
+            self.add_heading_tooltip(tree, col, col.replace("_", " ").title())
+
+        # Fetch and insert data with user-defined page size
+        try:
+            rows_to_display = max(1, int(self.rows_to_display.get()))
+        except ValueError:
+            rows_to_display = 10  # Default if invalid input
 
-                self.add_heading_tooltip(tree, col, col.replace("_", " ").title())
+        # Get total row count for pagination
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        total_rows = cursor.fetchone()[0]
 
-            # Fetch and insert data with user-defined page size
-            try:
-                rows_to_display = max(1, int(self.rows_to_display.get()))
-            except ValueError:
-                rows_to_display = 10  # Default if invalid input
-
-            # Get total row count for pagination
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-            total_rows = cursor.fetchone()[0]
-
-            # Initialize/update pagination state for this table
-            if table_name not in self.pagination_states:
-                self.pagination_states[table_name] = {
-                    "current_page": 0,
-                    "total_pages": max(
-                        1, (total_rows + rows_to_display - 1) // rows_to_display
-                    ),
-                    "page_size": rows_to_display,  # Store the page size
-                }
-            else:
-                # Update existing pagination state with new page size
-                self.pagination_states[table_name]["page_size"] = rows_to_display
-                self.pagination_states[table_name]["total_pages"] = max(
+        # Initialize/update pagination state for this table
+        if table_name not in self.pagination_states:
+            self.pagination_states[table_name] = {
+                "current_page": 0,
+                "total_pages": max(
                     1, (total_rows + rows_to_display - 1) // rows_to_display
-                )
-
-            # Create pagination frame
-            pagination_frame = ttk.Frame(parent_frame)
-            pagination_frame.pack(fill=tk.X, padx=5, pady=5)
-
-            # Each button captures the current tree and table_name
-            ttk.Button(
-                pagination_frame,
-                text="<<",
-                command=lambda t=tree, tn=table_name: self.change_page(tn, t, 0),
-            ).pack(side=tk.LEFT, padx=5)
-
-            ttk.Button(
-                pagination_frame,
-                text="<",
-                command=lambda t=tree, tn=table_name: self.change_page(
-                    tn, t, self.pagination_states[tn]["current_page"] - 1
                 ),
-            ).pack(side=tk.LEFT, padx=5)
-
-            # Store label in pagination state for updates
-            page_label = ttk.Label(
-                pagination_frame,
-                text=f"Page 1 of {self.pagination_states[table_name]['total_pages']}",
+                "page_size": rows_to_display,  # Store the page size
+            }
+        else:
+            # Update existing pagination state with new page size
+            self.pagination_states[table_name]["page_size"] = rows_to_display
+            self.pagination_states[table_name]["total_pages"] = max(
+                1, (total_rows + rows_to_display - 1) // rows_to_display
             )
-            page_label.pack(side=tk.LEFT, padx=5)
-            self.pagination_states[table_name]["label"] = page_label
-
-            ttk.Button(
-                pagination_frame,
-                text=">",
-                command=lambda t=tree, tn=table_name: self.change_page(
-                    tn, t, self.pagination_states[tn]["current_page"] + 1
-                ),
-            ).pack(side=tk.LEFT, padx=5)
 
-            ttk.Button(
-                pagination_frame,
-                text=">>",
-                command=lambda t=tree, tn=table_name: self.change_page(
-                    tn, t, self.pagination_states[tn]["total_pages"] - 1
-                ),
-            ).pack(side=tk.LEFT, padx=5)
+        # Create pagination frame
+        pagination_frame = ttk.Frame(parent_frame)
+        pagination_frame.pack(fill=tk.X, padx=5, pady=5)
 
-            # Add export button to pagination frame
-            ttk.Button(
-                pagination_frame,
-                text="Export to CSV",
-                command=lambda: self.export_to_csv(table_name),
-            ).pack(side=tk.RIGHT, padx=5)
+        # Each button captures the current tree and table_name
+        ttk.Button(
+            pagination_frame,
+            text="<<",
+            command=lambda t=tree, tn=table_name: self.change_page(tn, t, 0),
+        ).pack(side=tk.LEFT, padx=5)
 
-            # Load initial data
-            self.load_table_data(table_name, tree, 0, rows_to_display)
+        ttk.Button(
+            pagination_frame,
+            text="<",
+            command=lambda t=tree, tn=table_name: self.change_page(
+                tn, t, self.pagination_states[tn]["current_page"] - 1
+            ),
+        ).pack(side=tk.LEFT, padx=5)
+
+        # Store label in pagination state for updates
+        page_label = ttk.Label(
+            pagination_frame,
+            text=f"Page 1 of {self.pagination_states[table_name]['total_pages']}",
+        )
+        page_label.pack(side=tk.LEFT, padx=5)
+        self.pagination_states[table_name]["label"] = page_label
 
-            # Configure row colors
-            tree.tag_configure("oddrow", background="#F5F5F5")  # Lighter gray
-            tree.tag_configure("evenrow", background="#FFFFFF")  # White
+        ttk.Button(
+            pagination_frame,
+            text=">",
+            command=lambda t=tree, tn=table_name: self.change_page(
+                tn, t, self.pagination_states[tn]["current_page"] + 1
+            ),
+        ).pack(side=tk.LEFT, padx=5)
+
+        ttk.Button(
+            pagination_frame,
+            text=">>",
+            command=lambda t=tree, tn=table_name: self.change_page(
+                tn, t, self.pagination_states[tn]["total_pages"] - 1
+            ),
+        ).pack(side=tk.LEFT, padx=5)
+
+        # Add export button to pagination frame
+        ttk.Button(
+            pagination_frame,
+            text="Export to CSV",
+            command=lambda: self.export_to_csv(table_name),
+        ).pack(side=tk.RIGHT, padx=5)
+
+        # Load initial data
+        self.load_table_data(table_name, tree, 0, rows_to_display)
+
+        # Configure row colors
+        tree.tag_configure("oddrow", background="#F5F5F5")  # Lighter gray
+        tree.tag_configure("evenrow", background="#FFFFFF")  # White
 
     def view_full_data(self, event, tree, table_name):
         """Display full data for the selected row in a new window."""
@@ -1270,30 +1364,30 @@ class PatentDownloaderGUI:
 
         # Connect to database and fetch data
         try:
-            with sqlite3.connect("./db/patents.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    f"SELECT * FROM {table_name} LIMIT {page_size} OFFSET {offset}"
-                )
-                rows = cursor.fetchall()
-
-                # Format and insert rows with improved visual clarity
-                for i, row in enumerate(rows):
-                    # Format values based on column type
-                    formatted_row = []
-                    for val in row:
-                        if isinstance(val, (int, float)):
-                            if isinstance(val, float):
-                                formatted_row.append(f"{val:.2f}")  # Format floats
-                            else:
-                                formatted_row.append(str(val))  # Format integers
-                        elif val is None:
-                            formatted_row.append("")  # Empty string for NULL values
+            conn = self.read_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT * FROM {table_name} LIMIT {page_size} OFFSET {offset}"
+            )
+            rows = cursor.fetchall()
+
+            # Format and insert rows with improved visual clarity
+            for i, row in enumerate(rows):
+                # Format values based on column type
+                formatted_row = []
+                for val in row:
+                    if isinstance(val, (int, float)):
+                        if isinstance(val, float):
+                            formatted_row.append(f"{val:.2f}")  # Format floats
                         else:
-                            formatted_row.append(str(val))  # String values as-is
+                            formatted_row.append(str(val))  # Format integers
+                    elif val is None:
+                        formatted_row.append("")  # Empty string for NULL values
+                    else:
+                        formatted_row.append(str(val))  # String values as-is
 
-                    tag = "evenrow" if i % 2 == 0 else "oddrow"
-                    tree.insert("", tk.END, values=formatted_row, tags=(tag,))
+                tag = "evenrow" if i % 2 == 0 else "oddrow"
+                tree.insert("", tk.END, values=formatted_row, tags=(tag,))
 
             # Update page label and state
             if table_name in self.pagination_states:
@@ -1331,26 +1425,26 @@ class PatentDownloaderGUI:
             return
 
         try:
-            with sqlite3.connect("./db/patents.db") as conn:
-                cursor = conn.cursor()
+            conn = self.read_connection()
+            cursor = conn.cursor()
 
-                # Get column names
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = [col[1] for col in cursor.fetchall()]
+            # Get column names
+            cursor.execute(f"PRAGMA table_info({table_name})")
+            columns = [col[1] for col in cursor.fetchall()]
 
-                # Get all data
-                cursor.execute(f"SELECT * FROM {table_name}")
-                rows = cursor.fetchall()
+            # Get all data
+            cursor.execute(f"SELECT * FROM {table_name}")
+            rows = cursor.fetchall()
 
-                # Write to CSV
-                import csv
+            # Write to CSV
+            import csv
 
-                with open(file_path, "w", newline="", encoding="utf-8") as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(columns)  # Write header
-                    writer.writerows(rows)  # Write data
+            with open(file_path, "w", newline="", encoding="utf-8") as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(columns)  # Write header
+                writer.writerows(rows)  # Write data
 
-                self.update_log(f"Data exported successfully to {file_path}")
+            self.update_log(f"Data exported successfully to {file_path}")
 
         except Exception as e:
             self.update_log(f"Error exporting data: {str(e)}")
@@ -1366,27 +1460,27 @@ class PatentDownloaderGUI:
                 return
 
             tables = ["patent_examples", "patent_statistics"]
-            with sqlite3.connect("./db/patents.db") as conn:
-                cursor = conn.cursor()
+            conn = self.read_connection()
+            cursor = conn.cursor()
 
-                for table_name in tables:
-                    file_path = os.path.join(save_dir, f"{table_name}.csv")
+            for table_name in tables:
+                file_path = os.path.join(save_dir, f"{table_name}.csv")
 
-                    # Get column names
-                    cursor.execute(f"PRAGMA table_info({table_name})")
-                    columns = [col[1] for col in cursor.fetchall()]
+                # Get column names
+                cursor.execute(f"PRAGMA table_info({table_name})")
+                columns = [col[1] for col in cursor.fetchall()]
 
-                    # Get all data
-                    cursor.execute(f"SELECT * FROM {table_name}")
-                    rows = cursor.fetchall()
+                # Get all data
+                cursor.execute(f"SELECT * FROM {table_name}")
+                rows = cursor.fetchall()
 
-                    # Write to CSV
-                    with open(file_path, "w", newline="", encoding="utf-8") as csvfile:
-                        writer = csv.writer(csvfile)
-                        writer.writerow(columns)  # Write header
-                        writer.writerows(rows)  # Write data
+                # Write to CSV
+                with open(file_path, "w", newline="", encoding="utf-8") as csvfile:
+                    writer = csv.writer(csvfile)
+                    writer.writerow(columns)  # Write header
+                    writer.writerows(rows)  # Write data
 
-                    self.update_log(f"Exported {table_name} to {file_path}")
+                self.update_log(f"Exported {table_name} to {file_path}")
 
             self.update_log("All tables exported successfully!")
             messagebox.showinfo(
@@ -0,0 +1,252 @@
+import asyncio
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait as wait_futures
+from contextlib import contextmanager
+from typing import NamedTuple
+
+# Seconds running tasks get to finish before their worker processes are killed
+DEFAULT_GRACE_PERIOD = 2.0
+
+# How often a stop watcher checks its stop event
+WATCH_INTERVAL = 0.1
+
+
+class WorkCancelled(Exception):
+    """A task was cancelled, or its worker killed, by a stop request."""
+
+
+class CancellationReport(NamedTuple):
+    """What a cancel_all call discarded."""
+
+    executors: int = 0
+    cancelled: int = 0  # queued tasks that never started
+    finished: int = 0  # running tasks that finished within the grace period
+    interrupted: int = 0  # running tasks whose workers were killed
+    terminated: int = 0  # worker processes killed
+    elapsed: float = 0.0
+
+    def format(self):
+        return (
+            f"Stopped {self.executors} worker pool(s) in {self.elapsed:.1f}s: "
+            f"{self.cancelled} queued task(s) discarded, "
+            f"{self.finished} running task(s) finished, "
+            f"{self.interrupted} interrupted "
+            f"({self.terminated} worker process(es) terminated)"
+        )
+
+
+def _cancel_queued(executor):
+    """
+    Cancel the tasks of ``executor`` that have not started.
+
+    This reads the executors' private queues; if a Python version renames
+    them nothing is counted here and shutdown(cancel_futures=True) still
+    cancels the queued tasks.
+
+    Returns:
+        tuple: (number cancelled, futures already running in a process pool)
+    """
+    if isinstance(executor, ProcessPoolExecutor):
+        cancelled = 0
+        running = []
+        pending = getattr(executor, "_pending_work_items", None) or {}
+        for item in list(pending.values()):
+            if item.future.cancel():
+                cancelled += 1
+            elif not item.future.done():
+                running.append(item.future)
+        return cancelled, running
+
+    # A thread pool's SimpleQueue can't be inspected, only drained
+    work_queue = getattr(executor, "_work_queue", None)
+    if work_queue is None:
+        return 0, []
+    cancelled = 0
+    sentinels = 0
+    while True:
+        try:
+            item = work_queue.get_nowait()
+        except queue.Empty:
+            break
+        if item is None:
+            sentinels += 1
+        elif item.future.cancel():
+            cancelled += 1
+    for _ in range(sentinels):
+        work_queue.put(None)
+    return cancelled, []
+
+
+class ExecutorRegistry:
+    """
+    The executors that are currently running pipeline work.
+
+    Code that creates a ThreadPoolExecutor or ProcessPoolExecutor registers it
+    here (and releases it when it shuts the pool down itself); cancel_all then
+    stops all of them at once. Executors are held weakly, so a pool that is
+    garbage collected drops out on its own.
+    """
+
+    def __init__(self):
+        self._executors = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def register(self, executor, name=None):
+        """Track ``executor`` and return it."""
+        with self._lock:
+            self._executors[executor] = name or type(executor).__name__
+        return executor
+
+    def release(self, executor):
+        with self._lock:
+            self._executors.pop(executor, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._executors)
+
+    def cancel_all(self, grace_period=DEFAULT_GRACE_PERIOD, callback=None):
+        """
+        Stop every registered executor.
+
+        Queued tasks are cancelled straight away and the pools are shut down
+        without waiting. Tasks already running get ``grace_period`` seconds to
+        finish; after that the worker processes of process pools are
+        terminated, which fails their futures with BrokenProcessPool. Threads
+        cannot be killed, so running thread-pool tasks are left to finish on
+        their own. The executors are released, so a second call is a no-op.
+
+        Returns:
+            CancellationReport
+        """
+        start = time.monotonic()
+        with self._lock:
+            executors = list(self._executors.items())
+            self._executors.clear()
+
+        cancelled = 0
+        running = []
+        processes = []
+        for executor, name in executors:
+            executor_cancelled, executor_running = _cancel_queued(executor)
+            cancelled += executor_cancelled
+            running.extend(executor_running)
+            if isinstance(executor, ProcessPoolExecutor):
+                processes.extend((getattr(executor, "_processes", None) or {}).values())
+            executor.shutdown(wait=False, cancel_futures=True)
+        if callback and executors:
+            callback(
+                f"Cancelled {cancelled} queued task(s); waiting up to "
+                f"{grace_period:g}s for {len(running)} running task(s)"
+            )
+
+        deadline = start + grace_period
+        done, not_done = wait_futures(running, timeout=grace_period)
+        # Idle workers exit on their own once the shutdown sentinel arrives
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+
+        terminated = 0
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                terminated += 1
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.kill()
+                process.join(1)
+
+        report = CancellationReport(
+            executors=len(executors),
+            cancelled=cancelled,
+            finished=len(done),
+            interrupted=len(not_done),
+            terminated=terminated,
+            elapsed=time.monotonic() - start,
+        )
+        if callback and executors:
+            callback(report.format())
+        return report
+
+
+# Executors created by the pipeline, the processor and the reclassifier
+executors = ExecutorRegistry()
+
+
+def track_executor(executor, name=None):
+    """Register ``executor`` with the shared registry and return it."""
+    return executors.register(executor, name)
+
+
+def release_executor(executor):
+    executors.release(executor)
+
+
+def cancel_all(grace_period=DEFAULT_GRACE_PERIOD, callback=None):
+    """Stop every executor in the shared registry; see ExecutorRegistry.cancel_all."""
+    return executors.cancel_all(grace_period, callback)
+
+
+@contextmanager
+def cancel_when_set(
+    stop_event, grace_period=DEFAULT_GRACE_PERIOD, callback=None, registry=None
+):
+    """
+    Run cancel_all as soon as ``stop_event`` is set while the block runs.
+
+    Works with threading and multiprocessing events. The watcher thread ends
+    with the block; the report of a cancellation is available as
+    ``watcher.report`` on the yielded object (None if nothing was cancelled).
+    """
+    registry = registry or executors
+    watcher = _StopWatcher(stop_event, grace_period, callback, registry)
+    if stop_event is not None:
+        watcher.start()
+    try:
+        yield watcher
+    finally:
+        watcher.close()
+
+
+class _StopWatcher(threading.Thread):
+    def __init__(self, stop_event, grace_period, callback, registry):
+        super().__init__(name="stop-watcher", daemon=True)
+        self.stop_event = stop_event
+        self.grace_period = grace_period
+        self.callback = callback
+        self.registry = registry
+        self.report = None
+        self._closed = threading.Event()
+
+    def run(self):
+        while not self._closed.is_set():
+            if self.stop_event.wait(WATCH_INTERVAL):
+                self.report = self.registry.cancel_all(self.grace_period, self.callback)
+                return
+
+    def close(self):
+        self._closed.set()
+        if self.is_alive():
+            self.join()
+
+
+async def run_in_executor(executor, func, *args):
+    """
+    Like loop.run_in_executor, but a cancelled task raises WorkCancelled.
+
+    A future cancelled by cancel_all would otherwise surface as
+    asyncio.CancelledError and take down the awaiting coroutine with it.
+    """
+    future = executor.submit(func, *args)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        if future.done():
+            raise WorkCancelled(f"{getattr(func, '__name__', func)} was cancelled")
+        future.cancel()
+        raise
@@ -0,0 +1,324 @@
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import NamedTuple
+
+from .document_source import find_ipc_codes
+
+# Corpus files end in .corpus so the pipeline can pick them up next to weekly XML
+CORPUS_SUFFIX = ".corpus"
+
+# Uncompressed bytes of XML per chunk; one chunk is decompressed per random read
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_COMPRESSION_LEVEL = 6
+
+# Decompressed chunks each reader keeps for neighbouring lookups
+_CHUNK_CACHE_SIZE = 4
+
+# Readers each process keeps open for CorpusDocument.read
+_OPEN_CORPORA_SIZE = 2
+_open_corpora = OrderedDict()
+
+
+class CorpusDocument(NamedTuple):
+    """Location of one document inside a corpus file (cf. DocumentSlice)."""
+
+    path: str
+    chunk_id: int
+    offset: int
+    length: int
+    doc_number: str
+
+    def read(self, func):
+        """
+        Call ``func`` with a memoryview of the document's XML bytes.
+
+        Works in any process: the corpus is opened (and kept open) on first
+        use. The view is only valid during the call.
+        """
+        data = _open_corpus(self.path).chunk(self.chunk_id)
+        with memoryview(data) as whole:
+            with whole[self.offset : self.offset + self.length] as view:
+                return func(view)
+
+
+def _open_corpus(path):
+    corpus = _open_corpora.get(path)
+    if corpus is None:
+        if len(_open_corpora) >= _OPEN_CORPORA_SIZE:
+            _open_corpora.popitem(last=False)[1].close()
+        corpus = _open_corpora[path] = Corpus(path)
+    return corpus
+
+
+def is_corpus(path):
+    return path.endswith(CORPUS_SUFFIX)
+
+
+class CorpusWriter:
+    """
+    Write documents into a corpus file.
+
+    A corpus is a SQLite file holding zlib-compressed chunks of concatenated
+    XML documents and a doc-number index of (chunk, offset, length), so any
+    document can be read by decompressing a single chunk and the whole
+    corpus can be streamed chunk by chunk. ``metadata`` (e.g. year, kind,
+    source) is stored as text key/value pairs.
+
+    The file is written under a temporary name and only moved into place by
+    close(), so readers never see a partial corpus. Adding a doc number
+    again replaces the earlier document. Use as a context manager; an
+    exception discards the file.
+    """
+
+    def __init__(
+        self,
+        path,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        compression_level=DEFAULT_COMPRESSION_LEVEL,
+        metadata=None,
+    ):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.compression_level = compression_level
+        self.count = 0
+        self._tmp_path = f"{path}.{os.getpid()}.tmp"
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._conn = sqlite3.connect(self._tmp_path)
+        self._conn.executescript("""
+            PRAGMA journal_mode=OFF;
+            PRAGMA synchronous=OFF;
+            CREATE TABLE corpus_meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE corpus_chunks (
+                chunk_id INTEGER PRIMARY KEY,
+                data BLOB NOT NULL
+            );
+            CREATE TABLE corpus_documents (
+                doc_number TEXT PRIMARY KEY,
+                chunk_id INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                source TEXT
+            ) WITHOUT ROWID;
+        """)
+        if metadata:
+            self._conn.executemany(
+                "INSERT INTO corpus_meta VALUES (?, ?)",
+                [(key, str(value)) for key, value in metadata.items()],
+            )
+        self._chunk_id = 0
+        self._buffer = bytearray()
+        self._entries = []
+
+    def add(self, doc_number, xml, source=None):
+        """Append one document (str or bytes) under ``doc_number``."""
+        data = xml.encode() if isinstance(xml, str) else bytes(xml)
+        self._entries.append(
+            (doc_number, self._chunk_id, len(self._buffer), len(data), source)
+        )
+        self._buffer += data
+        self.count += 1
+        if len(self._buffer) >= self.chunk_size:
+            self._flush()
+
+    def add_all(self, documents):
+        """Add (doc_number, xml) pairs, e.g. the items of an old test dataset pickle."""
+        for doc_number, xml in documents:
+            self.add(doc_number, xml)
+
+    def _flush(self):
+        if not self._entries:
+            return
+        self._conn.execute(
+            "INSERT INTO corpus_chunks VALUES (?, ?)",
+            (self._chunk_id, zlib.compress(self._buffer, self.compression_level)),
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO corpus_documents VALUES (?, ?, ?, ?, ?)",
+            self._entries,
+        )
+        self._chunk_id += 1
+        self._buffer = bytearray()
+        self._entries = []
+
+    def close(self):
+        """Write the last chunk and move the corpus into place."""
+        if self._conn is None:
+            return
+        self._flush()
+        self._conn.commit()
+        self._conn.close()
+        self._conn = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class Corpus:
+    """
+    Read-only access to a corpus file written by CorpusWriter.
+
+    ``corpus[doc_number]`` returns one document's XML after decompressing only
+    its chunk (recent chunks are cached); iterating yields (doc_number, xml)
+    chunk by chunk, so a large evaluation set is never held in memory.
+    Corpora pickle as their path, and iter_chunks over a subset of
+    chunk_ids() lets several processes stream disjoint parts at once.
+    """
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Corpus not found: {path}")
+        self.path = path
+        self._conn = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        self._chunks = OrderedDict()
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @property
+    def metadata(self):
+        return dict(self._query("SELECT key, value FROM corpus_meta"))
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM corpus_documents")[0][0]
+
+    def __contains__(self, doc_number):
+        return bool(
+            self._query(
+                "SELECT 1 FROM corpus_documents WHERE doc_number = ?", (doc_number,)
+            )
+        )
+
+    def chunk(self, chunk_id):
+        """The decompressed bytes of one chunk."""
+        with self._lock:
+            data = self._chunks.get(chunk_id)
+            if data is not None:
+                self._chunks.move_to_end(chunk_id)
+                return data
+            row = self._conn.execute(
+                "SELECT data FROM corpus_chunks WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(chunk_id)
+            data = self._chunks[chunk_id] = zlib.decompress(row[0])
+            if len(self._chunks) > _CHUNK_CACHE_SIZE:
+                self._chunks.popitem(last=False)
+            return data
+
+    def document(self, doc_number):
+        """The CorpusDocument of ``doc_number``; KeyError if it isn't in the corpus."""
+        rows = self._query(
+            "SELECT chunk_id, offset, length FROM corpus_documents "
+            "WHERE doc_number = ?",
+            (doc_number,),
+        )
+        if not rows:
+            raise KeyError(doc_number)
+        return CorpusDocument(self.path, *rows[0], doc_number)
+
+    def get_bytes(self, doc_number):
+        document = self.document(doc_number)
+        return self.chunk(document.chunk_id)[
+            document.offset : document.offset + document.length
+        ]
+
+    def __getitem__(self, doc_number):
+        return self.get_bytes(doc_number).decode()
+
+    def get(self, doc_number, default=None):
+        try:
+            return self[doc_number]
+        except KeyError:
+            return default
+
+    def doc_numbers(self):
+        return [
+            row[0] for row in self._query("SELECT doc_number FROM corpus_documents")
+        ]
+
+    def chunk_ids(self):
+        return [row[0] for row in self._query("SELECT chunk_id FROM corpus_chunks")]
+
+    def documents(self, chunk_ids=None):
+        """CorpusDocuments in storage order, optionally of some chunks only."""
+        sql = "SELECT chunk_id, offset, length, doc_number FROM corpus_documents"
+        params = ()
+        if chunk_ids is not None:
+            chunk_ids = list(chunk_ids)
+            sql += f" WHERE chunk_id IN ({', '.join('?' * len(chunk_ids))})"
+            params = chunk_ids
+        rows = self._query(sql + " ORDER BY chunk_id, offset", params)
+        return [CorpusDocument(self.path, *row) for row in rows]
+
+    def iter_chunks(self, chunk_ids=None):
+        """Yield (doc_number, xml bytes) chunk by chunk, decompressing each once."""
+        chunk_id = None
+        data = None
+        for document in self.documents(chunk_ids):
+            if document.chunk_id != chunk_id:
+                chunk_id = document.chunk_id
+                data = self.chunk(chunk_id)
+            yield document.doc_number, data[
+                document.offset : document.offset + document.length
+            ]
+
+    def __iter__(self):
+        for doc_number, data in self.iter_chunks():
+            yield doc_number, data.decode()
+
+
+def split_corpus(path, classifications=None):
+    """
+    The documents of a corpus file, shaped like split_document_slices.
+
+    A corpus holds one version per doc number, so nothing is dropped. If
+    ``classifications`` is a dict it is filled with the IPC codes of every
+    document, reading each chunk once.
+
+    Returns:
+        (CorpusDocuments, total_documents)
+    """
+    with Corpus(path) as corpus:
+        documents = corpus.documents()
+        if classifications is not None:
+            for doc_number, data in corpus.iter_chunks():
+                classifications[doc_number] = find_ipc_codes(data)
+    return documents, len(documents)
@@ -0,0 +1,595 @@
+import asyncio
+import multiprocessing
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .database_utils import (
+    store_file_census,
+    store_patent_batch,
+    store_patent_ipc,
+    resolve_db_path,
+    kind_from_file_name,
+)
+from .nlp_processing import classify_examples, get_tier_counts, tense_statistics
+from .patent_processor import (
+    REJECT_NO_DOC_NUMBER,
+    REJECT_NO_EXAMPLES,
+    AdaptiveBatchSizer,
+    extract_patent_examples_from_slice,
+)
+from .prefilter import (
+    REJECT_NO_EXAMPLE_SECTION,
+    REJECT_SEQUENCE_LISTING,
+    REJECT_TOO_SHORT,
+)
+from .document_source import split_document_slices
+from .corpus import CORPUS_SUFFIX, Corpus, is_corpus, split_corpus
+from .utils_clean import remove_leadiong_zeros
+from .progress import STAGE_EXTRACT, STAGE_FILES, STAGE_STORE, make_reporter
+from .cancellation import release_executor, run_in_executor, track_executor
+
+# Queue sizes bound how much work is held in memory between stages. Documents
+# travel as (path, offset, length) slices, so the queues hold no XML text.
+FILE_QUEUE_SIZE = 1
+DOC_QUEUE_SIZE = 256
+RESULT_QUEUE_SIZE = 256
+WRITE_QUEUE_SIZE = 2
+
+# Number of patents with examples classified and stored together at first;
+# later batches are sized from the observed classification time
+CLASSIFY_BATCH_SIZE = 100
+
+# patent_census column counting each extraction outcome
+CENSUS_REASONS = {
+    None: "with_examples",
+    REJECT_SEQUENCE_LISTING: "sequence_listing",
+    REJECT_TOO_SHORT: "too_short",
+    REJECT_NO_EXAMPLE_SECTION: "no_examples",
+    REJECT_NO_EXAMPLES: "no_examples",
+    REJECT_NO_DOC_NUMBER: "failed",
+}
+
+
+def year_from_file_name(file_name):
+    """Return the year of an ipgYYMMDD.xml/ipaYYMMDD.xml file, or None."""
+    year_match = re.match(r"ip[ga](\d{2})\d{4}", os.path.basename(file_name))
+    if not year_match:
+        return None
+    two_digit_year = int(year_match.group(1))
+    return 2000 + two_digit_year if two_digit_year < 50 else 1900 + two_digit_year
+
+
+def _examples_size(examples):
+    """UTF-8 bytes of example text held for one patent until its batch is classified."""
+    return sum(
+        len(record.title.encode()) + len(record.content.encode()) for record in examples
+    )
+
+
+class FileState:
+    """Bookkeeping for one weekly file while its documents are in the pipeline."""
+
+    def __init__(self, index, file_name, year, kind, db_path):
+        self.index = index
+        self.file_name = file_name
+        self.year = year
+        self.kind = kind
+        self.db_path = db_path
+        self.pending = 0
+        self.split_done = False
+        self.saved = 0
+        # Document counts stored in patent_census once the file is extracted
+        self.census = Counter()
+
+
+class IngestionPipeline:
+    """
+    Continuous producer/consumer pipeline over the XML files of a folder.
+
+    Stages are connected by bounded asyncio queues:
+
+        file lister -> document splitter -> extractor pool
+            -> classifier batcher -> classifier pool -> DB writer
+
+    The splitter maps each weekly file and finds document boundaries on the raw
+    bytes; extractor workers receive DocumentSlice descriptors and map the file
+    themselves, so no XML string is pickled between processes. Corpus files
+    (``*.corpus``, see corpus.py) in the folder are read the same way, as
+    CorpusDocument descriptors.
+
+    Every stage pulls work as soon as it is free, so a single large weekly file
+    no longer stalls the other files, and the queue sizes cap how many files
+    and documents are held in memory at once. Extraction and tense
+    classification run in long-lived process pools shared by all files.
+
+    ``file_names`` restricts a run to some of the folder's files and a caller
+    may pass its own ``classify_pool`` to keep the workers warm across runs;
+    the pipeline only shuts down pools it created. Otherwise it starts one of
+    ``classify_workers`` processes (three quarters of the CPUs by default).
+    ``max_workers`` files are split and ``max_workers`` batches classified at
+    a time; the extraction pool is the ``processor``'s.
+
+    Each fully extracted file gets a ``patent_census`` row (documents,
+    duplicates dropped, documents skipped by reason, documents with
+    examples), so per-year rates have their denominators in the database.
+
+    The splitter also collects the IPC codes of every document it keeps and
+    stores them in ``patent_ipc`` before the file's documents are queued, so
+    sector reports need no second pass over the XML.
+
+    With ``progress`` (a ProgressReporter or a callable taking ProgressEvents)
+    the files/extract/store counts are reported as rate-limited events and
+    the per-file and per-batch log lines are left out of ``callback``.
+
+    Classification batches start at ``classify_batch_size`` patents and are
+    then sized by an AdaptiveBatchSizer from the time each batch took, so
+    patents with many long examples go in smaller batches; the current size
+    and latency are in ``classify_sizer.metrics`` and logged at the end.
+
+    With ``memory_governor`` (a MemoryGovernor, see memory.py) the bytes of
+    documents being extracted and of example text waiting to be stored are
+    counted against its budget; near the limit files are admitted and
+    documents dispatched only as memory frees up, and classification batches
+    shrink.
+    """
+
+    def __init__(
+        self,
+        folder_path,
+        processor,
+        callback=None,
+        max_workers=4,
+        year=None,
+        stop_event=None,
+        db_path=None,
+        sharded=False,
+        classify_batch_size=CLASSIFY_BATCH_SIZE,
+        file_names=None,
+        classify_pool=None,
+        progress=None,
+        memory_governor=None,
+        classify_workers=None,
+    ):
+        self.folder_path = folder_path
+        self.processor = processor
+        self.callback = callback
+        self.max_workers = max_workers
+        self.year = year
+        self.stop_event = stop_event
+        self.db_path = db_path
+        self.sharded = sharded
+        self.classify_batch_size = classify_batch_size
+        self.classify_sizer = AdaptiveBatchSizer(
+            classify_batch_size,
+            min_size=max(1, classify_batch_size // 10),
+            max_size=classify_batch_size * 5,
+        )
+        self.file_names = file_names
+        self.classify_pool = classify_pool
+        self.classify_workers = classify_workers or max(
+            1, (multiprocessing.cpu_count() * 3) // 4
+        )
+        self.progress = make_reporter(progress)
+        self.memory_governor = memory_governor
+        # Documents in the extraction pool; waiting for memory only helps while
+        # some are, as held example text is only freed by finishing files
+        self._extracting = 0
+
+        # Files split at the same time (the old "concurrent pipelines")
+        self.num_splitters = max(1, max_workers)
+        # Enough in-flight documents to keep the extraction pool busy
+        self.num_extractors = max(2, processor.max_workers * 2)
+        # Batches classified at the same time, one per concurrent file
+        self.num_classifiers = max(2, max_workers)
+
+        self.grand_total = 0
+        self.documents_total = 0
+        # Sum of the per-file counts stored in patent_census
+        self.census = Counter()
+
+    def _stopped(self):
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def _log(self, message):
+        if self.callback:
+            self.callback(message)
+
+    def _log_error(self, message):
+        """Errors after a stop come from cancelled work and are summed up at the end."""
+        if not self._stopped():
+            self._log(message)
+
+    def _log_detail(self, message):
+        """Per-file/per-batch messages, replaced by progress events when reported."""
+        if self.progress is None:
+            self._log(message)
+
+    def _busy(self):
+        return self._extracting > 0
+
+    def _classify_batch_size(self):
+        size = self.classify_sizer.size
+        if self.memory_governor is None:
+            return size
+        return self.memory_governor.batch_size(size)
+
+    def _release_batch(self, batch):
+        """Stop counting the example text of a batch against the memory budget."""
+        if self.memory_governor is not None:
+            self.memory_governor.release(
+                sum(_examples_size(examples) for examples in batch.values())
+            )
+
+    def _file_state(self, index, file_name):
+        file_year = self.year or year_from_file_name(file_name)
+        kind = kind_from_file_name(file_name)
+        if is_corpus(file_name):
+            with Corpus(os.path.join(self.folder_path, file_name)) as corpus:
+                metadata = corpus.metadata
+            if file_year is None and metadata.get("year"):
+                file_year = int(metadata["year"])
+            kind = metadata.get("kind", kind)
+        db_path = resolve_db_path(self.db_path, file_year, kind, self.sharded)
+        return FileState(index, file_name, file_year, kind, db_path)
+
+    async def _run_stage(self, worker, count, out_queue, out_consumers):
+        """Run ``count`` copies of a stage, then tell the next stage to finish."""
+        await asyncio.gather(*(worker() for _ in range(count)))
+        for _ in range(out_consumers):
+            await out_queue.put(None)
+
+    async def _list_files(self, file_names, file_queue):
+        for i, file_name in enumerate(file_names):
+            if self.memory_governor is not None:
+                await self.memory_governor.wait_async(
+                    "file admission", self.stop_event, busy=self._busy
+                )
+            if self._stopped():
+                break
+            self._log_detail(f"Processing file {i + 1}: {file_name}")
+            await file_queue.put(self._file_state(i, file_name))
+        for _ in range(self.num_splitters):
+            await file_queue.put(None)
+
+    async def _finish_file(self, state, result_queue):
+        if self.progress:
+            self.progress.update(STAGE_FILES, advance=1, unit="files")
+        if not self._stopped():
+            await self._store_census(state)
+        await result_queue.put(("file_done", state, None))
+
+    async def _store_census(self, state):
+        """Store the document counts of a fully extracted file."""
+        self.census.update(state.census)
+        try:
+            await run_in_executor(
+                self.thread_pool,
+                store_file_census,
+                state.file_name,
+                state.census,
+                state.db_path,
+                state.year,
+                state.kind,
+            )
+        except Exception as e:
+            self._log_error(f"Error storing census of {state.file_name}: {str(e)}")
+
+    async def _split(self, file_queue, doc_queue, result_queue):
+        while True:
+            item = await file_queue.get()
+            if item is None:
+                break
+            state = item
+            if self._stopped():
+                continue
+
+            file_path = os.path.join(self.folder_path, state.file_name)
+            classifications = {}
+            try:
+                documents, total = await run_in_executor(
+                    self.thread_pool,
+                    split_corpus if is_corpus(file_path) else split_document_slices,
+                    file_path,
+                    classifications,
+                )
+            except Exception as e:
+                self._log_error(f"Error processing {state.file_name}: {str(e)}")
+                documents = []
+            if classifications:
+                await self._store_classifications(state, classifications)
+            if documents is None:
+                self._log(f"Warning: Invalid XML structure in {state.file_name}")
+            elif not documents:
+                self._log(f"No valid XML parts found in {state.file_name}")
+            else:
+                state.census["documents"] = total
+                state.census["duplicates"] = total - len(documents)
+                self._log_detail(
+                    f"\nProcessing {len(documents)} patents from {state.file_name}"
+                )
+                self.documents_total += len(documents)
+                if self.progress:
+                    self.progress.update(
+                        STAGE_EXTRACT,
+                        total=self.documents_total,
+                        file=state.file_name,
+                        unit="docs",
+                    )
+
+            for document in documents or []:
+                if self._stopped():
+                    break
+                state.pending += 1
+                await doc_queue.put((state, document))
+
+            state.split_done = True
+            if state.pending == 0:
+                await self._finish_file(state, result_queue)
+
+    async def _store_classifications(self, state, classifications):
+        """Store the IPC codes of every document of a file, examples or not."""
+        by_patent = {
+            remove_leadiong_zeros(doc_number): codes
+            for doc_number, codes in classifications.items()
+        }
+        try:
+            stored = await run_in_executor(
+                self.thread_pool,
+                store_patent_ipc,
+                by_patent,
+                state.db_path,
+                state.year,
+            )
+        except Exception as e:
+            self._log_error(f"Error storing IPC codes of {state.file_name}: {str(e)}")
+            return
+        if not stored:
+            self._log_error(f"IPC codes of {state.file_name} were not stored")
+
+    async def _extract(self, doc_queue, result_queue):
+        while True:
+            item = await doc_queue.get()
+            if item is None:
+                break
+            state, document = item
+            result = None
+            governor = self.memory_governor
+            if governor is not None:
+                await governor.wait_async(
+                    "document extraction", self.stop_event, busy=self._busy
+                )
+            if not self._stopped():
+                if governor is not None:
+                    governor.acquire(document.length)
+                self._extracting += 1
+                try:
+                    extracted = await run_in_executor(
+                        self.processor.process_pool,
+                        extract_patent_examples_from_slice,
+                        document,
+                    )
+                    state.census[CENSUS_REASONS.get(extracted[2], "failed")] += 1
+                    result = self.processor.record(extracted)
+                except Exception as e:
+                    state.census["failed"] += 1
+                    self._log_error(f"Error processing patent: {str(e)}")
+                finally:
+                    self._extracting -= 1
+                    if governor is not None:
+                        governor.release(document.length)
+
+            if result is not None:
+                if governor is not None:
+                    # Released once the batch of this patent is classified
+                    governor.acquire(_examples_size(result[1]))
+                await result_queue.put(("result", state, result))
+            if self.progress:
+                self.progress.update(STAGE_EXTRACT, advance=1, unit="docs")
+            state.pending -= 1
+            if state.split_done and state.pending == 0:
+                await self._finish_file(state, result_queue)
+
+    async def _batch_results(self, result_queue, classify_queue):
+        batches = {}
+        while True:
+            item = await result_queue.get()
+            if item is None:
+                break
+            kind, state, result = item
+            if kind == "result":
+                doc_num, examples = result
+                batch = batches.setdefault(state.file_name, {})
+                batch[doc_num] = examples
+                if len(batch) < self._classify_batch_size():
+                    continue
+            batch = batches.pop(state.file_name, None)
+            if batch and not self._stopped():
+                await classify_queue.put((state, batch))
+            elif batch:
+                self._release_batch(batch)
+
+        for batch_file, batch in batches.items():
+            self._log(f"Dropping unfinished batch of {len(batch)} from {batch_file}")
+            self._release_batch(batch)
+
+    async def _classify(self, classify_queue, write_queue):
+        while True:
+            item = await classify_queue.get()
+            if item is None:
+                break
+            state, batch = item
+            try:
+                if self._stopped():
+                    continue
+                records = [record for records in batch.values() for record in records]
+                started = time.perf_counter()
+                try:
+                    records = await run_in_executor(
+                        self.thread_pool, classify_examples, records, self.classify_pool
+                    )
+                    self.classify_sizer.observe(
+                        len(batch),
+                        sum(_examples_size(examples) for examples in batch.values()),
+                        time.perf_counter() - started,
+                    )
+                except Exception as e:
+                    self._log_error(
+                        f"Error classifying batch from {state.file_name}: {str(e)}"
+                    )
+                    continue
+            finally:
+                self._release_batch(batch)
+            await write_queue.put((state, records, tense_statistics(records)))
+
+    async def _write(self, write_queue):
+        while True:
+            item = await write_queue.get()
+            if item is None:
+                break
+            state, records, with_tense = item
+            if self._stopped():
+                continue
+            try:
+                await run_in_executor(
+                    self.thread_pool,
+                    store_patent_batch,
+                    records,
+                    with_tense,
+                    state.db_path,
+                    state.year,
+                    state.kind,
+                )
+            except Exception as e:
+                self._log_error(f"Error storing batch from {state.file_name}: {str(e)}")
+                continue
+            state.saved += len(with_tense)
+            self.grand_total += len(with_tense)
+            self._log_detail(
+                f"Saved {len(with_tense)} patents with examples into db from {state.file_name}"
+            )
+            self._log_detail(f"Current total patents with examples: {self.grand_total}")
+            if self.progress:
+                self.progress.update(
+                    STAGE_STORE, advance=len(with_tense), unit="patents"
+                )
+
+    async def run(self):
+        """Run the pipeline over every XML file and return the patents stored."""
+        file_names = self.file_names
+        if file_names is None:
+            file_names = [
+                f
+                for f in os.listdir(self.folder_path)
+                if f.endswith((".xml", CORPUS_SUFFIX))
+            ]
+        self._log(
+            f"\nStarting parallel processing with {self.max_workers} concurrent pipelines"
+        )
+        self._log(f"Found {len(file_names)} files to process")
+        if self.progress:
+            self.progress.update(STAGE_FILES, total=len(file_names), unit="files")
+
+        file_queue = asyncio.Queue(maxsize=FILE_QUEUE_SIZE)
+        doc_queue = asyncio.Queue(maxsize=DOC_QUEUE_SIZE)
+        result_queue = asyncio.Queue(maxsize=RESULT_QUEUE_SIZE)
+        classify_queue = asyncio.Queue(maxsize=self.num_classifiers)
+        write_queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+
+        tiers_before = get_tier_counts()
+        # The processor may be reused across runs, so report this run's share
+        metrics_before = dict(self.processor.metrics)
+        self.thread_pool = track_executor(
+            ThreadPoolExecutor(
+                max_workers=self.num_splitters + self.num_classifiers + 2
+            ),
+            "pipeline threads",
+        )
+        own_classify_pool = self.classify_pool is None
+        if own_classify_pool:
+            self.classify_pool = track_executor(
+                ProcessPoolExecutor(max_workers=self.classify_workers), "classifiers"
+            )
+
+        try:
+            await asyncio.gather(
+                self._list_files(file_names, file_queue),
+                self._run_stage(
+                    lambda: self._split(file_queue, doc_queue, result_queue),
+                    self.num_splitters,
+                    doc_queue,
+                    self.num_extractors,
+                ),
+                self._run_stage(
+                    lambda: self._extract(doc_queue, result_queue),
+                    self.num_extractors,
+                    result_queue,
+                    1,
+                ),
+                self._run_stage(
+                    lambda: self._batch_results(result_queue, classify_queue),
+                    1,
+                    classify_queue,
+                    self.num_classifiers,
+                ),
+                self._run_stage(
+                    lambda: self._classify(classify_queue, write_queue),
+                    self.num_classifiers,
+                    write_queue,
+                    1,
+                ),
+                self._write(write_queue),
+            )
+        finally:
+            if own_classify_pool:
+                release_executor(self.classify_pool)
+                self.classify_pool.shutdown()
+                self.classify_pool = None
+            release_executor(self.thread_pool)
+            self.thread_pool.shutdown()
+            if self.progress:
+                for stage in (STAGE_FILES, STAGE_EXTRACT, STAGE_STORE):
+                    self.progress.finish(stage)
+
+        rejected = ", ".join(
+            f"{name[len('rejected_'):]}={count - metrics_before.get(name, 0)}"
+            for name, count in sorted(self.processor.metrics.items())
+            if name.startswith("rejected_") and count > metrics_before.get(name, 0)
+        )
+        if rejected:
+            self._log(f"Skipped documents: {rejected}")
+        if self.classify_sizer.batches:
+            self._log(f"Classification batches: {self.classify_sizer.format()}")
+        if self.memory_governor is not None:
+            self._log(self.memory_governor.summary())
+        if self.census:
+            self._log(
+                f"Census: {self.census['documents']} documents, "
+                f"{self.census['duplicates']} duplicates dropped, "
+                f"{self.census['with_examples']} with examples"
+            )
+
+        if self._stopped():
+            extracted = self.processor.metrics["documents"] - metrics_before.get(
+                "documents", 0
+            )
+            with_examples = self.processor.metrics[
+                "with_examples"
+            ] - metrics_before.get("with_examples", 0)
+            self._log(
+                f"Stopped: discarded {self.documents_total - extracted} of "
+                f"{self.documents_total} documents before extraction and "
+                f"{with_examples - self.grand_total} extracted patents before storing"
+            )
+
+        tiers = get_tier_counts()
+        resolved = ", ".join(
+            f"{tier}={count - tiers_before.get(tier, 0)}"
+            for tier, count in sorted(tiers.items(), key=lambda item: str(item[0]))
+        )
+        if resolved:
+            self._log(f"Examples resolved per tense tier: {resolved}")
+
+        return self.grand_total
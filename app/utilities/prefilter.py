@@ -0,0 +1,92 @@
+import re
+
+# Documents this short never contain a usable examples section
+MIN_DOCUMENT_LENGTH = 2000
+
+# Rejection reasons, also used as metric names
+REJECT_TOO_SHORT = "too_short"
+REJECT_NO_EXAMPLE_SECTION = "no_example_section"
+REJECT_SEQUENCE_LISTING = "sequence_listing"
+
+_SEQUENCE = (
+    r"<s\d+>[^\n]*?</s\d+>|<sequence-cwu id=\"SEQLST-0\">|<!DOCTYPE sequence-cwu"
+)
+_KEYWORDS = r"(?i:EXAMPLES|EXPERIMENTS|TESTS)"
+
+# Section headings counted as an examples section (compared without spaces)
+EXAMPLE_HEADINGS = ("EXAMPLES", "EXPERIMENTS", "TESTS")
+
+
+def _compile(pattern):
+    return re.compile(pattern), re.compile(pattern.encode())
+
+
+# One alternation finds whichever comes first: a sequence listing or an examples keyword
+_SCAN_PATTERNS = _compile(f"(?P<sequence>{_SEQUENCE})|(?P<keyword>{_KEYWORDS})")
+_SEQUENCE_PATTERNS = _compile(_SEQUENCE)
+_KEYWORD_PATTERNS = _compile(_KEYWORDS)
+_HEADING_PATTERNS = _compile(r"<heading\b[^>]*>((?s:.*?))</heading>")
+_TAG_PATTERNS = _compile(r"<[^>]*>")
+
+
+def _pattern(patterns, document):
+    return patterns[0] if isinstance(document, str) else patterns[1]
+
+
+def has_sequence_listing(document, pos=0, endpos=None):
+    """Return True if the document contains a sequence listing (stops at the first hit)."""
+    endpos = len(document) if endpos is None else endpos
+    return (
+        _pattern(_SEQUENCE_PATTERNS, document).search(document, pos, endpos) is not None
+    )
+
+
+def has_examples_heading(document, pos=0, endpos=None):
+    """
+    Return True if the document has an EXAMPLES/EXPERIMENTS/TESTS heading.
+
+    Same test as extract_experiments_w_heading (heading text, upper-cased and
+    without spaces, is one of EXAMPLE_HEADINGS) but on the raw markup, so no
+    parse tree is built. Like classify_document it accepts str and bytes-like
+    documents and a ``pos``/``endpos`` window.
+    """
+    endpos = len(document) if endpos is None else endpos
+    if _pattern(_KEYWORD_PATTERNS, document).search(document, pos, endpos) is None:
+        # No keyword anywhere, so no heading can match
+        return False
+    tags = _pattern(_TAG_PATTERNS, document)
+    for match in _pattern(_HEADING_PATTERNS, document).finditer(document, pos, endpos):
+        text = tags.sub(type(match.group(1))(), match.group(1))
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", "replace")
+        if text.strip().upper().replace(" ", "") in EXAMPLE_HEADINGS:
+            return True
+    return False
+
+
+def classify_document(document, pos=0, endpos=None):
+    """
+    Cheap pre-check deciding whether a patent document is worth parsing.
+
+    The document is scanned once: the combined pattern stops at the first
+    sequence listing or examples keyword, and after a keyword only the
+    sequence patterns are searched in the remainder. Works on ``str`` as well
+    as bytes-like documents (``bytes``, ``mmap``), and ``pos``/``endpos`` let
+    callers check one document inside a larger buffer without copying it.
+
+    Returns:
+        None if the document should be parsed, otherwise the rejection reason
+        (REJECT_TOO_SHORT, REJECT_NO_EXAMPLE_SECTION or REJECT_SEQUENCE_LISTING)
+    """
+    endpos = len(document) if endpos is None else endpos
+    if endpos - pos <= MIN_DOCUMENT_LENGTH:
+        return REJECT_TOO_SHORT
+
+    match = _pattern(_SCAN_PATTERNS, document).search(document, pos, endpos)
+    if match is None:
+        return REJECT_NO_EXAMPLE_SECTION
+    if match.lastgroup == "sequence":
+        return REJECT_SEQUENCE_LISTING
+    if has_sequence_listing(document, match.end(), endpos):
+        return REJECT_SEQUENCE_LISTING
+    return None
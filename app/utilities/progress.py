@@ -0,0 +1,197 @@
+import threading
+import time
+from typing import NamedTuple
+
+from tqdm import tqdm
+
+# Stages reported by the download/unzip/ingestion code
+STAGE_DOWNLOAD = "download"
+STAGE_UNZIP = "unzip"
+STAGE_VERIFY = "verify"
+STAGE_FILES = "files"
+STAGE_EXTRACT = "extract"
+STAGE_STORE = "store"
+
+# Seconds between two events of the same stage, like TqdmCallback.update_interval
+DEFAULT_UPDATE_INTERVAL = 0.5
+
+
+class ProgressEvent(NamedTuple):
+    """Snapshot of one stage's progress."""
+
+    stage: str
+    done: int
+    total: int = None
+    unit: str = "items"
+    file: str = None
+    rate: float = None
+    eta: float = None
+    finished: bool = False
+    scope: str = None
+
+    def format(self):
+        """One-line text form, e.g. 'extract: 1200/5000 docs (350.0/s, ETA 0:00:11)'."""
+        count = f"{self.done}/{self.total}" if self.total else str(self.done)
+        details = []
+        if self.rate:
+            details.append(f"{self.rate:.1f}/s")
+        if self.eta is not None:
+            details.append(f"ETA {format_seconds(self.eta)}")
+        stage = f"{self.scope} {self.stage}" if self.scope else self.stage
+        text = f"{stage}: {count} {self.unit}"
+        if details:
+            text += f" ({', '.join(details)})"
+        if self.file:
+            text += f" - {self.file}"
+        return text
+
+
+def format_seconds(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class _StageState:
+    def __init__(self, unit):
+        self.unit = unit
+        self.done = 0
+        self.total = None
+        self.file = None
+        self.started = time.monotonic()
+        self.last_emit = 0.0
+
+
+class ProgressReporter:
+    """
+    Aggregate progress updates and hand rate-limited ProgressEvents to a sink.
+
+    Producers call update() as often as they like (per document, per file);
+    the sink sees at most one event per stage every ``update_interval``
+    seconds. A stage ends with finish(), whose event is always sent and is
+    the only one marked ``finished`` (totals may still grow until then, e.g.
+    documents as more files are split). Rates and ETAs are computed from the
+    stage's start, once it has run for at least ``update_interval``. ``scope``
+    (e.g. the year) is copied into every event so sinks can tell concurrent
+    runs apart. Safe to call from several threads.
+    """
+
+    def __init__(self, sink, update_interval=DEFAULT_UPDATE_INTERVAL, scope=None):
+        self.sink = sink
+        self.update_interval = update_interval
+        self.scope = scope
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def update(self, stage, advance=0, done=None, total=None, file=None, unit=None):
+        """
+        Record progress for ``stage``.
+
+        Args:
+            advance: Units finished since the last call
+            done: Absolute units finished (instead of ``advance``)
+            total: Total units, when known (may grow, e.g. as files are split)
+            file: File currently being worked on
+            unit: Unit name shown with the counts
+        """
+        with self._lock:
+            state = self._stages.get(stage)
+            if state is None:
+                state = self._stages[stage] = _StageState(unit or "items")
+            elif unit:
+                state.unit = unit
+            state.done = done if done is not None else state.done + advance
+            if total is not None:
+                state.total = total
+            if file is not None:
+                state.file = file
+
+            now = time.monotonic()
+            if now - state.last_emit < self.update_interval:
+                return
+            state.last_emit = now
+            event = self._event(stage, state, now, False)
+        self.sink(event)
+
+    def finish(self, stage):
+        """Emit the final event of a stage and forget it."""
+        with self._lock:
+            state = self._stages.pop(stage, None)
+            if state is None:
+                return
+            event = self._event(stage, state, time.monotonic(), True)
+        self.sink(event)
+
+    def _event(self, stage, state, now, finished):
+        elapsed = now - state.started
+        rate = None
+        if elapsed >= self.update_interval and state.done:
+            rate = state.done / elapsed
+        eta = None
+        if rate and state.total is not None:
+            eta = max(0.0, (state.total - state.done) / rate)
+        return ProgressEvent(
+            stage,
+            state.done,
+            state.total,
+            state.unit,
+            state.file,
+            rate,
+            eta,
+            finished,
+            self.scope,
+        )
+
+
+def make_reporter(progress, update_interval=DEFAULT_UPDATE_INTERVAL, scope=None):
+    """
+    Return a ProgressReporter for a ``progress`` argument, or None.
+
+    ``progress`` may already be a reporter (shared across calls) or any
+    callable taking ProgressEvents.
+    """
+    if progress is None or isinstance(progress, ProgressReporter):
+        return progress
+    return ProgressReporter(progress, update_interval, scope)
+
+
+class TqdmProgress:
+    """Render ProgressEvents as one tqdm bar per stage (used by the CLI)."""
+
+    def __init__(self):
+        self._bars = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            self._render(event)
+
+    def _render(self, event):
+        key = (event.scope, event.stage)
+        bar = self._bars.get(key)
+        if bar is None:
+            bar = self._bars[key] = tqdm(
+                total=event.total,
+                desc=f"{event.scope} {event.stage}" if event.scope else event.stage,
+                unit=f" {event.unit}",
+                position=len(self._bars),
+                leave=True,
+            )
+        if event.total is not None and bar.total != event.total:
+            bar.total = event.total
+        bar.n = event.done
+        if event.file:
+            bar.set_postfix_str(event.file, refresh=False)
+        bar.refresh()
+        if event.finished:
+            bar.close()
+            del self._bars[key]
+
+    def write(self, message):
+        """Print a log line without breaking the bars."""
+        tqdm.write(message)
+
+    def close(self):
+        with self._lock:
+            for bar in self._bars.values():
+                bar.close()
+            self._bars.clear()
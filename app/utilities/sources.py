@@ -0,0 +1,333 @@
+import datetime
+import json
+import os
+import re
+import time
+from typing import NamedTuple
+
+import requests
+from lxml import etree
+
+from .integrity import read_chunks, write_stream
+
+USPTO_FULLTEXT_URL = (
+    "https://bulkdata.uspto.gov/data/patent/{kind}/redbook/fulltext/{year}/"
+)
+
+# Directory name of the persisted listings, next to the downloads
+LISTING_CACHE_DIR = "listing_cache"
+
+# Weekly bulk files, e.g. ipg240102.zip or a re-release ipg240102_r1.zip
+ZIP_NAME_RE = re.compile(r"(ip[ga]\d{6})(?:_r(\d+))?\.zip")
+
+# Last-modified and size columns of a directory listing row
+_LISTING_DATE_RE = re.compile(
+    r"\d{4}-\d{2}-\d{2}(?:\s+\d{2}:\d{2}(?::\d{2})?)?|\d{2}-[A-Za-z]{3}-\d{4}\s+\d{2}:\d{2}"
+)
+_LISTING_SIZE_RE = re.compile(r"(?<![\d:-])\d+(?:\.\d+)?[KMGT]?(?![\d:-])")
+
+
+def split_revision(file_name):
+    """Return (base_name, revision) of an ipgYYMMDD[_rN].zip name, or None."""
+    match = ZIP_NAME_RE.match(os.path.basename(file_name))
+    if not match:
+        return None
+    base_name, revision = match.groups()
+    return base_name, int(revision) if revision else 0
+
+
+class ListingEntry(NamedTuple):
+    """One weekly zip file of a year listing."""
+
+    file_name: str
+    base_name: str
+    revision: int
+    size: str = ""
+    last_modified: str = ""
+
+
+def listing_entry(file_name, size="", last_modified=""):
+    """Build a ListingEntry, or None if ``file_name`` is not a weekly bulk file."""
+    parsed = split_revision(file_name)
+    if parsed is None:
+        return None
+    return ListingEntry(file_name, parsed[0], parsed[1], size, last_modified)
+
+
+def parse_listing(html):
+    """
+    Parse a USPTO (Apache-style) directory listing into ListingEntries.
+
+    Size and last-modified come from the other cells of the link's table row,
+    or from the text after the link in a preformatted listing.
+    """
+    root = etree.fromstring(html, etree.HTMLParser())
+    if root is None:
+        return []
+    entries = []
+    for href in root.findall(".//a[@href]"):
+        file_name = os.path.basename(href.get("href"))
+        if not file_name.endswith(".zip"):
+            continue
+        cell = href.getparent()
+        row = cell.getparent() if cell is not None else None
+        if row is not None and row.tag == "tr":
+            details = " ".join(
+                other.xpath("string()") for other in row if other is not cell
+            )
+        else:
+            details = (href.tail or "").split("\n")[0]
+        date = _LISTING_DATE_RE.search(details)
+        remainder = _LISTING_DATE_RE.sub(" ", details)
+        size = _LISTING_SIZE_RE.search(remainder)
+        entry = listing_entry(
+            file_name,
+            size.group(0) if size else "",
+            " ".join(date.group(0).split()) if date else "",
+        )
+        if entry is not None:
+            entries.append(entry)
+    return entries
+
+
+def fulltext_url(year, kind):
+    """USPTO bulk data listing URL for one year of grants or applications."""
+    return USPTO_FULLTEXT_URL.format(year=year, kind=kind)
+
+
+def _http_date(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime(
+        "%a, %d %b %Y %H:%M:%S GMT"
+    )
+
+
+class PatentSource:
+    """
+    Where the weekly bulk zip files come from.
+
+    Sources list the zip files of one year/kind and fetch one of them into a
+    local directory; download_patents_pto and the daemon only use these
+    calls, so they run the same against the USPTO server or a mirror.
+    """
+
+    def list_files(self, year, kind):
+        """Return the .zip file names available for ``year``/``kind``."""
+        entries, _ = self.list_entries(year, kind)
+        return [entry.file_name for entry in entries]
+
+    def list_entries(self, year, kind, validators=None):
+        """
+        Return (entries, validators) for ``year``/``kind``.
+
+        ``validators`` are what a previous call returned (e.g. ETag and
+        Last-Modified); when the listing has not changed since then, entries
+        is None. Sources without validators always return the full listing.
+        """
+        raise NotImplementedError
+
+    def fetch(self, year, kind, file_name, download_path, stop_event=None):
+        """
+        Copy ``file_name`` into ``download_path``.
+
+        Returns:
+            FetchResult with the size and sha256 measured while writing
+
+        Raises:
+            IntegrityError: If fewer bytes arrived than the source announced
+        """
+        raise NotImplementedError
+
+
+class HttpSource(PatentSource):
+    """The USPTO bulk data server (or anything serving the same listing pages)."""
+
+    def __init__(self, url_template=USPTO_FULLTEXT_URL, timeout=10, chunk_size=8192):
+        self.url_template = url_template
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+
+    def __str__(self):
+        return "USPTO server"
+
+    def listing_url(self, year, kind):
+        return self.url_template.format(year=year, kind=kind)
+
+    def list_entries(self, year, kind, validators=None):
+        headers = {}
+        validators = validators or {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        rp = requests.get(
+            self.listing_url(year, kind), headers=headers, timeout=self.timeout
+        )
+        if rp.status_code == 304:
+            return None, validators
+        rp.raise_for_status()
+        validators = {
+            "etag": rp.headers.get("ETag"),
+            "last_modified": rp.headers.get("Last-Modified"),
+        }
+        return parse_listing(rp.content), validators
+
+    def fetch(self, year, kind, file_name, download_path, stop_event=None):
+        os.makedirs(download_path, exist_ok=True)
+        response = requests.get(
+            self.listing_url(year, kind) + file_name, stream=True, timeout=self.timeout
+        )
+        with response:
+            response.raise_for_status()
+            # Content-Length is the encoded size, so only trust it for identity bodies
+            expected_size = response.headers.get("Content-Length")
+            if expected_size is not None and not response.headers.get(
+                "Content-Encoding"
+            ):
+                expected_size = int(expected_size)
+            else:
+                expected_size = None
+            return write_stream(
+                response.iter_content(chunk_size=self.chunk_size),
+                os.path.join(download_path, file_name),
+                expected_size,
+            )
+
+
+class LocalDirectorySource(PatentSource):
+    """
+    Bulk files pre-staged on a local disk or network share.
+
+    The year directory is the first that exists of
+    ``<root>/<kind>/redbook/fulltext/<year>`` (a mirror of the USPTO layout),
+    ``<root>/<kind>/<year>`` and ``<root>/<year>``.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def __str__(self):
+        return f"mirror {self.root}"
+
+    def year_dir(self, year, kind):
+        candidates = [
+            os.path.join(self.root, kind, "redbook", "fulltext", str(year)),
+            os.path.join(self.root, kind, str(year)),
+            os.path.join(self.root, str(year)),
+        ]
+        for candidate in candidates:
+            if os.path.isdir(candidate):
+                return candidate
+        return None
+
+    def list_entries(self, year, kind, validators=None):
+        year_dir = self.year_dir(year, kind)
+        if year_dir is None:
+            return [], {}
+        # The directory mtime changes whenever a file is added or removed
+        last_modified = _http_date(os.path.getmtime(year_dir))
+        if validators and validators.get("last_modified") == last_modified:
+            return None, validators
+
+        entries = []
+        for file_name in sorted(os.listdir(year_dir)):
+            if not file_name.endswith(".zip"):
+                continue
+            stat = os.stat(os.path.join(year_dir, file_name))
+            entry = listing_entry(
+                file_name, str(stat.st_size), _http_date(stat.st_mtime)
+            )
+            if entry is not None:
+                entries.append(entry)
+        return entries, {"last_modified": last_modified}
+
+    def fetch(self, year, kind, file_name, download_path, stop_event=None):
+        year_dir = self.year_dir(year, kind)
+        if year_dir is None:
+            raise FileNotFoundError(f"No {kind} {year} directory under {self.root}")
+        os.makedirs(download_path, exist_ok=True)
+        source_path = os.path.join(year_dir, file_name)
+        with open(source_path, "rb") as f:
+            return write_stream(
+                read_chunks(f),
+                os.path.join(download_path, file_name),
+                os.fstat(f.fileno()).st_size,
+            )
+
+
+class CachedListingSource(PatentSource):
+    """
+    Wrap another source and persist its parsed listings in ``cache_dir``.
+
+    Each year/kind is kept in ``<kind>_<year>.json`` with its entries (file,
+    base name, revision, size, last-modified) and the validators the source
+    returned. Within ``max_age`` seconds of the last check the cache is used
+    as is; after that the source is asked again with the validators
+    (If-None-Match/If-Modified-Since for HTTP), so an unchanged listing costs
+    one 304 response and no parsing. ``max_age=None`` never revalidates.
+    Fetches always go to the wrapped source.
+    """
+
+    def __init__(self, source, cache_dir, max_age=0):
+        self.source = source
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+
+    def __str__(self):
+        return str(self.source)
+
+    def cache_path(self, year, kind):
+        return os.path.join(self.cache_dir, f"{kind}_{year}.json")
+
+    def _load(self, year, kind):
+        try:
+            with open(self.cache_path(year, kind)) as f:
+                cached = json.load(f)
+            return {
+                "checked_at": cached["checked_at"],
+                "validators": cached.get("validators") or {},
+                "entries": [ListingEntry(*entry) for entry in cached["entries"]],
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save(self, year, kind, entries, validators):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_path = self.cache_path(year, kind)
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "checked_at": time.time(),
+                    "validators": validators,
+                    "entries": [list(entry) for entry in entries],
+                },
+                f,
+            )
+        os.replace(tmp_path, cache_path)
+
+    def list_entries(self, year, kind, validators=None):
+        cached = self._load(year, kind)
+        if cached is not None and (
+            self.max_age is None or time.time() - cached["checked_at"] < self.max_age
+        ):
+            return cached["entries"], cached["validators"]
+
+        entries, new_validators = self.source.list_entries(
+            year, kind, cached["validators"] if cached else None
+        )
+        if entries is None:
+            # Not modified: keep the parsed entries, only move the check time
+            entries = cached["entries"]
+        self._save(year, kind, entries, new_validators)
+        return entries, new_validators
+
+    def refresh(self, year, kind):
+        """Drop the cached listing so the next call asks the source in full."""
+        try:
+            os.remove(self.cache_path(year, kind))
+        except FileNotFoundError:
+            pass
+
+    def fetch(self, year, kind, file_name, download_path, stop_event=None):
+        return self.source.fetch(year, kind, file_name, download_path, stop_event)
@@ -0,0 +1,314 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from utilities.cancellation import release_executor, track_executor
+from utilities.corpus import Corpus
+from utilities.nlp_processing import (
+    classify_examples,
+    get_tier_counts,
+    tense_statistics,
+)
+from utilities.patent_processor import extract_patent_examples_from_slice
+from utilities.test_dataset_utils import FREILICH_DEFAULT_PATH, load_freilich
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# # Evaluate extraction and tense classification on a test dataset built by test_dataset_creator.py
+# python evaluate_classifier.py --corpus test_dataset_2015.corpus --freilich-path Freilich.Data.Compressed.xlsb
+
+# # Same run with 8 extraction workers, written to a report for later comparison
+# python evaluate_classifier.py --corpus test_dataset_2015.corpus --workers 8 --output eval_8_workers.json
+
+# Our tenses and the Freilich label each is scored against
+TENSE_LABELS = {"present": "prophetic", "past": "nonprophetic"}
+
+# Documents handed to an extraction worker at a time
+EXTRACT_CHUNK_SIZE = 16
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process and of its largest finished child, in MB.
+
+    None where the resource module is missing (Windows).
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1
+        ),
+    }
+
+
+def run_extraction_and_classification(documents, workers, classify_workers):
+    """
+    Extract and classify the examples of ``documents`` like the ingestion pipeline.
+
+    Returns:
+        (tense_statistics DataFrame, dict of counts and stage timings)
+    """
+    rejected = Counter()
+    records = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        track_executor(executor, "evaluation extractors")
+        try:
+            for doc_num, examples, reason in executor.map(
+                extract_patent_examples_from_slice,
+                documents,
+                chunksize=EXTRACT_CHUNK_SIZE,
+            ):
+                if reason:
+                    rejected[reason] += 1
+                else:
+                    records.extend(examples)
+        finally:
+            release_executor(executor)
+    extract_seconds = time.perf_counter() - start
+
+    tiers_before = get_tier_counts()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=classify_workers) as executor:
+        track_executor(executor, "evaluation classifiers")
+        try:
+            records = classify_examples(records, executor)
+        finally:
+            release_executor(executor)
+    classify_seconds = time.perf_counter() - start
+    tiers = get_tier_counts()
+
+    stats = tense_statistics(records)
+    return stats, {
+        "documents": len(documents),
+        "patents_with_examples": len(stats),
+        "examples": len(records),
+        "rejected": dict(rejected),
+        "resolved_by": {
+            str(tier): count - tiers_before.get(tier, 0)
+            for tier, count in tiers.items()
+        },
+        "extract_seconds": extract_seconds,
+        "classify_seconds": classify_seconds,
+    }
+
+
+def score(predicted, labels):
+    """
+    Compare per-patent example counts with the Freilich labels.
+
+    Freilich labels are counts per patent, not per example, so precision
+    and recall are count-based: for each patent min(predicted, labelled) of a
+    tense counts as correct, precision divides the correct sum by all
+    predicted and recall by all labelled examples of that tense.
+
+    Args:
+        predicted: DataFrame indexed by patent number with our tense counts
+        labels: DataFrame indexed by patent number with the label columns
+
+    Returns:
+        dict: Per-tense metrics and patent-level agreement
+    """
+    joined = labels.join(predicted, how="left").fillna(0)
+    metrics = {}
+    exact = pd.Series(True, index=joined.index)
+    for tense, label in TENSE_LABELS.items():
+        ours = joined[tense]
+        theirs = joined[label]
+        correct = float(pd.concat([ours, theirs], axis=1).min(axis=1).sum())
+        precision = correct / ours.sum() if ours.sum() else None
+        recall = correct / theirs.sum() if theirs.sum() else None
+        f1 = (
+            2 * precision * recall / (precision + recall)
+            if precision and recall
+            else None
+        )
+        matches = ours == theirs
+        exact &= matches
+        metrics[tense] = {
+            "label": label,
+            "predicted": int(ours.sum()),
+            "labelled": int(theirs.sum()),
+            "correct": int(correct),
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+            "patent_count_match": float(matches.mean()) if len(joined) else None,
+            "mean_abs_error": (
+                float((ours - theirs).abs().mean()) if len(joined) else None
+            ),
+        }
+    metrics["patents_scored"] = len(joined)
+    metrics["unknown_examples"] = int(joined.get("unknown", pd.Series(dtype=int)).sum())
+    metrics["exact_match"] = float(exact.mean()) if len(joined) else None
+    return metrics
+
+
+def evaluate(
+    corpus_path,
+    freilich_path,
+    year=None,
+    workers=None,
+    classify_workers=None,
+    prophetic_column="prophetic",
+    nonprophetic_column="nonprophetic",
+    limit=None,
+):
+    """Run one evaluation and return the report dict."""
+    workers = workers or max(1, multiprocessing.cpu_count() - 1)
+    classify_workers = classify_workers or max(
+        1, (multiprocessing.cpu_count() * 3) // 4
+    )
+    with Corpus(corpus_path) as corpus:
+        metadata = corpus.metadata
+        documents = corpus.documents()
+    if limit:
+        documents = documents[:limit]
+    year = year or (int(metadata["year"]) if metadata.get("year") else None)
+
+    start = time.perf_counter()
+    predicted, run = run_extraction_and_classification(
+        documents, workers, classify_workers
+    )
+    elapsed = time.perf_counter() - start
+
+    labels = load_freilich(
+        year,
+        freilich_path,
+        columns=["patentnumber", prophetic_column, nonprophetic_column],
+    )
+    labels.index = labels.pop("patentnumber").astype(str)
+    labels = labels.rename(
+        columns={prophetic_column: "prophetic", nonprophetic_column: "nonprophetic"}
+    )
+    labels = labels[labels.index.isin({document.doc_number for document in documents})]
+    predicted.index = predicted.index.astype(str)
+
+    return {
+        "corpus": os.path.abspath(corpus_path),
+        "year": year,
+        "workers": workers,
+        "classify_workers": classify_workers,
+        "accuracy": score(predicted, labels),
+        "throughput": {
+            "elapsed_seconds": round(elapsed, 3),
+            "extract_seconds": round(run["extract_seconds"], 3),
+            "classify_seconds": round(run["classify_seconds"], 3),
+            "patents_per_second": run["documents"] / elapsed if elapsed else None,
+            "examples_per_second": (
+                run["examples"] / run["classify_seconds"]
+                if run["classify_seconds"]
+                else None
+            ),
+        },
+        "counts": {
+            key: run[key]
+            for key in (
+                "documents",
+                "patents_with_examples",
+                "examples",
+                "rejected",
+                "resolved_by",
+            )
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _format_rate(value):
+    return "n/a" if value is None else f"{value:.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Score extraction and tense classification against the "
+        "Freilich labels and measure throughput"
+    )
+    parser.add_argument(
+        "--corpus", required=True, help="Test dataset corpus (test_dataset_YEAR.corpus)"
+    )
+    parser.add_argument(
+        "--freilich-path",
+        default=FREILICH_DEFAULT_PATH,
+        help="Freilich dataset (.xlsb; its cache is used when present)",
+    )
+    parser.add_argument(
+        "--year", type=int, help="Issue year of the labels (default: from the corpus)"
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Extraction processes (default: CPU count - 1)"
+    )
+    parser.add_argument(
+        "--classify-workers",
+        type=int,
+        help="Classification processes (default: 3/4 of the CPUs)",
+    )
+    parser.add_argument(
+        "--prophetic-column",
+        default="prophetic",
+        help="Freilich column with the prophetic example count",
+    )
+    parser.add_argument(
+        "--nonprophetic-column",
+        default="nonprophetic",
+        help="Freilich column with the non-prophetic example count",
+    )
+    parser.add_argument(
+        "--limit", type=int, help="Only evaluate the first N patents of the corpus"
+    )
+    parser.add_argument(
+        "--output", default="evaluation_report.json", help="JSON report path"
+    )
+    args = parser.parse_args()
+
+    report = evaluate(
+        args.corpus,
+        args.freilich_path,
+        year=args.year,
+        workers=args.workers,
+        classify_workers=args.classify_workers,
+        prophetic_column=args.prophetic_column,
+        nonprophetic_column=args.nonprophetic_column,
+        limit=args.limit,
+    )
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for tense in TENSE_LABELS:
+        metrics = report["accuracy"][tense]
+        print(
+            f"{tense} vs {metrics['label']}: "
+            f"precision {_format_rate(metrics['precision'])}, "
+            f"recall {_format_rate(metrics['recall'])}"
+        )
+    throughput = report["throughput"]
+    rss = report["peak_rss_mb"]
+    print(
+        f"{throughput['patents_per_second']:.1f} patents/s, "
+        f"{throughput['examples_per_second'] or 0:.1f} examples/s"
+        + (
+            f", peak RSS {rss['self']} MB (largest worker {rss['children']} MB)"
+            if rss
+            else ""
+        )
+    )
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -8,8 +8,22 @@ from utilities.app_utils import (
     validate_year,
     validate_kind,
 )
+from utilities.year_scheduler import YearPipelineScheduler
+from utilities.integrity import verify_directory
+from utilities.reclassify import reclassify
+from utilities.daemon import DEFAULT_POLL_INTERVAL, IngestionDaemon
+from utilities.progress import TqdmProgress, make_reporter
+from utilities.cancellation import cancel_all
+from utilities.memory import MemoryGovernor, parse_memory_size
+from utilities.sources import (
+    LISTING_CACHE_DIR,
+    CachedListingSource,
+    HttpSource,
+    LocalDirectorySource,
+)
+from utilities.database_utils import DEFAULT_DB_PATH, SHARDED_TABLES, connect_read
 import pandas as pd
-from sqlalchemy import create_engine, text
+from tqdm import tqdm
 
 # # Process a single year
 # python patent_cli.py --year 2020 --kind grant
@@ -29,26 +43,68 @@ from sqlalchemy import create_engine, text
 # # Specify output directory and number of workers
 # python patent_cli.py --year 2020 --output-dir ./patent_data --workers 6
 
+# # Pipeline a year range, processing two years at a time
+# python patent_cli.py --year-range 2018 2020 --max-processing 2 --worker-budget 10
+
+# # Write each year to its own database shard
+# python patent_cli.py --year-range 2018 2020 --db-path ./db/patents.db --sharded
+
+# # Re-run tense classification on stored examples (no XML), optionally filtered
+# python patent_cli.py --reclassify --year 2020 --patent-range 10000000 10999999
+
+# # Re-check the downloaded zips of a year (4 files at a time)
+# python patent_cli.py --year 2020 --verify-only --workers 4
+
+# # Download from a local mirror of the bulk data instead of the USPTO server
+# python patent_cli.py --year 2020 --mirror-dir /mnt/uspto
+
+# # Keep running and ingest each new weekly file of the current year as it appears
+# python patent_cli.py --daemon --kind grant --poll-interval 3600
+
+# # Print every per-file/per-batch log line instead of progress bars
+# python patent_cli.py --year 2020 --raw-log
+
+# # Keep ingestion (workers included) under 8 GB of memory
+# python patent_cli.py --year-range 2018 2020 --max-processing 2 --max-memory 8G
 
-def save_to_csv(output_dir, year=None):
-    """Save database tables to CSV files."""
-    engine = create_engine("sqlite:///./db/patents.db")
-    tables = ["patent_examples", "patent_statistics"]
+
+def save_to_csv(output_dir, year=None, db_path=None):
+    """Save database tables (main database and any shards) to CSV files."""
+    conn = connect_read(db_path, years=[year] if year else None)
 
     csv_dir = os.path.join(output_dir, "csv_exports")
     os.makedirs(csv_dir, exist_ok=True)
 
     year_suffix = f"_{year}" if year else ""
-    for table in tables:
-        query = f"SELECT * FROM {table}"
-        if year:
-            query += f" WHERE year = {year}"
-        df = pd.read_sql(query, engine)
-        csv_path = os.path.join(csv_dir, f"{table}{year_suffix}.csv")
-        df.to_csv(csv_path, index=False)
-
-
-def process_year(year, kind, base_path, status_callback=None, stop_event=None):
+    try:
+        for table in SHARDED_TABLES:
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if not columns:
+                continue
+            query = f"SELECT * FROM {table}"
+            params = ()
+            if year and "year" in columns:
+                query += " WHERE year = ?"
+                params = (year,)
+            df = pd.read_sql(query, conn, params=params)
+            csv_path = os.path.join(csv_dir, f"{table}{year_suffix}.csv")
+            df.to_csv(csv_path, index=False)
+    finally:
+        conn.close()
+
+
+def process_year(
+    year,
+    kind,
+    base_path,
+    status_callback=None,
+    stop_event=None,
+    db_path=None,
+    sharded=False,
+    source=None,
+    progress=None,
+    memory_governor=None,
+):
     """Process a single year of patent data."""
     try:
         # Validate inputs
@@ -65,6 +121,8 @@ def process_year(year, kind, base_path, status_callback=None, stop_event=None):
             download_path=os.path.join(base_path, f"patent_{kind}_{year}_zip"),
             callback=status_callback,
             stop_event=stop_event,
+            source=source,
+            progress=progress,
         )
 
         if not downloaded:
@@ -75,7 +133,11 @@ def process_year(year, kind, base_path, status_callback=None, stop_event=None):
         # Unzip files
         unzip_path = os.path.join(base_path, f"patent_{kind}s_{year}")
         if not unzip_files(
-            download_path, unzip_path, callback=status_callback, stop_event=stop_event
+            download_path,
+            unzip_path,
+            callback=status_callback,
+            stop_event=stop_event,
+            progress=progress,
         ):
             return False
 
@@ -86,12 +148,16 @@ def process_year(year, kind, base_path, status_callback=None, stop_event=None):
             stop_event=stop_event,
             max_workers=4,
             year=year,
+            db_path=db_path,
+            sharded=sharded,
+            progress=progress,
+            memory_governor=memory_governor,
         )
 
         # Save to CSV after processing
         if status_callback:
             status_callback(f"Saving data to CSV files for year {year}")
-        save_to_csv(base_path, year)
+        save_to_csv(base_path, year, db_path=db_path)
 
         if status_callback:
             status_callback(f"Processing complete for year {year}")
@@ -103,9 +169,94 @@ def process_year(year, kind, base_path, status_callback=None, stop_event=None):
         return False
 
 
+def process_years_pipelined(
+    years,
+    kind,
+    base_path,
+    status_callback=None,
+    stop_event=None,
+    workers=4,
+    db_path=None,
+    sharded=False,
+    stage_limits=None,
+    worker_budget=None,
+    source=None,
+    progress=None,
+    memory_governor=None,
+):
+    """
+    Process several years with download/unzip/process pipelined across years.
+
+    Each year reports its progress under its own scope, so the bars of years
+    running side by side stay apart. All years share ``memory_governor``, so
+    the years being processed together stay within one memory budget.
+    """
+    kind = validate_kind(kind)
+    years = [validate_year(year) for year in years]
+
+    def download(year, stop_event):
+        downloaded, _ = download_patents_pto(
+            year=year,
+            kind=kind,
+            download_path=os.path.join(base_path, f"patent_{kind}_{year}_zip"),
+            callback=status_callback,
+            stop_event=stop_event,
+            source=source,
+            progress=make_reporter(progress, scope=year),
+        )
+        return downloaded
+
+    def unzip(year, stop_event):
+        return unzip_files(
+            os.path.join(base_path, f"patent_{kind}_{year}_zip"),
+            os.path.join(base_path, f"patent_{kind}s_{year}"),
+            callback=status_callback,
+            stop_event=stop_event,
+            progress=make_reporter(progress, scope=year),
+        )
+
+    def process(year, stop_event):
+        extract_and_save_examples_in_db(
+            os.path.join(base_path, f"patent_{kind}s_{year}"),
+            callback=status_callback,
+            stop_event=stop_event,
+            max_workers=workers,
+            year=year,
+            db_path=db_path,
+            sharded=sharded,
+            progress=make_reporter(progress, scope=year),
+            memory_governor=memory_governor,
+        )
+        if stop_event and stop_event.is_set():
+            return False
+        if status_callback:
+            status_callback(f"Saving data to CSV files for year {year}")
+        save_to_csv(base_path, year, db_path=db_path)
+        return True
+
+    scheduler = YearPipelineScheduler(
+        stage_limits=stage_limits,
+        worker_budget=worker_budget,
+        stop_event=stop_event,
+        callback=status_callback,
+        memory_governor=memory_governor,
+    )
+    scheduler.add_stage("download", download)
+    scheduler.add_stage("unzip", unzip)
+    scheduler.add_stage("process", process, workers=workers, memory_bound=True)
+
+    results = scheduler.run(years)
+    if status_callback:
+        succeeded = [year for year, ok in results.items() if ok]
+        status_callback(
+            f"Pipeline finished: {len(succeeded)}/{len(years)} year(s) processed"
+        )
+    return results
+
+
 def print_status(message):
-    """Print status messages to console."""
-    print(message)
+    """Print status messages to console without breaking the progress bars."""
+    tqdm.write(message)
 
 
 def main():
@@ -113,8 +264,8 @@ def main():
         description="USPTO Patent Processor Command Line Tool"
     )
 
-    # Main operation mode
-    group = parser.add_mutually_exclusive_group(required=True)
+    # Main operation mode (with --reclassify, --year/--year-range only filter)
+    group = parser.add_mutually_exclusive_group()
     group.add_argument("--year", type=int, help="Single year to process")
     group.add_argument(
         "--year-range",
@@ -142,6 +293,94 @@ def main():
     parser.add_argument(
         "--workers", type=int, default=4, help="Number of worker processes (default: 4)"
     )
+    parser.add_argument(
+        "--db-path",
+        default=DEFAULT_DB_PATH,
+        help=f"SQLite database path (default: {DEFAULT_DB_PATH})",
+    )
+    parser.add_argument(
+        "--sharded",
+        action="store_true",
+        help="Write each year/kind to its own database shard next to --db-path",
+    )
+
+    parser.add_argument(
+        "--raw-log",
+        action="store_true",
+        help="Print every per-file/per-batch status line instead of progress bars",
+    )
+    parser.add_argument(
+        "--mirror-dir",
+        help="Read the bulk zip files from this local mirror instead of the USPTO server",
+    )
+
+    # Year pipeline limits (full process of several years)
+    parser.add_argument(
+        "--max-downloads",
+        type=int,
+        default=1,
+        help="Years downloading at the same time (default: 1)",
+    )
+    parser.add_argument(
+        "--max-unzips",
+        type=int,
+        default=1,
+        help="Years unzipping at the same time (default: 1)",
+    )
+    parser.add_argument(
+        "--max-processing",
+        type=int,
+        default=1,
+        help="Years being processed at the same time (default: 1)",
+    )
+    parser.add_argument(
+        "--worker-budget",
+        type=int,
+        default=None,
+        help="Total workers shared by all running stages (default: --workers + 2)",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=parse_memory_size,
+        help="Memory budget of ingestion including its workers, e.g. 8G or 512M; "
+        "new files and batches are throttled near it (default: no limit)",
+    )
+
+    # Reclassification of stored examples
+    parser.add_argument(
+        "--reclassify",
+        action="store_true",
+        help="Re-run tense classification on examples already in the database",
+    )
+    parser.add_argument(
+        "--patent-range",
+        nargs=2,
+        type=int,
+        metavar=("FIRST", "LAST"),
+        help="With --reclassify, only patents numbered FIRST..LAST",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="With --reclassify, ignore the saved progress and start over",
+    )
+
+    # Daemon mode
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep polling for new weekly files and ingest them as they appear",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=int,
+        default=DEFAULT_POLL_INTERVAL,
+        help=f"With --daemon, seconds between listing checks (default: {DEFAULT_POLL_INTERVAL})",
+    )
+    parser.add_argument(
+        "--status-file",
+        help="With --daemon, JSON health/status file (default: <output-dir>/daemon_status.json)",
+    )
 
     # Operation flags
     parser.add_argument(
@@ -153,8 +392,26 @@ def main():
     parser.add_argument(
         "--process-only", action="store_true", help="Only process/analyze patents"
     )
+    parser.add_argument(
+        "--verify-only",
+        action="store_true",
+        help="Only re-verify downloaded zip files (skips files already verified)",
+    )
+    parser.add_argument(
+        "--force-verify",
+        action="store_true",
+        help="With --verify-only, also re-check files already verified",
+    )
 
     args = parser.parse_args()
+    if args.reclassify and args.input_dir:
+        parser.error("--reclassify reads the database; --input-dir is not allowed")
+    if args.daemon and (args.year_range or args.input_dir or args.reclassify):
+        parser.error("--daemon only accepts --year to pin the year it follows")
+    if not (
+        args.reclassify or args.daemon or args.year or args.year_range or args.input_dir
+    ):
+        parser.error("one of the arguments --year --year-range --input-dir is required")
 
     # Create output directory if it doesn't exist
     os.makedirs(args.output_dir, exist_ok=True)
@@ -162,6 +419,22 @@ def main():
     # Initialize stop event
     stop_event = multiprocessing.Event()
 
+    # Progress bars replace the per-file/per-batch lines unless --raw-log
+    progress = None if args.raw_log else TqdmProgress()
+
+    # One budget shared by every pipeline of this run
+    memory_governor = (
+        MemoryGovernor(args.max_memory, callback=print_status)
+        if args.max_memory
+        else None
+    )
+
+    # Listings are cached per year/kind and revalidated with conditional requests
+    source = CachedListingSource(
+        LocalDirectorySource(args.mirror_dir) if args.mirror_dir else HttpSource(),
+        os.path.join(args.output_dir, LISTING_CACHE_DIR),
+    )
+
     try:
         # Determine years to process
         years_to_process = []
@@ -174,6 +447,38 @@ def main():
                 return
             years_to_process = range(start, end + 1)
 
+        # Follow the current (or --year) listing until interrupted
+        if args.daemon:
+            IngestionDaemon(
+                kind=args.kind,
+                base_path=args.output_dir,
+                year=args.year,
+                poll_interval=args.poll_interval,
+                source=source,
+                status_path=args.status_file,
+                db_path=args.db_path,
+                sharded=args.sharded,
+                max_workers=args.workers,
+                callback=print_status,
+                stop_event=stop_event,
+                progress=progress,
+                memory_governor=memory_governor,
+            ).run()
+            return
+
+        # Reclassify stored examples without touching XML
+        if args.reclassify:
+            reclassify(
+                args.db_path,
+                years=list(years_to_process) or None,
+                patent_range=args.patent_range,
+                callback=print_status,
+                stop_event=stop_event,
+                max_workers=args.workers,
+                restart=args.restart,
+            )
+            return
+
         # Process existing directory
         if args.input_dir:
             if not os.path.exists(args.input_dir):
@@ -186,9 +491,42 @@ def main():
                 callback=print_status,
                 stop_event=stop_event,
                 max_workers=args.workers,
+                db_path=args.db_path,
+                sharded=args.sharded,
+                progress=progress,
+                memory_governor=memory_governor,
             )
             print("Saving all data to CSV files")
-            save_to_csv(args.output_dir)
+            save_to_csv(args.output_dir, db_path=args.db_path)
+            return
+
+        # Full process of several years: pipeline the stages across years
+        full_process = not (
+            args.download_only
+            or args.unzip_only
+            or args.process_only
+            or args.verify_only
+        )
+        if full_process and len(years_to_process) > 1:
+            process_years_pipelined(
+                years_to_process,
+                args.kind,
+                args.output_dir,
+                print_status,
+                stop_event,
+                workers=args.workers,
+                db_path=args.db_path,
+                sharded=args.sharded,
+                stage_limits={
+                    "download": args.max_downloads,
+                    "unzip": args.max_unzips,
+                    "process": args.max_processing,
+                },
+                worker_budget=args.worker_budget or args.workers + 2,
+                source=source,
+                progress=progress,
+                memory_governor=memory_governor,
+            )
             return
 
         # Process years
@@ -203,6 +541,8 @@ def main():
                     ),
                     callback=print_status,
                     stop_event=stop_event,
+                    source=source,
+                    progress=progress,
                 )
                 if not downloaded:
                     print(f"Failed to download patents for {year}")
@@ -221,10 +561,29 @@ def main():
                     unzip_path,
                     callback=print_status,
                     stop_event=stop_event,
+                    progress=progress,
                 ):
                     print(f"Failed to unzip patents for {year}")
                     continue
 
+            elif args.verify_only:
+                # Re-verify downloads in parallel
+                download_path = os.path.join(
+                    args.output_dir, f"patent_{args.kind}_{year}_zip"
+                )
+                if not os.path.exists(download_path):
+                    print(f"Error: Download directory {download_path} does not exist")
+                    continue
+                failed = verify_directory(
+                    download_path,
+                    max_workers=args.workers,
+                    callback=print_status,
+                    force=args.force_verify,
+                    progress=progress,
+                )
+                if failed:
+                    print(f"{len(failed)} file(s) failed verification for {year}")
+
             elif args.process_only:
                 # Process only
                 input_path = os.path.join(
@@ -239,19 +598,38 @@ def main():
                     stop_event=stop_event,
                     max_workers=args.workers,
                     year=year,
+                    db_path=args.db_path,
+                    sharded=args.sharded,
+                    progress=progress,
+                    memory_governor=memory_governor,
                 )
 
             else:
                 # Full process
-                process_year(year, args.kind, args.output_dir, print_status, stop_event)
+                process_year(
+                    year,
+                    args.kind,
+                    args.output_dir,
+                    print_status,
+                    stop_event,
+                    db_path=args.db_path,
+                    sharded=args.sharded,
+                    source=source,
+                    progress=progress,
+                    memory_governor=memory_governor,
+                )
 
     except KeyboardInterrupt:
         print("\nOperation interrupted by user")
         stop_event.set()
+        # Discard queued work and kill workers still busy after the grace period
+        cancel_all(callback=print_status)
     except Exception as e:
         print(f"Error: {str(e)}")
     finally:
         # Cleanup
+        if progress:
+            progress.close()
         if hasattr(multiprocessing, "get_context"):
             mp_context = multiprocessing.get_context("spawn")
             if hasattr(mp_context, "_pool"):
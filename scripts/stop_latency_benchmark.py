@@ -0,0 +1,121 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from utilities.app_utils import extract_and_save_examples_in_db
+
+# # Stop a run over a directory of weekly XML files after 5 and 20 seconds, 3 times each
+# python stop_latency_benchmark.py --input-dir ./data/patent_grants_2020 --stop-after 5 20 --trials 3
+
+
+def measure_stop(input_dir, stop_after, workers, db_path):
+    """
+    Run ingestion over ``input_dir``, request a stop after ``stop_after`` seconds.
+
+    Returns:
+        dict: Stop latency (seconds from the stop request until the call
+        returned) and the stop/cancellation summary lines it logged
+    """
+    stop_event = multiprocessing.Event()
+    summary = []
+
+    def callback(message):
+        if message.startswith(("Stopped", "Cancelled")):
+            summary.append(message)
+
+    worker = threading.Thread(
+        target=extract_and_save_examples_in_db,
+        args=(input_dir,),
+        kwargs={
+            "callback": callback,
+            "stop_event": stop_event,
+            "max_workers": workers,
+            "db_path": db_path,
+        },
+    )
+    start = time.monotonic()
+    worker.start()
+    worker.join(stop_after)
+    if not worker.is_alive():
+        # Finished before the stop was due; nothing to measure
+        return {"stop_after": stop_after, "finished_early": True}
+
+    requested = time.monotonic()
+    stop_event.set()
+    worker.join()
+    stopped = time.monotonic()
+    return {
+        "stop_after": stop_after,
+        "ran_for": round(requested - start, 3),
+        "stop_latency": round(stopped - requested, 3),
+        "summary": summary,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure how long ingestion takes to stop after a stop request"
+    )
+    parser.add_argument(
+        "--input-dir", required=True, help="Directory of unzipped weekly XML files"
+    )
+    parser.add_argument(
+        "--stop-after",
+        type=float,
+        nargs="+",
+        default=[5.0],
+        help="Seconds to run before requesting the stop (default: 5)",
+    )
+    parser.add_argument(
+        "--trials", type=int, default=3, help="Runs per stop delay (default: 3)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Concurrent file pipelines (default: 4)"
+    )
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for stop_after in args.stop_after:
+        for trial in range(args.trials):
+            # Each trial writes to a throwaway database
+            db_dir = tempfile.mkdtemp(prefix="stop_benchmark_")
+            try:
+                result = measure_stop(
+                    args.input_dir,
+                    stop_after,
+                    args.workers,
+                    os.path.join(db_dir, "patents.db"),
+                )
+            finally:
+                shutil.rmtree(db_dir, ignore_errors=True)
+            result["trial"] = trial + 1
+            results.append(result)
+            print(json.dumps(result))
+
+        latencies = [
+            r["stop_latency"]
+            for r in results
+            if r["stop_after"] == stop_after and "stop_latency" in r
+        ]
+        if latencies:
+            print(
+                f"stop after {stop_after:g}s: median latency "
+                f"{statistics.median(latencies):.2f}s, max {max(latencies):.2f}s "
+                f"over {len(latencies)} run(s)"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
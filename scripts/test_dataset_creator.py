@@ -1,7 +1,7 @@
 import argparse
 import os
 from utilities.test_dataset_utils import create_test_dataset_from_freilich
-from utilities.utils_clean import download_patents_pto, unzip_files, validate_year
+from utilities.app_utils import download_patents_pto, unzip_files, validate_year
 # python test_dataset_creator.py --year 2015 --freilich-path Freilich.Data.Compressed.xlsb --download
 
 
@@ -38,6 +38,16 @@ def main():
         default=default_xml_path,
         help="Directory containing XML files for the chosen year",
     )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="Test dataset corpus (default: test_dataset_YEAR.corpus)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes scanning the XML files (default: CPU count - 1)",
+    )
     parser.add_argument(
         "--download",
         action="store_true",  # Changed from type=bool
@@ -52,7 +62,7 @@ def main():
     if args.download:
         try:
             print(f"Downloading XML files from USPTO for the year {args.year}")
-            download_success = download_patents_pto(
+            download_success, _ = download_patents_pto(
                 year=args.year,
                 kind="grant",
                 download_path=f"zipped_files_{args.year}",
@@ -94,6 +104,8 @@ def main():
             year=args.year,
             freilich_data_path=freilich_path,
             path_to_all_xmls_for_chosen_year=xml_path,
+            output_path=args.output,
+            max_workers=args.workers,
         )
         print(f"Number of patents extracted: {len(test_dataset)}")
         print("Sample document numbers:", list(test_dataset.keys())[:5])
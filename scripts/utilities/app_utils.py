@@ -1,40 +1,24 @@
 import requests
 import os
 import zipfile
-from lxml import etree
 from tqdm import tqdm
-import re
-from .nlp_processing import dic_to_dic_w_tense_test
-from .database_utils import store_patent_examples, store_patent_statistics
-from .utils_clean import (
-    remove_duplicate_docs,
-)
 import argparse
 import time
 import asyncio
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
-import aiofiles
 from .patent_processor import PatentProcessor
+from .pipeline import IngestionPipeline
+from .integrity import IntegrityError, VerificationManifest, extract_zip_verified
+from .progress import STAGE_DOWNLOAD, STAGE_UNZIP, make_reporter
+from .cancellation import cancel_when_set
+from .sources import (
+    LISTING_CACHE_DIR,
+    CachedListingSource,
+    HttpSource,
+    split_revision,
+)
 import multiprocessing  # Add this import
 
 
-# Add PoolManager class
-class PoolManager:
-    _pool = None
-
-    @classmethod
-    def get_pool(cls, max_workers=None):
-        if cls._pool is None:
-            cls._pool = ProcessPoolExecutor(max_workers=max_workers)
-        return cls._pool
-
-    @classmethod
-    def shutdown(cls):
-        if cls._pool:
-            cls._pool.shutdown()
-            cls._pool = None
-
-
 # Custom tqdm class that reports progress to a callback function
 class TqdmCallback(tqdm):
     def __init__(self, *args, **kwargs):
@@ -59,6 +43,10 @@ class TqdmCallback(tqdm):
             self.last_update_time = current_time
 
 
+# Tries per file before a download counts as failed
+DOWNLOAD_ATTEMPTS = 2
+
+
 def validate_kind(value, callback=None):
     """Validate if the kind is either 'application' or 'grant'."""
     try:
@@ -98,71 +86,60 @@ def validate_year(year, callback=None):
 
 def get_latest_versions(urls, kind="g"):
     """
-    Function to extract the latest versions of files based on a regex pattern.
+    Keep the latest revision of every weekly file.
 
     Args:
-    - urls (dict): A dictionary where keys are years and values are lists of filenames.
+    - urls (list): Zip file names, e.g. ipg240102.zip and its re-release ipg240102_r1.zip
+    - kind (str): "g" for grants (ipg) or "a" for applications (ipa)
 
     Returns:
-    - latest_files (dict): A dictionary where keys are years and values are lists of the latest versions of the files for that year.
+    - latest_files (list): The latest version of each file, sorted by file name
     """
-    # Initialize the result dictionary to store the latest versions for each year
-    latest_files = {}
-
-    if kind == "g":
-        pattern = re.compile(r"(ipg\d{6})(?:_r(\d+))?\.zip")
-    elif kind == "a":
-        pattern = re.compile(r"(ipa\d{6})(?:_r(\d+))?\.zip")
-
-    # Process each year in the input dictionary
-
-    latest_versions = {}  # Holds the latest version of files for the current year
+    prefix = f"ip{kind}"
+    # base name -> (revision, file name), revisions compared as ints
+    latest_versions = {}
     for file in urls:
-        match = pattern.match(file)
-        if match:
-            base_name, revision = match.groups()
-            revision = int(revision) if revision else 0  # Default to 0 if no revision
-
-            # Extract the current highest revision number for the base_name
-            current_revision_match = re.search(
-                r"_r(\d+)", latest_versions.get(base_name, "")
-            )
-            current_revision = (
-                int(current_revision_match.group(1)) if current_revision_match else 0
-            )
-
-            # Update if the new file has a higher revision
-            if base_name not in latest_versions or revision > current_revision:
-                latest_versions[base_name] = file
+        parsed = split_revision(file)
+        if parsed is None or not parsed[0].startswith(prefix):
+            continue
+        base_name, revision = parsed
+        if base_name not in latest_versions or revision > latest_versions[base_name][0]:
+            latest_versions[base_name] = (revision, file)
 
-    # Get the final list of unique latest versions sorted by file name
-    latest_files = sorted(latest_versions.values())
-
-    return latest_files
+    return sorted(file for _, file in latest_versions.values())
 
 
 def download_patents_pto(
-    year, kind="application", download_path=None, callback=None, stop_event=None
+    year,
+    kind="application",
+    download_path=None,
+    callback=None,
+    stop_event=None,
+    source=None,
+    progress=None,
 ):
-    """Download patent files with progress updates."""
+    """
+    Download patent files with progress updates.
+
+    ``source`` is a PatentSource to list and fetch the files from; it defaults
+    to the USPTO server with its listings cached in ``listing_cache`` next to
+    ``download_path``. ``progress`` receives download ProgressEvents (see
+    download_files).
+    """
     try:
         if download_path is None:
             download_path = f"./data/patent_{kind}_{year}_zip"
         # if callback:
         #     callback(f"Starting download for year {year}...")
 
-        url = f"https://bulkdata.uspto.gov/data/patent/{kind}/redbook/fulltext/{year}/"
+        source = source or CachedListingSource(
+            HttpSource(),
+            os.path.join(os.path.dirname(download_path) or ".", LISTING_CACHE_DIR),
+        )
         if callback:
-            callback("Connecting to USPTO server...")
+            callback(f"Connecting to {source}...")
 
-        rp = requests.get(url, timeout=10)
-        root = etree.fromstring(rp.text.encode(), etree.XMLParser(recover=True))
-        href_values = root.findall(".//a[@href]")
-        urls = [
-            href.get("href")
-            for href in href_values
-            if href.get("href").endswith(".zip")
-        ]
+        urls = source.list_files(year, kind)
 
         if callback:
             callback(f"Found {len(urls)} zip files for {year}")
@@ -171,59 +148,159 @@ def download_patents_pto(
         # if callback:
         #     callback(f"Downloading {len(url_no_dup)} unique patent files...")
 
-        download_files(url, download_path, url_no_dup, callback, stop_event)
+        failed = download_files(
+            source,
+            year,
+            kind,
+            download_path,
+            url_no_dup,
+            callback,
+            stop_event,
+            progress=progress,
+        )
+        if failed:
+            if callback:
+                callback(f"{len(failed)} file(s) failed to download: {failed}")
+            return False, download_path
         return True, download_path
 
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, OSError) as e:
         if callback:
             callback(f"Error during download: {e}")
         return False, ""
 
 
-def download_files(url, download_path, files, callback=None, stop_event=None):
-    """Download files with progress updates."""
+def download_files(
+    source,
+    year,
+    kind,
+    download_path,
+    files,
+    callback=None,
+    stop_event=None,
+    progress=None,
+):
+    """
+    Fetch files from a PatentSource with progress updates.
+
+    Sizes and sha256 digests are measured while each file is written and
+    kept in the directory's verification manifest; files recorded there as
+    complete and unchanged on disk are not fetched again. A file that fails
+    its size check is tried up to DOWNLOAD_ATTEMPTS times.
+
+    With ``progress`` (a ProgressReporter or a callable taking ProgressEvents)
+    the files are counted as a "download" stage instead of logging a line
+    per file; failures and stops are still logged through ``callback``.
+
+    Returns:
+        list: Names of the files that could not be fetched intact
+    """
     if not os.path.exists(download_path):
         os.makedirs(download_path)
 
+    reporter = make_reporter(progress)
+    manifest = VerificationManifest(download_path)
+    failed = []
+    handled = 0
     for index, file_name in enumerate(files):
         if stop_event and stop_event.is_set():
             if callback:
                 callback("Download stopped by user.")
             break
+        handled = index + 1
+
+        if reporter:
+            reporter.update(
+                STAGE_DOWNLOAD,
+                done=index,
+                total=len(files),
+                file=file_name,
+                unit="files",
+            )
+        if manifest.is_downloaded(file_name):
+            if callback and reporter is None:
+                callback(f"Already downloaded {file_name}, skipping")
+            continue
 
-        if callback:
+        if callback and reporter is None:
             callback(f"Downloading file {index + 1} of {len(files)}: {file_name}")
 
-        url_ = url + file_name
-        zip_file_path = os.path.join(download_path, file_name)
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            try:
+                result = source.fetch(year, kind, file_name, download_path, stop_event)
+                manifest.record_download(result)
+                break
+            except (IntegrityError, requests.exceptions.RequestException) as e:
+                if callback:
+                    callback(f"Download of {file_name} failed (attempt {attempt}): {e}")
+        else:
+            failed.append(file_name)
+        manifest.save()
+    if reporter:
+        reporter.update(STAGE_DOWNLOAD, done=handled)
+        reporter.finish(STAGE_DOWNLOAD)
+    return failed
 
-        response = requests.get(url_, stream=True, timeout=10)
-        with open(zip_file_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
 
+def unzip_files(
+    download_path, unzip_path, callback=None, stop_event=None, progress=None
+):
+    """
+    Unzip files with progress updates.
 
-def unzip_files(download_path, unzip_path, callback=None, stop_event=None):
-    """Unzip files with progress updates."""
+    Member CRCs are checked while extracting and the outcome is recorded in
+    the download directory's verification manifest. Corrupt zips are
+    reported and make the call return False after the others are extracted.
+    With ``progress`` the zips are counted as an "unzip" stage instead of
+    logging a line per file.
+    """
     if not os.path.exists(unzip_path):
         os.makedirs(unzip_path)
+    reporter = make_reporter(progress)
     try:
+        manifest = VerificationManifest(download_path)
+        corrupt = []
         files = [f for f in os.listdir(download_path) if f.endswith(".zip")]
         if callback:
             callback(f"Found {len(files)} zip files to extract")
 
-        for file_name in files:
+        for index, file_name in enumerate(files):
             if stop_event and stop_event.is_set():
                 if callback:
                     callback("Unzip process stopped by user.")
                 return False
 
-            if callback:
+            if reporter:
+                reporter.update(
+                    STAGE_UNZIP,
+                    done=index,
+                    total=len(files),
+                    file=file_name,
+                    unit="files",
+                )
+            elif callback:
                 callback(f"Extracting {file_name}...")
 
             zip_file_path = os.path.join(download_path, file_name)
-            with zipfile.ZipFile(zip_file_path, "r") as zip_ref:
-                zip_ref.extractall(unzip_path)
+            try:
+                extract_zip_verified(zip_file_path, unzip_path)
+                manifest.record_check(file_name)
+            except (zipfile.BadZipFile, IntegrityError) as e:
+                manifest.record_check(file_name, e)
+                corrupt.append(file_name)
+                if callback:
+                    callback(f"Corrupt zip {file_name}: {e}")
+            manifest.save()
+        if reporter:
+            reporter.update(STAGE_UNZIP, done=len(files))
+            reporter.finish(STAGE_UNZIP)
+
+        if corrupt:
+            if callback:
+                callback(
+                    f"{len(corrupt)} corrupt zip file(s) were not extracted: {corrupt}"
+                )
+            return False
 
         if callback:
             callback(f"Finished extracting all files to {unzip_path}")
@@ -234,153 +311,46 @@ def unzip_files(download_path, unzip_path, callback=None, stop_event=None):
         return False
 
 
-def process_xml_chunk(chunk):
-    """Process a chunk of XML in a separate process."""
-    try:
-        root = etree.fromstring(chunk.encode(), etree.XMLParser(recover=True))
-        if root is not None:
-            return chunk
-    except Exception:
-        pass
-    return None
-
-
-async def process_xml_in_executor(executor, chunk):
-    """Run XML processing in process pool."""
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, process_xml_chunk, chunk)
-
-
-async def process_file_async(file_info, folder_path, callback=None, stop_event=None):
-    """Process a single XML file asynchronously."""
-    i, file = file_info
-    file_path = os.path.join(folder_path, file)
-    loop = asyncio.get_running_loop()
-
-    # Check stop event
-    if stop_event and stop_event.is_set():
-        if callback:
-            callback("Operation stopped by user")
-        return file, 0, []
-
-    if callback:
-        callback(f"Processing file {i + 1}: {file}")
-
-    try:
-        # Create process pool for CPU-intensive work
-        process_pool = ProcessPoolExecutor(max_workers=1)
-        thread_pool = ThreadPoolExecutor(max_workers=2)
-
-        # Read file in chunks asynchronously
-        async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-            content = await f.read()
-
-        # Check stop event after file read
-        if stop_event and stop_event.is_set():
-            if callback:
-                callback("Operation stopped by user")
-            return file, 0, []
-
-        if '<?xml version="1.0" encoding="UTF-8"?>' not in content:
-            if callback:
-                callback(f"Warning: Invalid XML structure in {file}")
-            return file, 0, []
-
-        # Split and process parts concurrently
-        parts = content.split('<?xml version="1.0" encoding="UTF-8"?>')
-        valid_parts = []
-
-        # Process XML chunks in parallel
-        tasks = []
-        for part in parts:
-            if stop_event and stop_event.is_set():
-                break
-            if part.strip():
-                task = process_xml_in_executor(process_pool, part)
-                tasks.append(task)
-
-        if stop_event and stop_event.is_set():
-            if callback:
-                callback("Operation stopped by user")
-            return file, 0, []
-
-        # Gather results
-        results = await asyncio.gather(*tasks)
-        valid_parts = [r for r in results if r is not None]
-
-        # Close process pool
-        process_pool.shutdown()
-
-        if not valid_parts:
-            if callback:
-                callback(f"No valid XML parts found in {file}")
-            return file, 0, []
-
-        # Remove duplicates asynchronously
-        xml_no_dup = await loop.run_in_executor(
-            thread_pool, remove_duplicate_docs, valid_parts
-        )
-
-        current_file_patents = len(xml_no_dup)
-
-        # Clean up thread pool
-        thread_pool.shutdown()
-
-        return file, current_file_patents, xml_no_dup
-
-    except Exception as e:
-        if callback:
-            callback(f"Error processing {file}: {str(e)}")
-        return file, 0, []
-
-
 async def process_files_parallel(
-    folder_path, callback=None, max_workers=4, year=None, stop_event=None
+    folder_path,
+    callback=None,
+    max_workers=4,
+    year=None,
+    stop_event=None,
+    db_path=None,
+    sharded=False,
+    progress=None,
+    memory_governor=None,
 ):
-    """Process multiple XML files using concurrent pipelines."""
-    start_time = time.time()
-
-    # Initialize
-    file_names = [f for f in os.listdir(folder_path) if f.endswith(".xml")]
-    processor = PatentProcessor(max_workers=4)
-    grand_total = 0
-
-    if callback:
-        callback(
-            f"\nStarting parallel processing with {max_workers} concurrent pipelines"
-        )
-        callback(f"Found {len(file_names)} files to process")
-
-    # Process files in batches of max_workers
-    for i in range(0, len(file_names), max_workers):
-        # Check stop event at start of each batch
-        if stop_event and stop_event.is_set():
-            if callback:
-                callback("Operation stopped by user")
-            break
-
-        batch = file_names[i : i + max_workers]
-        current_tasks = []
-
-        # Create concurrent pipelines for each file in batch
-        for j, file in enumerate(batch):
-            pipeline = create_processing_pipeline(
-                (i + j, file), folder_path, processor, callback, year, stop_event
-            )
-            current_tasks.append(pipeline)
-
-        # Execute all pipelines concurrently
-        batch_results = await asyncio.gather(*current_tasks)
+    """
+    Process multiple XML files through the bounded-queue ingestion pipeline.
 
-        # Aggregate results
-        for patents_found in batch_results:
-            if patents_found and patents_found > 0:
-                grand_total += patents_found
-                if callback:
-                    callback(f"Current total patents with examples: {grand_total}")
+    ``max_workers`` sizes the extraction pool and the files split and batches
+    classified at a time.
+    Setting ``stop_event`` cancels the queued work of the pipeline's pools
+    and terminates their workers after a grace period (see cancellation).
+    ``memory_governor`` keeps the pipeline within its memory budget.
+    """
+    start_time = time.time()
 
-        # Allow other operations
-        await asyncio.sleep(0)
+    processor = PatentProcessor(max_workers=max_workers)
+    pipeline = IngestionPipeline(
+        folder_path,
+        processor,
+        callback=callback,
+        max_workers=max_workers,
+        year=year,
+        stop_event=stop_event,
+        db_path=db_path,
+        sharded=sharded,
+        progress=progress,
+        memory_governor=memory_governor,
+    )
+    try:
+        with cancel_when_set(stop_event, callback=callback):
+            grand_total = await pipeline.run()
+    finally:
+        processor.shutdown()
 
     # Calculate and display total time
     end_time = time.time()
@@ -400,110 +370,28 @@ async def process_files_parallel(
     return grand_total, []
 
 
-async def create_processing_pipeline(
-    file_info, folder_path, processor, callback, year=None, stop_event=None
-):
-    """Create a complete processing pipeline for a single file."""
-    try:
-        # Check stop event at start
-        if stop_event and stop_event.is_set():
-            return 0
-
-        # Stage 1: Extract patents from XML
-        file_result = await process_file_async(
-            file_info, folder_path, callback, stop_event
-        )
-        if not isinstance(file_result, tuple) or not file_result[2]:
-            return 0
-
-        # Check stop event after extraction
-        if stop_event and stop_event.is_set():
-            return 0
-
-        file_name, count, xml_parts = file_result
-        if callback:
-            callback(f"\nProcessing {count} patents from {file_name}")
-
-        # Extract year from filename if not provided
-        file_year = year
-        if not file_year:
-            if file_name.startswith("ipg"):
-                year_match = re.match(r"ipg(\d{2})\d{4}\.xml", file_name)
-            elif file_name.startswith("ipa"):
-                year_match = re.match(r"ipa(\d{2})\d{4}\.xml", file_name)
-            if year_match:
-                two_digit_year = int(year_match.group(1))
-                file_year = (
-                    2000 + two_digit_year
-                    if two_digit_year < 50
-                    else 1900 + two_digit_year
-                )
-
-        # Check stop event before processing
-        if stop_event and stop_event.is_set():
-            return 0
-
-        # Stage 2: Process patents
-        doc_w_exp = await processor.process_batch(xml_parts, callback, stop_event)
-        if not doc_w_exp:
-            return 0
-
-        # Check stop event before classification
-        if stop_event and stop_event.is_set():
-            return 0
-
-        # Stage 3: Classify and store results
-        classification_workers = min(len(doc_w_exp), max(2, processor.max_workers * 2))
-        with ThreadPoolExecutor(max_workers=classification_workers) as executor:
-            loop = asyncio.get_running_loop()
-
-            # Classify examples
-            with_tense = await loop.run_in_executor(
-                executor, dic_to_dic_w_tense_test, doc_w_exp
-            )
-
-            # Check stop event before storage
-            if stop_event and stop_event.is_set():
-                return 0
-
-            # Store results
-            with ThreadPoolExecutor(
-                max_workers=processor.max_workers
-            ) as storage_executor:
-                await asyncio.gather(
-                    loop.run_in_executor(
-                        storage_executor, store_patent_examples, doc_w_exp
-                    ),
-                    loop.run_in_executor(
-                        storage_executor,
-                        lambda: store_patent_statistics(with_tense, year=file_year),
-                    ),
-                )
-
-            if callback:
-                callback(
-                    f"Saved {len(doc_w_exp)} patents with examples into db from {file_name}"
-                )
-
-            return len(doc_w_exp)
-
-    except Exception as e:
-        if callback:
-            callback(f"Error in pipeline for {file_info[1]}: {str(e)}")
-        return 0
-
-
-async def process_batch(batch, callback=None):
-    """Process a batch of patents asynchronously."""
-    processor = PatentProcessor(max_workers=2)
-    doc_w_exp = await processor.process_batch(batch, callback)
-    return doc_w_exp
-
-
 def extract_and_save_examples_in_db(
-    folder_path, callback=None, stop_event=None, max_workers=4, year=None
+    folder_path,
+    callback=None,
+    stop_event=None,
+    max_workers=4,
+    year=None,
+    db_path=None,
+    sharded=False,
+    progress=None,
+    memory_governor=None,
 ):
-    """Extract and save examples with progress updates."""
+    """
+    Extract and save examples with progress updates.
+
+    ``db_path`` is the database to write to (defaults to db/patents.db). With
+    ``sharded=True`` each year/kind is written to its own shard next to it,
+    so several years can ingest in parallel without sharing a write lock.
+    ``progress`` receives files/extract/store ProgressEvents in place of the
+    per-file and per-batch log lines. ``memory_governor`` (a MemoryGovernor)
+    throttles the run near its memory budget; pass the same one to runs
+    going on at the same time to share a single budget.
+    """
     if callback:
         callback("Starting example extraction process...")
         if year:
@@ -533,6 +421,10 @@ def extract_and_save_examples_in_db(
                 max_workers,
                 year,
                 stop_event,
+                db_path=db_path,
+                sharded=sharded,
+                progress=progress,
+                memory_governor=memory_governor,
             )
         )
 
@@ -0,0 +1,343 @@
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from .cancellation import cancel_when_set, release_executor, track_executor
+from .database_utils import CENSUS_COLUMNS
+from .app_utils import (
+    download_files,
+    get_latest_versions,
+    split_revision,
+    validate_kind,
+)
+from .integrity import IntegrityError, VerificationManifest, extract_zip_verified
+from .patent_processor import PatentProcessor
+from .pipeline import IngestionPipeline
+from .sources import LISTING_CACHE_DIR, CachedListingSource, HttpSource
+
+# New weekly files appear on Tuesdays; hourly polling keeps latency low at no cost
+DEFAULT_POLL_INTERVAL = 3600
+
+# Status values written to the status file
+STATUS_STARTING = "starting"
+STATUS_IDLE = "idle"
+STATUS_POLLING = "polling"
+STATUS_INGESTING = "ingesting"
+STATUS_STOPPED = "stopped"
+
+# Share of a file's documents that may fail extraction before the file is
+# left unmarked and retried on the next poll
+MAX_FAILED_SHARE = 0.05
+
+
+class IncompleteIngestion(Exception):
+    """A file was not fully stored; it stays unmarked so a later poll retries it."""
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _write_json(path, data):
+    """Write JSON through a temp file so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+class IngestionDaemon:
+    """
+    Long-running incremental ingestion of the weekly USPTO bulk files.
+
+    Every ``poll_interval`` seconds the year listing is read from ``source``
+    (a PatentSource; by default the USPTO server behind a listing cache, so an
+    unchanged listing costs one conditional request), reduced to the
+    latest revision of each weekly file, and only files whose revision was not
+    ingested yet are fetched, unzipped and run through the ingestion pipeline.
+    The extraction and classification pools are created once and stay warm
+    between polls. ``progress`` receives the download and ingestion
+    ProgressEvents of each file, and ``memory_governor`` keeps every
+    ingestion within its memory budget.
+
+    Ingested revisions are recorded in ``<base_path>/daemon_state_<kind>.json``
+    after each file is stored. A file is only recorded when its census shows
+    it was read and stored: if a worker pool broke, more than
+    MAX_FAILED_SHARE of its documents failed or patents with examples were
+    not stored, the file is left for the next poll, and broken pools are
+    replaced before the next file. A JSON status file (state, last poll, next
+    poll, totals, last error) is rewritten on every state change for health
+    checks.
+    """
+
+    def __init__(
+        self,
+        kind="grant",
+        base_path="./data",
+        year=None,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+        source=None,
+        status_path=None,
+        db_path=None,
+        sharded=False,
+        max_workers=4,
+        callback=None,
+        stop_event=None,
+        progress=None,
+        memory_governor=None,
+    ):
+        self.kind = validate_kind(kind)
+        self.base_path = base_path
+        self.year = year
+        self.poll_interval = poll_interval
+        self.source = source or CachedListingSource(
+            HttpSource(), os.path.join(base_path, LISTING_CACHE_DIR)
+        )
+        self.status_path = status_path or os.path.join(base_path, "daemon_status.json")
+        self.state_path = os.path.join(base_path, f"daemon_state_{self.kind}.json")
+        self.db_path = db_path
+        self.sharded = sharded
+        self.max_workers = max_workers
+        self.callback = callback
+        self.stop_event = stop_event or multiprocessing.Event()
+        self.progress = progress
+        self.memory_governor = memory_governor
+
+        # {year: {base_name: revision}} of files already stored
+        self.ingested = _read_json(self.state_path, {})
+        self.status = {
+            "state": STATUS_STARTING,
+            "pid": os.getpid(),
+            "kind": self.kind,
+            "source": str(self.source),
+            "started_at": _now(),
+            "last_poll": None,
+            "next_poll": None,
+            "last_success": None,
+            "last_error": None,
+            "last_files": [],
+            "incomplete_files": [],
+            "files_ingested": 0,
+            "patents_stored": 0,
+        }
+
+    def _log(self, message):
+        if self.callback:
+            self.callback(message)
+
+    def _set_status(self, **fields):
+        self.status.update(fields)
+        self.status["updated_at"] = _now()
+        try:
+            _write_json(self.status_path, self.status)
+        except OSError as e:
+            self._log(f"Could not write status file {self.status_path}: {e}")
+
+    def _current_year(self):
+        return self.year or datetime.date.today().year
+
+    def new_files(self, year):
+        """Latest revisions in the year listing that have not been ingested yet."""
+        seen = self.ingested.get(str(year), {})
+        new = []
+        for file_name in get_latest_versions(
+            self.source.list_files(year, self.kind), self.kind[0]
+        ):
+            base_name, revision = split_revision(file_name)
+            if base_name not in seen or revision > seen[base_name]:
+                new.append(file_name)
+        return new
+
+    def _mark_ingested(self, year, file_name):
+        base_name, revision = split_revision(file_name)
+        self.ingested.setdefault(str(year), {})[base_name] = revision
+        _write_json(self.state_path, self.ingested)
+
+    def _ingest_file(self, year, file_name):
+        """Fetch, unzip and store one weekly file; return the patents stored."""
+        download_path = os.path.join(self.base_path, f"patent_{self.kind}_{year}_zip")
+        unzip_path = os.path.join(self.base_path, f"patent_{self.kind}s_{year}")
+        os.makedirs(unzip_path, exist_ok=True)
+
+        failed = download_files(
+            self.source,
+            year,
+            self.kind,
+            download_path,
+            [file_name],
+            self.callback,
+            self.stop_event,
+            progress=self.progress,
+        )
+        if failed:
+            raise IntegrityError(f"Could not download {file_name} intact")
+
+        # CRCs are checked while extracting; a corrupt zip is not marked ingested
+        manifest = VerificationManifest(download_path)
+        try:
+            xml_names = [
+                name
+                for name in extract_zip_verified(
+                    os.path.join(download_path, file_name), unzip_path
+                )
+                if name.endswith(".xml")
+            ]
+            manifest.record_check(file_name)
+        except zipfile.BadZipFile as e:
+            manifest.record_check(file_name, e)
+            raise
+        finally:
+            manifest.save()
+
+        pipeline = IngestionPipeline(
+            unzip_path,
+            self.processor,
+            callback=self.callback,
+            max_workers=self.max_workers,
+            year=year,
+            stop_event=self.stop_event,
+            db_path=self.db_path,
+            sharded=self.sharded,
+            file_names=xml_names,
+            classify_pool=self.classify_pool,
+            progress=self.progress,
+            memory_governor=self.memory_governor,
+        )
+        stored = asyncio.run(pipeline.run())
+        if not self.stop_event.is_set():
+            self._check_complete(file_name, pipeline)
+        return stored
+
+    def _check_complete(self, file_name, pipeline):
+        """Raise IncompleteIngestion unless ``pipeline`` read and stored the whole file."""
+        if self._broken_pools():
+            raise IncompleteIngestion(
+                f"{file_name}: a worker pool broke during ingestion"
+            )
+        census = pipeline.census
+        if not census["documents"]:
+            raise IncompleteIngestion(f"{file_name}: no documents were read")
+        extracted = sum(
+            census[column]
+            for column in CENSUS_COLUMNS
+            if column not in ("documents", "duplicates")
+        )
+        if census["failed"] > MAX_FAILED_SHARE * extracted:
+            raise IncompleteIngestion(
+                f"{file_name}: {census['failed']} of {extracted} documents failed"
+            )
+        if pipeline.grand_total < census["with_examples"]:
+            raise IncompleteIngestion(
+                f"{file_name}: stored {pipeline.grand_total} of "
+                f"{census['with_examples']} patents with examples"
+            )
+
+    def _start_pools(self):
+        optimal_workers = max(1, (multiprocessing.cpu_count() * 3) // 4)
+        self.processor = PatentProcessor(max_workers=self.max_workers)
+        self.classify_pool = track_executor(
+            ProcessPoolExecutor(max_workers=optimal_workers), "classifiers"
+        )
+
+    def _stop_pools(self):
+        release_executor(self.classify_pool)
+        self.classify_pool.shutdown()
+        self.processor.shutdown()
+
+    def _broken_pools(self):
+        """Names of the warm pools whose workers died (BrokenProcessPool)."""
+        pools = {
+            "extraction": self.processor.process_pool,
+            "classification": self.classify_pool,
+        }
+        return [name for name, pool in pools.items() if getattr(pool, "_broken", False)]
+
+    def _replace_broken_pools(self):
+        broken = self._broken_pools()
+        if broken:
+            self._log(f"Restarting broken worker pools: {', '.join(broken)}")
+            self._stop_pools()
+            self._start_pools()
+
+    def poll_once(self):
+        """Check the listing once and ingest anything new; return the files ingested."""
+        year = self._current_year()
+        self._set_status(state=STATUS_POLLING, last_poll=_now(), year=year)
+        files = self.new_files(year)
+        if not files:
+            self._log(f"No new {self.kind} files for {year}")
+            self._set_status(incomplete_files=[])
+            return []
+
+        self._log(f"Found {len(files)} new {self.kind} file(s) for {year}: {files}")
+        ingested = []
+        incomplete = []
+        for file_name in files:
+            if self.stop_event.is_set():
+                break
+            self._replace_broken_pools()
+            self._set_status(state=STATUS_INGESTING, current_file=file_name)
+            try:
+                stored = self._ingest_file(year, file_name)
+            except IncompleteIngestion as e:
+                self._log(f"Not marking {file_name} as ingested: {str(e)}")
+                self._set_status(last_error=f"{_now()}: {str(e)}")
+                incomplete.append(file_name)
+                continue
+            if self.stop_event.is_set():
+                # A stopped pipeline may have stored only part of the file
+                break
+            self._mark_ingested(year, file_name)
+            ingested.append(file_name)
+            self._set_status(
+                files_ingested=self.status["files_ingested"] + 1,
+                patents_stored=self.status["patents_stored"] + stored,
+            )
+        self._set_status(
+            current_file=None, last_files=ingested, incomplete_files=incomplete
+        )
+        return ingested
+
+    def run(self):
+        """Poll until the stop event is set."""
+        self._start_pools()
+        self._log(
+            f"Daemon started: polling {self.status['source']} every {self.poll_interval}s"
+        )
+        try:
+            # A stop cancels in-flight extraction instead of waiting for the file
+            with cancel_when_set(self.stop_event, callback=self.callback):
+                while not self.stop_event.is_set():
+                    try:
+                        self.poll_once()
+                        if not self.status["incomplete_files"]:
+                            self._set_status(last_success=_now(), last_error=None)
+                    except Exception as e:
+                        self._log(f"Poll failed: {str(e)}")
+                        self._set_status(last_error=f"{_now()}: {str(e)}")
+
+                    next_poll = time.time() + self.poll_interval
+                    self._set_status(
+                        state=STATUS_IDLE,
+                        next_poll=datetime.datetime.fromtimestamp(next_poll).isoformat(
+                            timespec="seconds"
+                        ),
+                    )
+                    self.stop_event.wait(self.poll_interval)
+        finally:
+            self._stop_pools()
+            self._set_status(state=STATUS_STOPPED, next_poll=None)
+            self._log("Daemon stopped")
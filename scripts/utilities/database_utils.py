@@ -3,12 +3,300 @@ import time
 import os
 import logging
 import random
+import numpy as np
+import pandas as pd
 from contextlib import contextmanager
+from .records import records_from_dict
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_DB_PATH = os.path.join("db", "patents.db")
+
+# Tables that are written per shard and exposed as union views by connect_read
+SHARDED_TABLES = ["patent_examples", "patent_statistics", "patent_ipc", "patent_census"]
+
+# Per-file document counts of patent_census, in column order
+CENSUS_COLUMNS = [
+    "documents",
+    "duplicates",
+    "sequence_listing",
+    "too_short",
+    "no_examples",
+    "failed",
+    "with_examples",
+]
+
+FILE_PREFIX_KINDS = {"ipg": "grant", "ipa": "application"}
+
+
+def ensure_db_dir(db_path):
+    """Create the directory holding ``db_path`` if it doesn't exist."""
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+
+
+def kind_from_file_name(file_name):
+    """Return 'grant' or 'application' from an ipgYYMMDD/ipaYYMMDD file name."""
+    return FILE_PREFIX_KINDS.get(os.path.basename(file_name)[:3])
+
+
+def get_shard_dir(db_path=DEFAULT_DB_PATH):
+    """Directory holding the year/kind shards that belong to ``db_path``."""
+    return os.path.splitext(db_path)[0] + "_shards"
+
+
+def get_shard_path(db_path=DEFAULT_DB_PATH, year=None, kind=None):
+    """Return the shard file for one year/kind, e.g. db/patents_shards/grant_2020.db."""
+    return os.path.join(
+        get_shard_dir(db_path), f"{kind or 'unknown'}_{year or 'unknown'}.db"
+    )
+
+
+def resolve_db_path(db_path=None, year=None, kind=None, sharded=False):
+    """Return the database file that a write for ``year``/``kind`` should go to."""
+    db_path = db_path or DEFAULT_DB_PATH
+    if sharded:
+        return get_shard_path(db_path, year, kind)
+    return db_path
+
+
+def list_shards(db_path=DEFAULT_DB_PATH, years=None, kinds=None):
+    """List (kind, year, path) of existing shards, optionally filtered."""
+    shard_dir = get_shard_dir(db_path)
+    if not os.path.isdir(shard_dir):
+        return []
+
+    years = {str(y) for y in years} if years else None
+    shards = []
+    for file_name in sorted(os.listdir(shard_dir)):
+        if not file_name.endswith(".db"):
+            continue
+        kind, _, year = file_name[:-3].rpartition("_")
+        if years and year not in years:
+            continue
+        if kinds and kind not in kinds:
+            continue
+        shards.append((kind, year, os.path.join(shard_dir, file_name)))
+    return shards
+
+
+def _table_columns(cursor, schema, table):
+    cursor.execute(f"PRAGMA {schema}.table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def ensure_columns(cursor, table, columns):
+    """Add any of ``columns`` ({name: type}) missing from a table created by an older schema."""
+    existing = set(_table_columns(cursor, "main", table))
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+
+def _attach_limit(conn):
+    if hasattr(conn, "getlimit"):
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    return 10  # SQLite's default SQLITE_MAX_ATTACHED
+
+
+@contextmanager
+def _attached(cursor, paths):
+    """ATTACH ``paths`` as shard0..shardN for the block and DETACH them after it."""
+    schemas = []
+    try:
+        for i, path in enumerate(paths):
+            schema = f"shard{i}"
+            cursor.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+            schemas.append(schema)
+        yield schemas
+    finally:
+        for schema in schemas:
+            cursor.execute(f"DETACH DATABASE {schema}")
+
+
+def _table_layouts(cursor, schemas):
+    """
+    {table: {column: type}} over the column superset of every schema, so
+    shards created by older schemas still line up, and {schema: {table:
+    columns}} of the tables each schema actually has.
+    """
+    layouts = {}
+    present = {}
+    for schema in schemas:
+        for table in SHARDED_TABLES:
+            cursor.execute(f"PRAGMA {schema}.table_info({table})")
+            info = cursor.fetchall()
+            if not info:
+                continue
+            present.setdefault(schema, {})[table] = {row[1] for row in info}
+            columns = layouts.setdefault(table, {})
+            for row in info:
+                columns.setdefault(row[1], row[2])
+    return layouts, present
+
+
+def _select_all(schema, table, columns, schema_columns):
+    select_list = ", ".join(
+        col if col in schema_columns else f"NULL AS {col}" for col in columns
+    )
+    return f"SELECT {select_list} FROM {schema}.{table}"
+
+
+def _union_views(cursor, schemas):
+    """Expose each table of the attached ``schemas`` as one TEMP union view."""
+    layouts, present = _table_layouts(cursor, schemas)
+    for table, columns in layouts.items():
+        selects = [
+            _select_all(schema, table, columns, tables[table])
+            for schema, tables in present.items()
+            if table in tables
+        ]
+        cursor.execute(f"CREATE TEMP VIEW {table} AS " + " UNION ALL ".join(selects))
+
+
+def _merge_sources(conn, sources, batch_size):
+    """
+    Copy every table of ``sources`` into ``conn``, ``batch_size`` files at a time.
+
+    Used when there are more files than SQLite can ATTACH at once.
+    """
+    cursor = conn.cursor()
+    batches = [sources[i : i + batch_size] for i in range(0, len(sources), batch_size)]
+    layouts = {}
+    for batch in batches:
+        with _attached(cursor, batch) as schemas:
+            batch_layouts, _ = _table_layouts(cursor, schemas)
+        for table, columns in batch_layouts.items():
+            merged = layouts.setdefault(table, {})
+            for column, column_type in columns.items():
+                merged.setdefault(column, column_type)
+
+    for table, columns in layouts.items():
+        cursor.execute(
+            f"CREATE TABLE {table} ("
+            + ", ".join(
+                f"{column} {column_type}" for column, column_type in columns.items()
+            )
+            + ")"
+        )
+    for batch in batches:
+        with _attached(cursor, batch) as schemas:
+            _, present = _table_layouts(cursor, schemas)
+            for schema, tables in present.items():
+                for table, schema_columns in tables.items():
+                    cursor.execute(
+                        f"INSERT INTO {table} "
+                        + _select_all(schema, table, layouts[table], schema_columns)
+                    )
+            conn.commit()
+
+
+def connect_read(db_path=None, years=None, kinds=None):
+    """
+    Open a read connection over the main database and all of its shards.
+
+    Without shards this is a plain connection to ``db_path``. Otherwise every
+    shard is ATTACHed and each table in SHARDED_TABLES is exposed as a TEMP
+    view unioning the main database and the shards, so callers can keep
+    querying ``patent_examples``/``patent_statistics`` as one dataset.
+
+    SQLite attaches at most SQLITE_LIMIT_ATTACHED (by default 10) databases
+    to a connection. With more shards than that the tables are instead
+    copied, a batch of shards at a time, into a temporary database that is
+    deleted when the connection is closed; the tables then read the same.
+    Callers reading repeatedly should hold on to the connection, e.g. with a
+    ReadConnectionCache, and close it when done (``with conn:`` only commits).
+
+    Args:
+        db_path: Main database path (defaults to DEFAULT_DB_PATH)
+        years: Optional iterable of years to restrict the shards to
+        kinds: Optional iterable of kinds to restrict the shards to
+
+    Returns:
+        sqlite3.Connection
+    """
+    db_path = db_path or DEFAULT_DB_PATH
+    shards = list_shards(db_path, years, kinds)
+    if not shards:
+        return sqlite3.connect(db_path)
+
+    sources = ([db_path] if os.path.exists(db_path) else []) + [s[2] for s in shards]
+    conn = sqlite3.connect(":memory:")
+    attach_limit = _attach_limit(conn)
+    if len(sources) <= attach_limit:
+        cursor = conn.cursor()
+        schemas = []
+        for i, path in enumerate(sources):
+            schemas.append(f"shard{i}")
+            cursor.execute(f"ATTACH DATABASE ? AS {schemas[-1]}", (path,))
+        _union_views(cursor, schemas)
+        return conn
+
+    # An empty file name is a private on-disk temp database, so a merged
+    # decade of examples doesn't have to fit in memory
+    conn.close()
+    conn = sqlite3.connect("")
+    try:
+        _merge_sources(conn, sources, _attach_limit(conn))
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def _read_signature(db_path, years=None, kinds=None):
+    """Size and mtime of every database connect_read would open, WAL files included."""
+    paths = [db_path] + [path for _, _, path in list_shards(db_path, years, kinds)]
+    signature = []
+    for path in paths:
+        for name in (path, f"{path}-wal"):
+            try:
+                stat = os.stat(name)
+            except OSError:
+                continue
+            signature.append((name, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+class ReadConnectionCache:
+    """
+    A connect_read connection kept open and handed out again between reads.
+
+    Over more shards than SQLite can attach, connect_read copies every shard,
+    so interactive callers such as the GUI keep one connection and get it
+    back as long as the same databases are asked for and none of their files
+    has changed; a write or a new shard makes the next get() reopen it. The
+    cache owns the connection: callers must not close it. A connection only
+    works in the thread that opened it.
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._key = None
+
+    def get(self, db_path=None, years=None, kinds=None):
+        db_path = db_path or DEFAULT_DB_PATH
+        key = (
+            db_path,
+            tuple(sorted(years)) if years else None,
+            tuple(sorted(kinds)) if kinds else None,
+            _read_signature(db_path, years, kinds),
+        )
+        if self._conn is None or key != self._key:
+            self.close()
+            self._conn = connect_read(db_path, years, kinds)
+            self._key = key
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._key = None
+
 
 class DatabaseConnection:
     def __init__(self, db_path, max_retries=5, initial_delay=1, max_delay=30):
@@ -105,162 +393,448 @@ def database_operation_with_retry(db_path, operation_name, max_retries=5):
             delay = min(delay * 2, 30)  # Exponential backoff up to 30 seconds
 
 
-def store_patent_examples(examples, db_path="db/patents.db"):
-    """Store patent examples with improved error handling and retry logic."""
-    try:
-        with database_operation_with_retry(db_path, "store_patent_examples") as conn:
-            cursor = conn.cursor()
+def _insert_patent_examples(cursor, examples):
+    """Insert ``examples`` (ExampleRecords or the legacy dict) through ``cursor``."""
+    cursor.execute("""CREATE TABLE IF NOT EXISTS patent_examples (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patent_number TEXT NOT NULL,
+        example_name TEXT,
+        example_content TEXT NOT NULL,
+        tense TEXT,
+        past_percentage REAL,
+        present_percentage REAL,
+        unknown_percentage REAL,
+        why_unknown TEXT,
+        tense_breakdown TEXT,
+        has_mixed INTEGER
+    );""")
+    ensure_columns(cursor, "patent_examples", {"has_mixed": "INTEGER"})
+
+    # Legacy {patent_number: [example dict, ...]} input is flattened to records
+    if isinstance(examples, dict):
+        examples = records_from_dict(examples)
+
+    by_patent = {}
+    for record in examples:
+        by_patent.setdefault(record.patent_number, []).append(record)
+
+    for patent_number, records in by_patent.items():
+        try:
+            cursor.execute(
+                "SELECT patent_number FROM patent_examples WHERE patent_number = ?",
+                (patent_number,),
+            )
+            if cursor.fetchone() is not None:
+                continue
+
+            cursor.executemany(
+                """INSERT OR REPLACE INTO patent_examples 
+                (patent_number, example_name, example_content, tense, past_percentage,
+                present_percentage, unknown_percentage, why_unknown, tense_breakdown,
+                has_mixed) 
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                [
+                    (
+                        patent_number,
+                        record.number,
+                        record.full_text.replace("\n\n", ""),
+                        record.tense,
+                        record.past_percentage,
+                        record.present_percentage,
+                        record.unknown_percentage,
+                        record.why_unknown,
+                        record.tense_breakdown if record.tense != "unknown" else "",
+                        int(record.has_mixed),
+                    )
+                    for record in records
+                ],
+            )
+        except Exception as e:
+            logger.error(f"Error processing patent {patent_number}: {str(e)}")
+            continue
 
-            cursor.execute("""CREATE TABLE IF NOT EXISTS patent_examples (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                patent_number TEXT NOT NULL,
-                example_name TEXT,
-                example_content TEXT NOT NULL,
-                tense TEXT,
-                past_percentage REAL,
-                present_percentage REAL,
-                unknown_percentage REAL,
-                why_unknown TEXT,
-                tense_breakdown TEXT
-            );""")
 
-            for patent_number, examples_list in examples.items():
-                try:
-                    cursor.execute(
-                        "SELECT patent_number FROM patent_examples WHERE patent_number = ?",
-                        (patent_number,),
-                    )
-                    if cursor.fetchone() is None and isinstance(examples_list, list):
-                        for example in examples_list:
-                            if not isinstance(example, dict):
-                                continue
-
-                            content = example.get("content", [])
-                            title = example.get("title", "")
-
-                            if not isinstance(content, list):
-                                content = [str(content)]
-
-                            content_list = content.copy()
-                            if title:
-                                content_list.insert(0, str(title) + ".")
-
-                            full_content = "".join(str(item) for item in content_list)
-
-                            cursor.execute(
-                                """INSERT OR REPLACE INTO patent_examples 
-                                (patent_number, example_name, example_content, tense, past_percentage,
-                                present_percentage, unknown_percentage, why_unknown, tense_breakdown) 
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                                (
-                                    patent_number,
-                                    example.get("number", ""),
-                                    full_content.replace("\n\n", ""),
-                                    example.get("tense", ""),
-                                    example.get("past_percentage", 0.0),
-                                    example.get("present_percentage", 0.0),
-                                    example.get("unknown_percentage", 0.0),
-                                    example.get("why_unknown", ""),
-                                    example.get("tense_breakdown", "")
-                                    if example.get("tense") != "unknown"
-                                    else "",
-                                ),
-                            )
-                except Exception as e:
-                    logger.error(f"Error processing patent {patent_number}: {str(e)}")
-                    continue
+def store_patent_examples(examples, db_path=DEFAULT_DB_PATH):
+    """
+    Store patent examples with improved error handling and retry logic.
+
+    ``examples`` is a list of ExampleRecords (or the legacy
+    {patent_number: [example dict, ...]} mapping).
+    """
+    try:
+        ensure_db_dir(db_path)
+
+        with database_operation_with_retry(db_path, "store_patent_examples") as conn:
+            _insert_patent_examples(conn.cursor(), examples)
 
     except Exception as e:
         logger.error(f"Error storing patent examples: {str(e)}")
         raise
 
 
-def store_patent_statistics(stats, db_path="db/patents.db", year=None):
-    """Store patent statistics with improved error handling and retry logic."""
+def statistics_frame(stats):
+    """
+    Per-patent statistics rows ready for patent_statistics.
+
+    ``stats`` is the DataFrame returned by tense_statistics or the legacy
+    {patent_number: {"past", "present", "unknown", "mixed_tense_percentage"}}
+    dict. The prophetic indicators are derived column-wise and legacy
+    ``"42%"`` percentages are converted to floats.
+    """
+    if isinstance(stats, dict):
+        valid = {
+            patent_number: stat
+            for patent_number, stat in stats.items()
+            if isinstance(stat, dict) and {"past", "present", "unknown"} <= stat.keys()
+        }
+        for patent_number in stats.keys() - valid.keys():
+            logger.warning(
+                f"Warning: Invalid stat format for patent {patent_number}: {stats[patent_number]}"
+            )
+        stats = pd.DataFrame.from_dict(
+            valid,
+            orient="index",
+            columns=["past", "present", "unknown", "mixed_tense_percentage"],
+        )
+
+    frame = pd.DataFrame(index=stats.index.astype(str))
+    for column in ("past", "present", "unknown"):
+        frame[column] = stats[column].fillna(0).astype(np.int64).to_numpy()
+    mixed = stats.get("mixed_tense_percentage")
+    if mixed is None:
+        frame["mixed_tense_percentage"] = 0.0
+    else:
+        frame["mixed_tense_percentage"] = (
+            pd.to_numeric(
+                (
+                    mixed
+                    if pd.api.types.is_numeric_dtype(mixed)
+                    else mixed.astype(str).str.rstrip("%")
+                ),
+                errors="coerce",
+            )
+            .fillna(0.0)
+            .astype(float)
+            .to_numpy()
+        )
+
+    present = frame["present"].to_numpy()
+    total = present + frame["past"].to_numpy() + frame["unknown"].to_numpy()
+    has_examples = total > 0
+    all_prophetic = has_examples & (present == total)
+    frame["all_prophetic"] = all_prophetic.astype(np.int64)
+    frame["some_prophetic"] = (has_examples & (present > 0) & ~all_prophetic).astype(
+        np.int64
+    )
+    frame["no_prophetic"] = (has_examples & (present == 0)).astype(np.int64)
+    return frame
+
+
+def _statistics_rows(stats, year, kind=None):
+    frame = statistics_frame(stats)
+    return list(
+        zip(
+            frame.index.tolist(),
+            [year] * len(frame),
+            [kind] * len(frame),
+            frame["present"].tolist(),
+            frame["past"].tolist(),
+            frame["unknown"].tolist(),
+            frame["mixed_tense_percentage"].tolist(),
+            frame["all_prophetic"].tolist(),
+            frame["some_prophetic"].tolist(),
+            frame["no_prophetic"].tolist(),
+        )
+    )
+
+
+def _insert_patent_statistics(cursor, rows):
+    """Insert or replace the _statistics_rows ``rows`` through ``cursor``."""
+    # Modified schema with new binary columns
+    cursor.execute("""CREATE TABLE IF NOT EXISTS patent_statistics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patent_number TEXT NOT NULL UNIQUE,
+        year INTEGER,
+        kind TEXT,
+        prophetic INTEGER,
+        nonprophetic INTEGER,
+        unknown INTEGER,
+        mixed_tense_percentage REAL,
+        all_prophetic INTEGER DEFAULT 0,
+        some_prophetic INTEGER DEFAULT 0,
+        no_prophetic INTEGER DEFAULT 0
+    );""")
+    ensure_columns(cursor, "patent_statistics", {"kind": "TEXT"})
+
+    # Count rows before insertion
+    cursor.execute("SELECT COUNT(*) FROM patent_statistics")
+    before_count = cursor.fetchone()[0]
+    logger.info(f"Patent statistics rows before insertion: {before_count}")
+
+    cursor.executemany(
+        """INSERT OR REPLACE INTO patent_statistics 
+        (patent_number, year, kind, prophetic, nonprophetic, unknown, 
+        mixed_tense_percentage, all_prophetic, some_prophetic, no_prophetic) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        rows,
+    )
+
+    # Count rows after insertion
+    cursor.execute("SELECT COUNT(*) FROM patent_statistics")
+    after_count = cursor.fetchone()[0]
+    logger.info(
+        f"Patent statistics rows after insertion: {after_count} (inserted {len(rows)})"
+    )
+
+
+def store_patent_statistics(stats, db_path=DEFAULT_DB_PATH, year=None, kind=None):
+    """
+    Store patent statistics with improved error handling and retry logic.
+
+    ``stats`` is anything statistics_frame accepts; the whole batch is written
+    with a single executemany. ``kind`` (grant, application) is stored with
+    every row so rates can be split by kind like the census.
+    """
     try:
         logger.info(f"Storing statistics for {len(stats)} patents")
         if year:
             logger.info(f"Using year: {year}")
 
+        rows = _statistics_rows(stats, year, kind)
+
         # Create db directory if it doesn't exist
-        if not os.path.exists(os.path.dirname(db_path)):
-            os.makedirs(os.path.dirname(db_path))
+        ensure_db_dir(db_path)
 
         with database_operation_with_retry(db_path, "store_patent_statistics") as conn:
-            cursor = conn.cursor()
+            _insert_patent_statistics(conn.cursor(), rows)
+        return True
+    except Exception as e:
+        logger.error(f"Error storing patent statistics: {str(e)}")
+        return False
 
-            # Modified schema with new binary columns
-            cursor.execute("""CREATE TABLE IF NOT EXISTS patent_statistics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                patent_number TEXT NOT NULL UNIQUE,
-                year INTEGER,
-                prophetic INTEGER,
-                nonprophetic INTEGER,
-                unknown INTEGER,
-                mixed_tense_percentage REAL,
-                all_prophetic INTEGER DEFAULT 0,
-                some_prophetic INTEGER DEFAULT 0,
-                no_prophetic INTEGER DEFAULT 0
-            );""")
 
-            # Count rows before insertion
-            cursor.execute("SELECT COUNT(*) FROM patent_statistics")
-            before_count = cursor.fetchone()[0]
-            logger.info(f"Patent statistics rows before insertion: {before_count}")
-
-            inserted_count = 0
-            for patent_number, stat in stats.items():
-                if "past" in stat and "present" in stat and "unknown" in stat:
-                    # Calculate prophetic indicators
-                    total_examples = stat["past"] + stat["present"] + stat["unknown"]
-                    all_prophetic = (
-                        1
-                        if total_examples > 0 and stat["present"] == total_examples
-                        else 0
-                    )
-                    no_prophetic = (
-                        1 if total_examples > 0 and stat["present"] == 0 else 0
-                    )
-                    some_prophetic = (
-                        1
-                        if total_examples > 0
-                        and stat["present"] > 0
-                        and not all_prophetic
-                        else 0
-                    )
+def store_patent_batch(examples, stats, db_path=DEFAULT_DB_PATH, year=None, kind=None):
+    """
+    Store a classified batch: its examples and their statistics.
+
+    Both are written one after the other in a single transaction, so a batch
+    is stored whole or not at all and takes the database's write lock once.
+    Errors are raised rather than logged and swallowed.
+    """
+    rows = _statistics_rows(stats, year, kind)
+    ensure_db_dir(db_path)
+    with database_operation_with_retry(db_path, "store_patent_batch") as conn:
+        cursor = conn.cursor()
+        _insert_patent_examples(cursor, examples)
+        _insert_patent_statistics(cursor, rows)
+    return True
+
+
+def store_patent_ipc(classifications, db_path=DEFAULT_DB_PATH, year=None):
+    """
+    Store the IPC codes of every patent of a file, with or without examples.
+
+    ``classifications`` maps patent numbers to their (section, class, subclass)
+    codes in document order; position 0 is the first (primary) classification.
+    A patent without codes gets a single row with NULL codes, so it still
+    counts in sector totals. Rows of patents stored before are replaced.
+    """
+    rows = []
+    for patent_number, codes in classifications.items():
+        if not codes:
+            rows.append((patent_number, 0, year, None, None, None))
+        for position, (section, class_code, subclass) in enumerate(codes):
+            rows.append(
+                (patent_number, position, year, section, class_code, subclass or None)
+            )
+    if not rows:
+        return True
 
-                    mixed_tense_pct = stat.get("mixed_tense_percentage", 0.0)
+    try:
+        ensure_db_dir(db_path)
+        with database_operation_with_retry(db_path, "store_patent_ipc") as conn:
+            cursor = conn.cursor()
+            cursor.execute("""CREATE TABLE IF NOT EXISTS patent_ipc (
+                patent_number TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                year INTEGER,
+                section TEXT,
+                class TEXT,
+                subclass TEXT,
+                PRIMARY KEY (patent_number, position)
+            ) WITHOUT ROWID;""")
+            cursor.executemany(
+                "DELETE FROM patent_ipc WHERE patent_number = ?",
+                [(patent_number,) for patent_number in classifications],
+            )
+            cursor.executemany(
+                """INSERT INTO patent_ipc
+                (patent_number, position, year, section, class, subclass)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                rows,
+            )
+        return True
+    except Exception as e:
+        logger.error(f"Error storing patent IPC codes: {str(e)}")
+        return False
 
-                    cursor.execute(
-                        """INSERT OR REPLACE INTO patent_statistics 
-                        (patent_number, year, prophetic, nonprophetic, unknown, 
-                        mixed_tense_percentage, all_prophetic, some_prophetic, no_prophetic) 
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                        (
-                            patent_number,
-                            year,
-                            stat["present"],
-                            stat["past"],
-                            stat["unknown"],
-                            mixed_tense_pct,
-                            all_prophetic,
-                            some_prophetic,
-                            no_prophetic,
-                        ),
-                    )
-                    inserted_count += 1
-                else:
-                    logger.warning(
-                        f"Warning: Invalid stat format for patent {patent_number}: {stat}"
-                    )
 
-            # Count rows after insertion
-            cursor.execute("SELECT COUNT(*) FROM patent_statistics")
-            after_count = cursor.fetchone()[0]
-            logger.info(
-                f"Patent statistics rows after insertion: {after_count} (inserted {inserted_count})"
+# Grouping expressions of sector_prophetic_rates
+IPC_LEVELS = {
+    "section": "section",
+    "class": "section || class",
+    "subclass": "section || class || COALESCE(subclass, '')",
+}
+
+
+def sector_prophetic_rates(db_path=None, years=None, level="section", kinds=None):
+    """
+    Prophetic-example rates per IPC section, class or subclass.
+
+    A group-by over ``patent_ipc`` joined with ``patent_statistics`` (main
+    database and shards), so no XML is read. By section every patent counts
+    once, under its primary classification (NULL when it has none); by class
+    or subclass it counts once under each distinct code it carries.
+
+    Returns:
+        pandas.DataFrame with one row per code: patents, with_examples, the
+        all/some/no_prophetic patent counts and their share of with_examples
+    """
+    if level not in IPC_LEVELS:
+        raise ValueError(f"level must be one of {sorted(IPC_LEVELS)}, got {level!r}")
+    conditions = [] if level != "section" else ["position = 0"]
+    params = []
+    if years:
+        years = list(years)
+        conditions.append(f"year IN ({', '.join('?' * len(years))})")
+        params.extend(years)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+        SELECT i.code AS {level},
+            COUNT(*) AS patents,
+            COUNT(s.patent_number) AS with_examples,
+            COALESCE(SUM(s.all_prophetic), 0) AS all_prophetic,
+            COALESCE(SUM(s.some_prophetic), 0) AS some_prophetic,
+            COALESCE(SUM(s.no_prophetic), 0) AS no_prophetic
+        FROM (
+            SELECT DISTINCT patent_number, {IPC_LEVELS[level]} AS code
+            FROM patent_ipc {where}
+        ) AS i
+        LEFT JOIN patent_statistics AS s ON s.patent_number = i.patent_number
+        GROUP BY i.code
+        ORDER BY i.code
+    """
+    conn = connect_read(db_path, years, kinds)
+    try:
+        frame = pd.read_sql(query, conn, params=params)
+    finally:
+        conn.close()
+
+    with_examples = frame["with_examples"].where(frame["with_examples"] > 0)
+    frame["examples_rate"] = frame["with_examples"] / frame["patents"]
+    for column in ["all_prophetic", "some_prophetic", "no_prophetic"]:
+        frame[f"{column}_rate"] = (frame[column] / with_examples).fillna(0.0)
+    return frame
+
+
+def store_file_census(file_name, census, db_path=DEFAULT_DB_PATH, year=None, kind=None):
+    """
+    Store the document counts of one weekly file in ``patent_census``.
+
+    ``census`` maps CENSUS_COLUMNS to counts: every document of the file,
+    versions dropped as duplicates (or for lacking a number), the documents
+    skipped as sequence listings, as too short or for having no examples,
+    those that failed extraction and those with examples. A file ingested
+    again replaces its row.
+    """
+    try:
+        ensure_db_dir(db_path)
+        with database_operation_with_retry(db_path, "store_file_census") as conn:
+            cursor = conn.cursor()
+            cursor.execute("""CREATE TABLE IF NOT EXISTS patent_census (
+                file_name TEXT PRIMARY KEY,
+                year INTEGER,
+                kind TEXT,
+                documents INTEGER DEFAULT 0,
+                duplicates INTEGER DEFAULT 0,
+                sequence_listing INTEGER DEFAULT 0,
+                too_short INTEGER DEFAULT 0,
+                no_examples INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                with_examples INTEGER DEFAULT 0
+            );""")
+            cursor.execute(
+                f"""INSERT OR REPLACE INTO patent_census
+                (file_name, year, kind, {", ".join(CENSUS_COLUMNS)})
+                VALUES ({", ".join("?" * (len(CENSUS_COLUMNS) + 3))})""",
+                [file_name, year, kind]
+                + [int(census.get(column, 0)) for column in CENSUS_COLUMNS],
             )
         return True
     except Exception as e:
-        logger.error(f"Error storing patent statistics: {str(e)}")
+        logger.error(f"Error storing census of {file_name}: {str(e)}")
         return False
+
+
+def yearly_prophetic_rates(db_path=None, years=None, kinds=None):
+    """
+    Prophetic-example rates per year with all ingested documents as denominator.
+
+    Sums ``patent_census`` per year and joins the all/some/no-prophetic counts
+    of ``patent_statistics``, so no file has to be re-scanned. ``years`` and
+    ``kinds`` filter both tables; statistics stored before the kind column
+    existed have no kind and only count when ``kinds`` is not given.
+
+    Returns:
+        pandas.DataFrame with one row per year: the census counts, ``patents``
+        (documents without duplicates), the prophetic counts and rates of
+        patents with examples and with examples over all patents
+    """
+    conditions = []
+    params = []
+    for column, values in (("year", years), ("kind", kinds)):
+        if values:
+            values = list(values)
+            conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    census_sums = ", ".join(f"SUM({column}) AS {column}" for column in CENSUS_COLUMNS)
+    query = f"""
+        WITH census AS (
+            SELECT year, COUNT(*) AS files, {census_sums}
+            FROM patent_census {where}
+            GROUP BY year
+        ), statistics AS (
+            SELECT year,
+                COUNT(*) AS stored,
+                SUM(all_prophetic) AS all_prophetic,
+                SUM(some_prophetic) AS some_prophetic,
+                SUM(no_prophetic) AS no_prophetic
+            FROM patent_statistics {where}
+            GROUP BY year
+        )
+        SELECT census.*,
+            census.documents - census.duplicates AS patents,
+            COALESCE(statistics.stored, 0) AS stored,
+            COALESCE(statistics.all_prophetic, 0) AS all_prophetic,
+            COALESCE(statistics.some_prophetic, 0) AS some_prophetic,
+            COALESCE(statistics.no_prophetic, 0) AS no_prophetic
+        FROM census
+        LEFT JOIN statistics ON statistics.year = census.year
+        ORDER BY census.year
+    """
+    conn = connect_read(db_path, years, kinds)
+    try:
+        frame = pd.read_sql(query, conn, params=params * 2)
+    finally:
+        conn.close()
+
+    patents = frame["patents"].where(frame["patents"] > 0)
+    stored = frame["stored"].where(frame["stored"] > 0)
+    frame["examples_rate"] = (frame["with_examples"] / patents).fillna(0.0)
+    for column in ["all_prophetic", "some_prophetic", "no_prophetic"]:
+        frame[f"{column}_rate"] = (frame[column] / stored).fillna(0.0)
+    frame["prophetic_rate"] = (
+        (frame["all_prophetic"] + frame["some_prophetic"]) / patents
+    ).fillna(0.0)
+    return frame
@@ -0,0 +1,184 @@
+import mmap
+import re
+from contextlib import contextmanager
+from typing import NamedTuple
+
+XML_DECLARATION_BYTES = b'<?xml version="1.0" encoding="UTF-8"?>'
+
+# First doc-number inside the publication-reference block
+DOC_NUMBER_RE = re.compile(
+    rb"<publication-reference>.*?<doc-number>\s*([^<\s]+)\s*</doc-number>", re.DOTALL
+)
+_NON_WHITESPACE_RE = re.compile(rb"\S")
+
+# IPC classifications of a document: the block, then the codes of each entry
+IPCR_BLOCK_RE = re.compile(
+    rb"<classifications-ipcr>(.*?)</classifications-ipcr>", re.DOTALL
+)
+IPCR_CODE_RE = re.compile(
+    rb"<classification-ipcr>.*?<section>\s*([^<\s]+)\s*</section>"
+    rb"\s*<class>\s*([^<\s]+)\s*</class>"
+    rb"(?:\s*<subclass>\s*([^<\s]+)\s*</subclass>)?",
+    re.DOTALL,
+)
+
+# Worker processes keep the last few files mapped between tasks
+_MAPPED_FILES_CACHE_SIZE = 2
+_mapped_files = {}
+
+
+class DocumentSlice(NamedTuple):
+    """Location of one patent document inside a weekly XML file."""
+
+    path: str
+    offset: int
+    length: int
+
+
+def _map_file(path):
+    with open(path, "rb") as f:
+        if not f.seek(0, 2):
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _iter_slices(mm, path):
+    start = mm.find(XML_DECLARATION_BYTES)
+    while start != -1:
+        body = start + len(XML_DECLARATION_BYTES)
+        end = mm.find(XML_DECLARATION_BYTES, body)
+        stop = len(mm) if end == -1 else end
+        if _NON_WHITESPACE_RE.search(mm, body, stop):
+            match = DOC_NUMBER_RE.search(mm, body, stop)
+            doc_number = match.group(1).decode() if match else None
+            yield DocumentSlice(path, body, stop - body), doc_number
+        start = end
+
+
+def iter_document_slices(path):
+    """
+    Yield (slice, doc_number) for every document of a weekly XML file.
+
+    Document boundaries and numbers are found on the raw mapped bytes, so no
+    document is decoded or copied. ``doc_number`` is None when the document has
+    no publication-reference number.
+    """
+    with mapped_document_slices(path) as (_, slices):
+        yield from slices
+
+
+@contextmanager
+def mapped_document_slices(path):
+    """
+    Map a weekly XML file once and yield (buffer, slices).
+
+    ``slices`` iterates like iter_document_slices and ``buffer`` is the
+    mapping itself (None for an empty file), so callers choosing documents
+    by number can copy the ones they keep out of the same mapping. The file
+    is unmapped when the block ends.
+    """
+    mm = _map_file(path)
+    if mm is None:
+        yield None, iter(())
+        return
+    try:
+        yield mm, _iter_slices(mm, path)
+    finally:
+        mm.close()
+
+
+def split_document_slices(path, classifications=None):
+    """
+    Slices of a weekly file with duplicate versions dropped.
+
+    Like remove_duplicate_docs: documents without a number are skipped and for
+    repeated numbers the longest version is kept. If ``classifications`` is a
+    dict, it is filled with {doc_number: find_ipc_codes(...)} of every kept
+    document while the file is mapped, so callers get the IPC codes of all
+    patents, with or without examples, from the same pass.
+
+    Returns:
+        (slices, total_documents), or (None, 0) if the file has no XML declaration
+    """
+    mm = _map_file(path)
+    if mm is None:
+        return None, 0
+    versions = {}
+    total = 0
+    try:
+        for document, doc_number in _iter_slices(mm, path):
+            total += 1
+            if doc_number is None:
+                continue
+            if (
+                doc_number not in versions
+                or document.length > versions[doc_number].length
+            ):
+                versions[doc_number] = document
+        if classifications is not None:
+            for doc_number, document in versions.items():
+                classifications[doc_number] = find_ipc_codes(
+                    mm, document.offset, document.offset + document.length
+                )
+    finally:
+        mm.close()
+    if not total:
+        return None, 0
+    return sorted(versions.values(), key=lambda document: document.offset), total
+
+
+def find_ipc_codes(buffer, pos=0, endpos=None):
+    """
+    Return the (section, class, subclass) codes of a document's classifications-ipcr block.
+
+    Works on the raw bytes (``bytes``, ``mmap`` or a memoryview) between
+    ``pos`` and ``endpos``, in document order, e.g. [("A", "61", "K")].
+    ``subclass`` is "" when an entry has none; an empty list means the
+    document has no IPC classification.
+    """
+    endpos = len(buffer) if endpos is None else endpos
+    block = IPCR_BLOCK_RE.search(buffer, pos, endpos)
+    if block is None:
+        return []
+    return [
+        (section.decode(), class_code.decode(), subclass.decode())
+        for section, class_code, subclass in IPCR_CODE_RE.findall(block.group(1))
+    ]
+
+
+def find_ipc_classes(buffer, pos=0, endpos=None):
+    """
+    Return the (section, class) pairs of a document's classifications-ipcr block.
+
+    Works on the raw bytes (``bytes``, ``mmap`` or a memoryview) between
+    ``pos`` and ``endpos``, in document order, e.g. [("A", "61"), ("C", "07")].
+    An empty list means the document has no IPC classification.
+    """
+    return [
+        (section, class_code)
+        for section, class_code, _ in find_ipc_codes(buffer, pos, endpos)
+    ]
+
+
+def _mapped(path):
+    mm = _mapped_files.get(path)
+    if mm is None:
+        if len(_mapped_files) >= _MAPPED_FILES_CACHE_SIZE:
+            _mapped_files.pop(next(iter(_mapped_files))).close()
+        mm = _mapped_files[path] = _map_file(path)
+    return mm
+
+
+def read_document(document, func):
+    """
+    Call ``func`` with a memoryview of one document, mapping its file in this process.
+
+    The view is only valid during the call; ``func`` must copy what it keeps.
+    Documents stored elsewhere (e.g. a corpus.CorpusDocument) read themselves.
+    """
+    if not isinstance(document, DocumentSlice):
+        return document.read(func)
+    mm = _mapped(document.path)
+    with memoryview(mm) as whole:
+        with whole[document.offset : document.offset + document.length] as view:
+            return func(view)
@@ -0,0 +1,272 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from .progress import STAGE_VERIFY, make_reporter
+
+# Per-directory record of downloaded zips and their checks
+MANIFEST_NAME = "verification.json"
+
+# Bytes read or written per step when streaming files
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class IntegrityError(OSError):
+    """A downloaded or extracted file failed its size or checksum check."""
+
+
+class FetchResult(NamedTuple):
+    """A file written by write_stream, with what was measured while writing it."""
+
+    path: str
+    size: int
+    sha256: str
+    expected_size: int = None
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def write_stream(chunks, path, expected_size=None):
+    """
+    Write ``chunks`` to ``path``, hashing and counting them on the way.
+
+    The data goes to ``<path>.part`` first and is only renamed into place
+    once its size matches ``expected_size`` (when known), so a truncated
+    transfer never leaves a plausible-looking file behind.
+
+    Returns:
+        FetchResult
+
+    Raises:
+        IntegrityError: If the size doesn't match ``expected_size``
+    """
+    part_path = f"{path}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(part_path, "wb") as f:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+        if expected_size is not None and size != expected_size:
+            raise IntegrityError(
+                f"{os.path.basename(path)}: received {size} of {expected_size} bytes"
+            )
+        os.replace(part_path, path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    return FetchResult(path, size, digest.hexdigest(), expected_size)
+
+
+def read_chunks(f, chunk_size=COPY_CHUNK_SIZE):
+    """Iterate over a binary file object in ``chunk_size`` pieces."""
+    return iter(lambda: f.read(chunk_size), b"")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in read_chunks(f):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_zip_verified(zip_path, unzip_path):
+    """
+    Extract every member of a zip, checking each member's CRC as it is written.
+
+    ZipFile raises BadZipFile when a member's CRC or length doesn't match at
+    the end of its stream, so the check costs no extra read.
+
+    Returns:
+        list: Extracted member names
+
+    Raises:
+        zipfile.BadZipFile: If the archive or any member is corrupt
+    """
+    names = []
+    root = os.path.abspath(unzip_path)
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        for info in zip_ref.infolist():
+            target = os.path.abspath(os.path.join(root, info.filename))
+            if os.path.commonpath([root, target]) != root:
+                raise zipfile.BadZipFile(f"Unsafe member path {info.filename}")
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            part_path = f"{target}.part"
+            try:
+                with zip_ref.open(info) as src, open(part_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+                os.replace(part_path, target)
+            except BaseException:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                raise
+            names.append(info.filename)
+    return names
+
+
+class VerificationManifest:
+    """
+    Verification records of the zips in one download directory.
+
+    Stored as ``verification.json`` next to the files:
+    {file_name: {"size", "mtime", "sha256", "expected_size", "downloaded_at",
+    "zip_ok", "verified_at", "error"}}. A record only counts while the file
+    on disk still has the recorded size and mtime.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path) as f:
+                self.records = json.load(f)
+        except (OSError, ValueError):
+            self.records = {}
+
+    def save(self):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.records, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def _current(self, file_name):
+        """Return the record if the file on disk is still the one it describes."""
+        record = self.records.get(file_name)
+        if record is None:
+            return None
+        try:
+            stat = os.stat(os.path.join(self.directory, file_name))
+        except OSError:
+            return None
+        if stat.st_size != record.get("size") or stat.st_mtime != record.get("mtime"):
+            return None
+        return record
+
+    def is_downloaded(self, file_name):
+        """True if the file was fully downloaded, hasn't changed and isn't known corrupt."""
+        record = self._current(file_name)
+        return (
+            record is not None
+            and record.get("sha256") is not None
+            and record.get("zip_ok") is not False
+        )
+
+    def is_verified(self, file_name):
+        """True if the file's zip CRCs were checked and it hasn't changed since."""
+        record = self._current(file_name)
+        return record is not None and record.get("zip_ok") is True
+
+    def _update(self, file_name, **fields):
+        stat = os.stat(os.path.join(self.directory, file_name))
+        with self._lock:
+            record = self.records.setdefault(file_name, {})
+            record.update(fields, size=stat.st_size, mtime=stat.st_mtime)
+
+    def record_download(self, result):
+        self._update(
+            os.path.basename(result.path),
+            sha256=result.sha256,
+            expected_size=result.expected_size,
+            downloaded_at=_now(),
+            zip_ok=None,
+            verified_at=None,
+            error=None,
+        )
+
+    def record_check(self, file_name, error=None):
+        self._update(
+            file_name,
+            zip_ok=error is None,
+            verified_at=_now(),
+            error=str(error) if error else None,
+        )
+
+
+def _verify_file(manifest, file_name):
+    path = os.path.join(manifest.directory, file_name)
+    record = manifest.records.get(file_name) or {}
+    try:
+        if manifest.is_verified(file_name) and record.get("sha256"):
+            # Forced re-check of a checked file: its digest covers every byte
+            if file_sha256(path) != record["sha256"]:
+                raise IntegrityError(f"{file_name}: checksum mismatch")
+        else:
+            with zipfile.ZipFile(path, "r") as zip_ref:
+                bad_member = zip_ref.testzip()
+            if bad_member is not None:
+                raise zipfile.BadZipFile(f"{file_name}: bad CRC in {bad_member}")
+    except (OSError, zipfile.BadZipFile) as e:
+        manifest.record_check(file_name, e)
+        return file_name, str(e)
+    manifest.record_check(file_name)
+    return file_name, None
+
+
+def verify_directory(
+    download_path, max_workers=4, callback=None, force=False, progress=None
+):
+    """
+    Verify the zips of a download directory in parallel.
+
+    Files already verified (and unchanged since) are skipped unless ``force``,
+    in which case they are compared against their recorded digest; all other
+    files get a full zip CRC test. Each file is read once and the results are
+    written to the manifest. ``progress`` receives "verify" ProgressEvents.
+
+    Returns:
+        dict: {file_name: error message} of the files that failed
+    """
+    manifest = VerificationManifest(download_path)
+    files = sorted(f for f in os.listdir(download_path) if f.endswith(".zip"))
+    pending = [f for f in files if force or not manifest.is_verified(f)]
+    if callback:
+        callback(
+            f"Verifying {len(pending)} of {len(files)} zip files "
+            f"({len(files) - len(pending)} already verified)"
+        )
+
+    reporter = make_reporter(progress)
+    failed = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for file_name, error in executor.map(
+            lambda file_name: _verify_file(manifest, file_name), pending
+        ):
+            if reporter:
+                reporter.update(
+                    STAGE_VERIFY,
+                    advance=1,
+                    total=len(pending),
+                    file=file_name,
+                    unit="files",
+                )
+            if error:
+                failed[file_name] = error
+                if callback:
+                    callback(f"Verification failed: {error}")
+    manifest.save()
+    if reporter:
+        reporter.finish(STAGE_VERIFY)
+
+    if callback:
+        callback(f"Verified {len(pending) - len(failed)} files, {len(failed)} failed")
+    return failed
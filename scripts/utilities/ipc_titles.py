@@ -0,0 +1,219 @@
+import os
+import re
+import sqlite3
+import threading
+
+# WIPO IPC title lists, one EN_ipc_section_<X>_title_list_<date>.txt per section
+DEFAULT_IPC_PATH = "./EN_ipc_title_list_20250101"
+
+# Cache file next to the list directory: EN_ipc_title_list_20250101.cache.db
+CACHE_SUFFIX = ".cache.db"
+
+# Section "A", class "A01", subclass "A01B" or group "A01B0001020000"
+# (subclass, main group padded to 4 digits, subgroup padded to 6)
+IPC_CODE_RE = re.compile(r"[A-H](?:\d{2}(?:[A-Z](?:\d{10})?)?)?")
+
+# A group written the usual way, e.g. "A01B 1/02"
+IPC_GROUP_RE = re.compile(r"([A-H]\d{2}[A-Z])\s*(\d{1,4})\s*/\s*(\d{1,6})")
+
+
+def normalize_ipc_code(code):
+    """
+    Return ``code`` in the form used by the title lists.
+
+    "a01b 1/02" becomes "A01B0001020000"; sections, classes, subclasses and
+    codes already in list form are only stripped and upper-cased.
+    """
+    code = code.strip().upper()
+    match = IPC_GROUP_RE.fullmatch(code)
+    if match:
+        subclass, main_group, subgroup = match.groups()
+        return f"{subclass}{int(main_group):04d}{subgroup.ljust(6, '0')}"
+    return code
+
+
+def _title_files(ipc_path):
+    return sorted(
+        file_name for file_name in os.listdir(ipc_path) if file_name.endswith(".txt")
+    )
+
+
+def _source_signature(ipc_path):
+    """(file name, size, mtime) of every title list, to check the cache against."""
+    signature = []
+    for file_name in _title_files(ipc_path):
+        stat = os.stat(os.path.join(ipc_path, file_name))
+        signature.append((file_name, stat.st_size, stat.st_mtime))
+    return signature
+
+
+def parse_title_file(path):
+    """Yield (code, title) for every IPC entry of one title list file."""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line in f:
+            code, sep, title = line.rstrip("\r\n").partition("\t")
+            if sep and IPC_CODE_RE.fullmatch(code):
+                yield code, title.strip()
+
+
+class IPCTitles:
+    """
+    IPC code -> title lookup over the WIPO title lists of ``ipc_path``.
+
+    The lists are parsed once into a SQLite cache (``cache_path``, by default
+    ``<ipc_path>.cache.db``) that records the size and mtime of every source
+    file; later loads read the cache instead of the text files and rebuild it
+    only when a list changes. Titles are then held in a dict, so lookups of
+    sections, classes, subclasses and groups are O(1).
+
+    Instances pickle as their paths only: a worker process that receives one
+    loads the cache on first use and never re-parses the lists.
+    """
+
+    def __init__(self, ipc_path=DEFAULT_IPC_PATH, cache_path=None):
+        self.ipc_path = ipc_path
+        self.cache_path = cache_path or (os.path.normpath(ipc_path) + CACHE_SUFFIX)
+        self._titles = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"ipc_path": self.ipc_path, "cache_path": self.cache_path}
+
+    def __setstate__(self, state):
+        self.__init__(state["ipc_path"], state["cache_path"])
+
+    @property
+    def titles(self):
+        """{code: title} of every entry, loaded on first use."""
+        return self.load()._titles
+
+    def load(self):
+        """Load the titles now rather than on the first lookup and return self."""
+        if self._titles is None:
+            with self._lock:
+                if self._titles is None:
+                    self._titles = self._load()
+        return self
+
+    def _load(self):
+        signature = (
+            _source_signature(self.ipc_path) if os.path.isdir(self.ipc_path) else None
+        )
+        titles = self._read_cache(signature)
+        if titles is None:
+            if signature is None:
+                raise FileNotFoundError(
+                    f"IPC title list directory not found: {self.ipc_path}"
+                )
+            titles = {}
+            for file_name, _, _ in signature:
+                titles.update(parse_title_file(os.path.join(self.ipc_path, file_name)))
+            self._write_cache(titles, signature)
+        return titles
+
+    def _read_cache(self, signature):
+        """
+        The cached titles, or None if the cache is missing or stale.
+
+        Without the source directory (``signature`` None) any cache is used.
+        """
+        if not os.path.exists(self.cache_path):
+            return None
+        try:
+            conn = sqlite3.connect(f"file:{self.cache_path}?mode=ro", uri=True)
+            try:
+                cached = conn.execute(
+                    "SELECT file_name, size, mtime FROM ipc_sources ORDER BY file_name"
+                ).fetchall()
+                if signature is not None and cached != signature:
+                    return None
+                return dict(conn.execute("SELECT code, title FROM ipc_titles"))
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+
+    def _write_cache(self, titles, signature):
+        """Write the cache through a temp file so readers never see a partial one."""
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            conn = sqlite3.connect(tmp_path)
+            try:
+                conn.execute("""CREATE TABLE ipc_titles (
+                    code TEXT PRIMARY KEY,
+                    title TEXT
+                ) WITHOUT ROWID""")
+                conn.execute("""CREATE TABLE ipc_sources (
+                    file_name TEXT PRIMARY KEY,
+                    size INTEGER,
+                    mtime REAL
+                )""")
+                conn.executemany("INSERT INTO ipc_titles VALUES (?, ?)", titles.items())
+                conn.executemany("INSERT INTO ipc_sources VALUES (?, ?, ?)", signature)
+                conn.commit()
+            finally:
+                conn.close()
+            os.replace(tmp_path, self.cache_path)
+        except (OSError, sqlite3.Error):
+            # A read-only location only costs the next process a re-parse
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __contains__(self, code):
+        return normalize_ipc_code(code) in self.titles
+
+    def __getitem__(self, code):
+        return self.titles[normalize_ipc_code(code)]
+
+    def get(self, code, default=None):
+        """Title of a section, class, subclass or group code, e.g. "A61" or "A61K 9/20"."""
+        return self.titles.get(normalize_ipc_code(code), default)
+
+    def hierarchy(self, code):
+        """
+        Titles from the section down to ``code``.
+
+        Returns:
+            list: [(code, title)] for the section, class, subclass and group
+            levels that ``code`` covers and the lists contain
+        """
+        code = normalize_ipc_code(code)
+        levels = [code[:length] for length in (1, 3, 4) if length < len(code)]
+        levels.append(code)
+        return [(level, self.titles[level]) for level in levels if level in self.titles]
+
+    def by_section(self, max_length=None):
+        """
+        {section: {code: title}}, optionally limited to codes of ``max_length``.
+
+        ``max_length=3`` keeps sections and classes, like extract_ipc_dic.
+        """
+        sections = {}
+        for code, title in self.titles.items():
+            if max_length is None or len(code) <= max_length:
+                sections.setdefault(code[0], {})[code] = title
+        return sections
+
+
+# Lookups already loaded in this process, by (ipc_path, cache_path)
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_ipc_titles(ipc_path=DEFAULT_IPC_PATH, cache_path=None):
+    """
+    Return the process-wide IPCTitles of ``ipc_path``, loading it on first call.
+
+    Repeated calls (e.g. several reports in one job) share one dict.
+    """
+    key = (os.path.abspath(ipc_path), cache_path and os.path.abspath(cache_path))
+    with _loaded_lock:
+        titles = _loaded.get(key)
+        if titles is None:
+            titles = _loaded[key] = IPCTitles(ipc_path, cache_path)
+    return titles.load()
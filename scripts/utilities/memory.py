@@ -0,0 +1,273 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import psutil
+
+# "8G", "512M", "1.5GB", "2GiB" or a plain number of bytes
+MEMORY_SIZE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?", re.IGNORECASE)
+_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+# Share of the budget above which new work waits
+DEFAULT_HIGH_WATER = 0.9
+# Share of the budget above which batches shrink
+DEFAULT_SOFT_WATER = 0.75
+
+# Seconds an RSS sample is reused; walking the process tree costs a few ms
+DEFAULT_SAMPLE_INTERVAL = 0.5
+
+# How often waiting work re-checks the budget
+THROTTLE_POLL_INTERVAL = 0.2
+
+
+def parse_memory_size(text):
+    """Return the bytes of a size like "8G" or "512M"; ValueError if unreadable."""
+    match = MEMORY_SIZE_RE.fullmatch(str(text).strip())
+    if not match:
+        raise ValueError(f"Invalid memory size: {text!r} (e.g. 8G, 512M)")
+    number, unit = match.groups()
+    size = int(float(number) * _UNITS[unit.upper()])
+    if size <= 0:
+        raise ValueError(f"Memory size must be positive: {text!r}")
+    return size
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def process_tree_rss(pid=None):
+    """
+    Resident memory in bytes of a process and all of its descendants.
+
+    The worker pools are child processes, so this is what the whole ingestion
+    run holds. Returns None if the process can't be read.
+    """
+    pid = pid or os.getpid()
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return None
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            pass  # exited since it was listed
+    return total
+
+
+class MemoryGovernor:
+    """
+    Keep ingestion within a memory budget of ``max_bytes``.
+
+    Usage is the RSS of this process and its worker processes plus the bytes
+    the pipeline has in flight (documents handed to extractors and example
+    text waiting to be classified and stored), which are counted with
+    acquire()/release() before the workers' RSS shows them. Above
+    ``high_water`` of the budget, file admission and new work wait (see
+    wait/wait_async) and above ``soft_water`` batch_size() shrinks batches.
+    Work is always admitted while nothing else is in flight, so a budget
+    below the baseline RSS slows a run down to one piece of work at a time
+    instead of stalling it.
+
+    One governor may be shared by the pipelines of several years running in
+    different threads; it is thread-safe and holds no event loop state. Every
+    throttle is logged through ``callback`` once when it starts and once when
+    it ends, and counted in ``metrics``.
+    """
+
+    def __init__(
+        self,
+        max_bytes,
+        callback=None,
+        high_water=DEFAULT_HIGH_WATER,
+        soft_water=DEFAULT_SOFT_WATER,
+        sample_interval=DEFAULT_SAMPLE_INTERVAL,
+    ):
+        self.max_bytes = max_bytes
+        self.callback = callback
+        self.high_water = high_water
+        self.soft_water = soft_water
+        self.sample_interval = sample_interval
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rss = None
+        self._sampled_at = None
+        self._throttled_since = None
+        self._throttled_for = None
+        self._batch_scale = 1
+        self._warned_rss = False
+        # throttles, throttled_seconds, batch_cuts, peak_rss, peak_in_flight
+        self.metrics = Counter()
+
+    def _log(self, message):
+        if self.callback:
+            self.callback(message)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self, size):
+        """Count ``size`` bytes as in flight until release(size)."""
+        with self._lock:
+            self._in_flight += size
+            self.metrics["peak_in_flight"] = max(
+                self.metrics["peak_in_flight"], self._in_flight
+            )
+
+    def release(self, size):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - size)
+
+    def rss(self):
+        """RSS of the process tree, re-sampled at most every ``sample_interval``."""
+        now = time.monotonic()
+        with self._lock:
+            if (
+                self._sampled_at is not None
+                and now - self._sampled_at < self.sample_interval
+            ):
+                return self._rss
+            self._sampled_at = now
+        rss = process_tree_rss()
+        with self._lock:
+            self._rss = rss
+            if rss is not None:
+                self.metrics["peak_rss"] = max(self.metrics["peak_rss"], rss)
+            warn = rss is None and not self._warned_rss
+            self._warned_rss = self._warned_rss or warn
+        if warn:
+            self._log(
+                "Memory budget: RSS can't be measured (processes not readable); "
+                "only the bytes in flight are counted against the budget"
+            )
+        return rss
+
+    def usage(self):
+        """Bytes counted against the budget: RSS (if known) plus in-flight bytes."""
+        return (self.rss() or 0) + self._in_flight
+
+    def pressure(self):
+        """Usage as a share of the budget."""
+        return self.usage() / self.max_bytes
+
+    def throttled(self):
+        return self.pressure() >= self.high_water
+
+    def _describe(self):
+        rss = self._rss
+        return (
+            f"RSS {format_bytes(rss) if rss is not None else 'unknown'} + "
+            f"{format_bytes(self._in_flight)} in flight of "
+            f"{format_bytes(self.max_bytes)}"
+        )
+
+    def _must_wait(self, busy):
+        if not self.throttled():
+            return False
+        return busy() if busy is not None else self._in_flight > 0
+
+    def _start_throttle(self, what):
+        with self._lock:
+            if self._throttled_since is not None:
+                return
+            self._throttled_since = time.monotonic()
+            self._throttled_for = what
+            self.metrics["throttles"] += 1
+        self._log(f"Memory budget: throttling {what} ({self._describe()})")
+
+    def _end_throttle(self):
+        with self._lock:
+            if self._throttled_since is None:
+                return
+            elapsed = time.monotonic() - self._throttled_since
+            what = self._throttled_for
+            self._throttled_since = None
+            self.metrics["throttled_seconds"] += elapsed
+        self._log(f"Memory budget: resumed {what} after {elapsed:.1f}s")
+
+    def _admitted(self):
+        if self._throttled_since is not None and not self.throttled():
+            self._end_throttle()
+
+    def wait(self, what, stop_event=None, busy=None):
+        """
+        Block until there is room for more work or ``stop_event`` is set.
+
+        ``busy`` tells whether waiting can free memory (by default: whether
+        anything is in flight); without it the work is admitted anyway.
+        """
+        while self._must_wait(busy):
+            if stop_event is not None and stop_event.is_set():
+                break
+            self._start_throttle(what)
+            time.sleep(THROTTLE_POLL_INTERVAL)
+        self._admitted()
+
+    async def wait_async(self, what, stop_event=None, busy=None):
+        """wait() for coroutines: sleeps on the event loop instead of blocking it."""
+        while self._must_wait(busy):
+            if stop_event is not None and stop_event.is_set():
+                break
+            self._start_throttle(what)
+            await asyncio.sleep(THROTTLE_POLL_INTERVAL)
+        self._admitted()
+
+    def batch_size(self, size):
+        """
+        ``size`` scaled to the current pressure.
+
+        Full size below ``soft_water``, half up to ``high_water`` and a
+        quarter above it; never below 1.
+        """
+        pressure = self.pressure()
+        if pressure >= self.high_water:
+            scale = 4
+        elif pressure >= self.soft_water:
+            scale = 2
+        else:
+            scale = 1
+        with self._lock:
+            changed = scale != self._batch_scale
+            if scale > self._batch_scale:
+                self.metrics["batch_cuts"] += 1
+            self._batch_scale = scale
+        if changed:
+            if scale > 1:
+                self._log(
+                    f"Memory budget: batches cut to 1/{scale} ({self._describe()})"
+                )
+            else:
+                self._log("Memory budget: batches back to full size")
+        return max(1, size // scale)
+
+    def throttled_seconds(self):
+        """Seconds spent throttled so far, including a throttle still going on."""
+        with self._lock:
+            seconds = self.metrics["throttled_seconds"]
+            if self._throttled_since is not None:
+                seconds += time.monotonic() - self._throttled_since
+        return seconds
+
+    def summary(self):
+        """One line with the peak usage and the time spent throttled."""
+        peak_rss = self.metrics["peak_rss"]
+        return (
+            f"Memory budget {format_bytes(self.max_bytes)}: peak RSS "
+            f"{format_bytes(peak_rss) if peak_rss else 'unknown'}, peak in flight "
+            f"{format_bytes(self.metrics['peak_in_flight'])}, throttled "
+            f"{self.metrics['throttles']} time(s) for "
+            f"{self.throttled_seconds():.1f}s, batches cut "
+            f"{self.metrics['batch_cuts']} time(s)"
+        )
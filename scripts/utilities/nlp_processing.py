@@ -1,10 +1,15 @@
 import nltk
+import numpy as np
+import pandas as pd
 from nltk import pos_tag, word_tokenize
 from bs4 import BeautifulSoup
 from collections import Counter
 import re
+import threading
 import multiprocessing
 from concurrent.futures import ProcessPoolExecutor
+from .records import TENSE_FIELDS, example_record
+from .cancellation import release_executor, track_executor
 
 nltk.download("averaged_perceptron_tagger")
 nltk.download("punkt")
@@ -12,38 +17,107 @@ nltk.download("punkt_tab")
 nltk.download("averaged_perceptron_tagger_eng")
 
 
+# Tense labels counted per patent; anything else counts as unknown
+TENSES = ("past", "present", "unknown")
+
+# Texts sent to a classifier worker per task
+CLASSIFY_CHUNK_SIZE = 64
+
+# Tiers of analyze_sentence_tense, cheapest first
+TIER_EMPTY = "empty"
+TIER_LEXICAL = "lexical"
+TIER_TAGGER = "tagger"
+
+PAST_AUXILIARIES_RE = re.compile(r"\b(?:was|were)\b", re.IGNORECASE)
+
+PROCEDURE_STARTERS = {
+    "prepared",
+    "obtained",
+    "synthesized",
+    "isolated",
+    "dissolved",
+    "mixed",
+    "combined",
+    "heated",
+    "cooled",
+    "filtered",
+    "purified",
+    "separated",
+}
+
+PROCEDURE_PHRASES_RE = re.compile(
+    r"\b(?:according to|following the procedure|as described|using the method"
+    r"|following example)\b",
+    re.IGNORECASE,
+)
+
+# Examples resolved by each tier, aggregated in the parent process
+tier_counts = Counter()
+_tier_counts_lock = threading.Lock()
+
+
+def get_tier_counts():
+    """Return a copy of how many examples each analyze_sentence_tense tier resolved."""
+    with _tier_counts_lock:
+        return dict(tier_counts)
+
+
+def is_patent_procedure(text):
+    """Check if text describes a performed procedure (first word or stock phrase)."""
+    words = text.split(maxsplit=1)
+    if words and words[0].lower() in PROCEDURE_STARTERS:
+        return True
+    return PROCEDURE_PHRASES_RE.search(text) is not None
+
+
+def _past_result(resolved_by):
+    return {
+        "tense": "past",
+        "breakdown": {"past": 1, "present": 0, "unknown": 0},
+        "breakdown_str": "past: 100%",
+        "has_mixed": False,
+        "percentages": {"past": 100, "present": 0, "unknown": 0},
+        "why_unknown": "",
+        "resolved_by": resolved_by,
+    }
+
+
 def analyze_sentence_tense(text, threshold=0.5):
-    """Analyze sentence tense with enhanced breakdown information."""
-    text = text.replace("  ", "").replace("\n", " ").replace("\t", " ")
+    """
+    Analyze sentence tense with enhanced breakdown information.
 
-    verb_tenses = []
-    tense_details = {"past": 0, "present": 0, "unknown": 0}
-    why_unknown = ""
+    Cheap lexical rules run first (past auxiliaries, procedure starters and
+    phrases); the text is only tokenized and POS tagged when they are
+    inconclusive. ``resolved_by`` in the result names the tier that decided.
+    """
+    text = text.replace("  ", "").replace("\n", " ").replace("\t", " ")
 
     # Early return for unknown cases
     if not text.strip():
         return {
             "tense": "unknown",
-            "breakdown": tense_details,
+            "breakdown": {"past": 0, "present": 0, "unknown": 0},
             "breakdown_str": "",  # Empty for unknown
             "has_mixed": False,
             "percentages": {"past": 0, "present": 0, "unknown": 100},
             "why_unknown": "empty_text",
+            "resolved_by": TIER_EMPTY,
         }
 
-    # Add direct past tense indicators
-    text_lower = text.lower()
-    if "was" in text_lower or "were" in text_lower:
-        tense_details["past"] = 1
-        total_verbs = 1
-        return {
-            "tense": "past",
-            "breakdown": tense_details,
-            "breakdown_str": "past: 100%",
-            "has_mixed": False,
-            "percentages": {"past": 100, "present": 0, "unknown": 0},
-            "why_unknown": "",
-        }
+    # Direct past tense indicators
+    if PAST_AUXILIARIES_RE.search(text) or is_patent_procedure(text):
+        return _past_result(TIER_LEXICAL)
+
+    result = _tag_sentence_tense(text)
+    result["resolved_by"] = TIER_TAGGER
+    return result
+
+
+def _tag_sentence_tense(text):
+    """Classify tense from POS tags, used when the lexical rules are inconclusive."""
+    verb_tenses = []
+    tense_details = {"past": 0, "present": 0, "unknown": 0}
+    why_unknown = ""
 
     def has_passive_voice(tagged):
         """Check if sentence contains passive voice construction"""
@@ -61,50 +135,12 @@ def analyze_sentence_tense(text, threshold=0.5):
                     return True
         return False
 
-    def is_patent_procedure(text, tagged):
-        procedure_starters = {
-            "prepared",
-            "obtained",
-            "synthesized",
-            "isolated",
-            "dissolved",
-            "mixed",
-            "combined",
-            "heated",
-            "cooled",
-            "filtered",
-            "purified",
-            "separated",
-        }
-
-        first_word = text.strip().split()[0].lower()
-        if first_word in procedure_starters:
-            return True
-
-        procedure_patterns = [
-            "according to",
-            "following the procedure",
-            "as described",
-            "using the method",
-            "following example",
-        ]
-        return any(pattern in text.lower() for pattern in procedure_patterns)
-
     # Tokenize and POS tag
     tokens = word_tokenize(text)
     tagged = pos_tag(tokens)
 
-    if has_passive_voice(tagged) or is_patent_procedure(text, tagged):
-        tense_details["past"] = 1
-        total_verbs = 1
-        return {
-            "tense": "past",
-            "breakdown": tense_details,
-            "breakdown_str": "past: 100%",
-            "has_mixed": False,
-            "percentages": {"past": 100, "present": 0, "unknown": 0},
-            "why_unknown": "",
-        }
+    if has_passive_voice(tagged):
+        return _past_result(TIER_TAGGER)
 
     # Process each verb
     has_verbs = False
@@ -213,79 +249,154 @@ def safe_join(content_list):
     return ""
 
 
-def dic_to_dic_w_tense_test(doc_w_exp, threshold=0):
-    """Process patent examples with detailed tense analysis."""
-    dic = {}
-    optimal_workers = max(1, (multiprocessing.cpu_count() * 3) // 4)
-
-    with ProcessPoolExecutor(max_workers=optimal_workers) as executor:
-        for key, value in doc_w_exp.items():
-            tense_counts = {"past": 0, "present": 0, "unknown": 0}
-            mixed_tense_count = 0
-            total_examples = 0
-
-            if isinstance(value, list):
-                for example in value:
-                    if not isinstance(example, dict):
-                        continue
-
-                    title = example.get("title", "")
-                    content = example.get("content", [])
-                    desc = title + "." + safe_join(content)
-
-                    if len(desc) > threshold:
-                        total_examples += 1
-
-                texts_to_analyze = []
-                for i, example in enumerate(value):
-                    if not isinstance(example, dict):
-                        continue
-
-                    title = example.get("title", "")
-                    content = example.get("content", [])
-                    desc = title + "." + safe_join(content)
-
-                    if len(desc) > threshold:
-                        texts_to_analyze.append((i, desc))
-
-                if texts_to_analyze:
-                    results = list(
-                        executor.map(process_text_for_tense, texts_to_analyze)
-                    )
-
-                    for idx, tense_analysis in results:
-                        if idx >= len(value):
-                            continue
-
-                        example = value[idx]
-                        if not isinstance(example, dict):
-                            continue
-
-                        example["tense"] = tense_analysis["tense"]
-                        example["tense_breakdown"] = tense_analysis["breakdown_str"]
-                        example["why_unknown"] = tense_analysis.get("why_unknown", "")
-
-                        # Add percentages to example
-                        example["past_percentage"] = tense_analysis["percentages"][
-                            "past"
-                        ]
-                        example["present_percentage"] = tense_analysis["percentages"][
-                            "present"
-                        ]
-                        example["unknown_percentage"] = tense_analysis["percentages"][
-                            "unknown"
-                        ]
-
-                        tense_counts[tense_analysis["tense"]] += 1
-                        if tense_analysis["has_mixed"]:
-                            mixed_tense_count += 1
-
-            if total_examples > 0:
-                dic[key] = tense_counts
-                mixed_tense_percentage = mixed_tense_count / total_examples * 100
-                dic[key]["mixed_tense_percentage"] = f"{round(mixed_tense_percentage)}%"
-
-    return dic
+def classify_text_columns(texts):
+    """
+    Classify a chunk of texts in a worker process.
+
+    Returns columnar results, one list per TENSE_FIELDS entry plus
+    ``resolved_by``, which pickle far smaller than a list of result dicts.
+    """
+    columns = {field: [] for field in TENSE_FIELDS + ("resolved_by",)}
+    for text in texts:
+        analysis = analyze_sentence_tense(text)
+        columns["tense"].append(analysis["tense"])
+        columns["tense_breakdown"].append(
+            analysis["breakdown_str"] if analysis["tense"] != "unknown" else ""
+        )
+        columns["why_unknown"].append(analysis.get("why_unknown", ""))
+        columns["past_percentage"].append(analysis["percentages"]["past"])
+        columns["present_percentage"].append(analysis["percentages"]["present"])
+        columns["unknown_percentage"].append(analysis["percentages"]["unknown"])
+        columns["has_mixed"].append(analysis["has_mixed"])
+        columns["resolved_by"].append(analysis.get("resolved_by"))
+    return columns
+
+
+def classify_examples(records, executor=None, chunk_size=CLASSIFY_CHUNK_SIZE):
+    """
+    Classify the tense of ExampleRecords in parallel.
+
+    Texts are sent to the workers in chunks and results come back as columns,
+    so each chunk costs one round trip instead of one per example.
+
+    Returns:
+        list: The records with their tense fields filled in, in input order
+    """
+    if not records:
+        return []
+    if executor is None:
+        optimal_workers = max(1, (multiprocessing.cpu_count() * 3) // 4)
+        with ProcessPoolExecutor(max_workers=optimal_workers) as executor:
+            track_executor(executor, "classifiers")
+            try:
+                return classify_examples(records, executor, chunk_size)
+            finally:
+                release_executor(executor)
+
+    texts = [record.full_text for record in records]
+    chunks = [texts[i : i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+    classified = []
+    resolved = Counter()
+    for chunk_start, columns in zip(
+        range(0, len(records), chunk_size),
+        executor.map(classify_text_columns, chunks),
+    ):
+        resolved.update(columns["resolved_by"])
+        for offset, values in enumerate(
+            zip(*(columns[field] for field in TENSE_FIELDS))
+        ):
+            classified.append(
+                records[chunk_start + offset]._replace(
+                    **dict(zip(TENSE_FIELDS, values))
+                )
+            )
+
+    with _tier_counts_lock:
+        tier_counts.update(resolved)
+
+    return classified
+
+
+def tense_statistics(records):
+    """
+    Per-patent tense counts and mixed tense percentage of classified records.
+
+    The per-example results are put in columns and aggregated with one groupby.
+
+    Returns:
+        pandas.DataFrame: See aggregate_tense_statistics
+    """
+    return aggregate_tense_statistics(
+        pd.DataFrame(
+            {
+                "patent_number": [record.patent_number for record in records],
+                "tense": [record.tense for record in records],
+                "has_mixed": np.fromiter(
+                    (record.has_mixed for record in records),
+                    dtype=bool,
+                    count=len(records),
+                ),
+            }
+        )
+    )
+
+
+def aggregate_tense_statistics(examples):
+    """
+    Aggregate per-example results into per-patent statistics.
+
+    Args:
+        examples: DataFrame with ``patent_number``, ``tense`` and ``has_mixed`` columns
+
+    Returns:
+        pandas.DataFrame: Indexed by patent_number, with ``past``, ``present`` and
+        ``unknown`` counts and ``mixed_tense_percentage`` as a 0-100 float
+    """
+    tense = examples["tense"].where(examples["tense"].isin(TENSES), "unknown")
+    has_mixed = examples["has_mixed"].fillna(False).astype(bool)
+
+    grouped_tense = tense.groupby(examples["patent_number"], sort=False)
+    patents = grouped_tense.size().index
+    stats = (
+        grouped_tense.value_counts()
+        .unstack(fill_value=0)
+        .reindex(index=patents, columns=list(TENSES), fill_value=0)
+    )
+    stats["mixed_tense_percentage"] = (
+        has_mixed.groupby(examples["patent_number"], sort=False).mean() * 100
+    )
+    stats.index.name = "patent_number"
+    stats.columns.name = None
+    return stats
+
+
+def dic_to_dic_w_tense_test(doc_w_exp, threshold=0, executor=None):
+    """
+    Process patent examples with detailed tense analysis.
+
+    Kept for callers holding {patent_number: [example, ...]} dicts: the
+    examples are converted to ExampleRecords, classified with
+    classify_examples, and dict examples get their tense fields set in place.
+
+    Returns:
+        dict: {patent_number: {"past", "present", "unknown", "mixed_tense_percentage"}}
+        with the mixed tense percentage as a float
+    """
+    pairs = []
+    for patent_number, examples in doc_w_exp.items():
+        for example in examples if isinstance(examples, list) else []:
+            if not isinstance(example, dict):
+                continue
+            record = example_record(patent_number, example)
+            if len(record.full_text) > threshold:
+                pairs.append((example, record))
+
+    classified = classify_examples([record for _, record in pairs], executor)
+    for (example, _), record in zip(pairs, classified):
+        example.update({field: getattr(record, field) for field in TENSE_FIELDS})
+
+    return tense_statistics(classified).to_dict("index")
 
 
 def clean_text(text):
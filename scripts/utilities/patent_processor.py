@@ -1,14 +1,152 @@
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
-import asyncio
 from bs4 import BeautifulSoup
-import re
 import multiprocessing
+from collections import Counter
 from .utils_clean import (
     remove_leadiong_zeros,
     find_doc_number,
     extract_experiments_w_heading,
     extract_examples_start_w_word_all,
 )
+from .prefilter import classify_document
+from .records import example_record
+from .document_source import read_document
+from .cancellation import release_executor, track_executor
+
+# Rejection reasons after parsing (pre-parse reasons live in prefilter)
+REJECT_NO_EXAMPLES = "no_examples"
+REJECT_NO_DOC_NUMBER = "no_doc_number"
+
+# Adaptive batches aim to finish in this many seconds and hold at most this
+# many bytes of text, so a batch of long chemistry patents stays small
+DEFAULT_TARGET_BATCH_SECONDS = 2.0
+DEFAULT_TARGET_BATCH_BYTES = 64 * 1024 * 1024
+# Weight of the newest batch in the per-document averages
+BATCH_SMOOTHING = 0.3
+# Largest factor a batch may grow or shrink by from one batch to the next
+MAX_BATCH_STEP = 2.0
+
+
+def extract_patent_examples(xml):
+    """
+    Extract the examples of a single patent document.
+
+    Runs in a worker process, so it only takes and returns picklable values.
+    ``xml`` may be a str or any bytes-like object (e.g. a memoryview of a
+    mapped weekly file).
+
+    Returns:
+        (doc_num, ExampleRecords, None) if the patent has examples, otherwise
+        (None, None, reason) with the reason it was rejected
+    """
+    reason = classify_document(xml)
+    if reason:
+        return (None, None, reason)
+
+    # BeautifulSoup needs str or bytes, so only accepted documents are copied
+    markup = xml if isinstance(xml, (str, bytes)) else bytes(xml)
+    heading = extract_experiments_w_heading(markup)
+
+    examples = []
+    if heading and len(heading) == 1:
+        examples = extract_examples_start_w_word_all(heading[0].find_next_siblings())
+    if not examples:
+        soup = BeautifulSoup(markup, "xml")
+        examples = extract_examples_start_w_word_all(soup.find_all(["heading", "p"]))
+    if not examples:
+        return (None, None, REJECT_NO_EXAMPLES)
+
+    doc_nums = find_doc_number(xml)
+    if not doc_nums:
+        return (None, None, REJECT_NO_DOC_NUMBER)
+    doc_num = remove_leadiong_zeros(doc_nums[0])
+    return (doc_num, tuple(example_record(doc_num, e) for e in examples), None)
+
+
+def extract_patent_examples_from_slice(document):
+    """extract_patent_examples for a DocumentSlice, read from the mapped file."""
+    return read_document(document, extract_patent_examples)
+
+
+class AdaptiveBatchSizer:
+    """
+    Batch size steered by the observed cost of each document.
+
+    After every batch, observe() updates moving averages of the wall-clock
+    seconds and the bytes per document; the next size is the number of
+    documents that fits both ``target_seconds`` and ``target_bytes``, moved
+    at most MAX_BATCH_STEP times per batch and kept within
+    [min_size, max_size]. Wall-clock time already reflects how many workers
+    share a batch, so small short documents grow the batch and large slow
+    ones shrink it. ``metrics`` holds the current size and latencies.
+    """
+
+    def __init__(
+        self,
+        initial_size,
+        min_size=1,
+        max_size=None,
+        target_seconds=DEFAULT_TARGET_BATCH_SECONDS,
+        target_bytes=DEFAULT_TARGET_BATCH_BYTES,
+    ):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size or initial_size * 4)
+        self.size = min(max(initial_size, self.min_size), self.max_size)
+        self.target_seconds = target_seconds
+        self.target_bytes = target_bytes
+        self.seconds_per_document = None
+        self.bytes_per_document = None
+        self.last_batch_seconds = None
+        self.batches = 0
+
+    def _average(self, current, value):
+        if current is None:
+            return value
+        return current + BATCH_SMOOTHING * (value - current)
+
+    def observe(self, count, size_bytes, seconds):
+        """Record a finished batch of ``count`` documents and return the next size."""
+        if count <= 0:
+            return self.size
+        self.batches += 1
+        self.last_batch_seconds = seconds
+        self.seconds_per_document = self._average(
+            self.seconds_per_document, seconds / count
+        )
+        self.bytes_per_document = self._average(
+            self.bytes_per_document, size_bytes / count
+        )
+
+        wanted = self.max_size
+        if self.target_seconds and self.seconds_per_document > 0:
+            wanted = min(wanted, self.target_seconds / self.seconds_per_document)
+        if self.target_bytes and self.bytes_per_document > 0:
+            wanted = min(wanted, self.target_bytes / self.bytes_per_document)
+        wanted = min(
+            max(wanted, self.size / MAX_BATCH_STEP), self.size * MAX_BATCH_STEP
+        )
+        self.size = int(min(max(wanted, self.min_size), self.max_size))
+        return self.size
+
+    @property
+    def metrics(self):
+        return {
+            "batch_size": self.size,
+            "batches": self.batches,
+            "last_batch_seconds": self.last_batch_seconds,
+            "seconds_per_document": self.seconds_per_document,
+            "bytes_per_document": self.bytes_per_document,
+        }
+
+    def format(self):
+        """One line with the current size and observed latency."""
+        if not self.batches:
+            return f"batch size {self.size}"
+        return (
+            f"batch size {self.size}, last batch {self.last_batch_seconds:.2f}s, "
+            f"{self.seconds_per_document * 1000:.1f} ms and "
+            f"{self.bytes_per_document / 1024:.1f} KB per document"
+        )
 
 
 class PatentProcessor:
@@ -16,142 +154,30 @@ class PatentProcessor:
         if max_workers is None:
             max_workers = max(1, multiprocessing.cpu_count() - 1)
         self.max_workers = max_workers
-        self.thread_pool = ThreadPoolExecutor(max_workers=max_workers)
-        self.process_pool = ProcessPoolExecutor(max_workers=max_workers)
-
-    async def process_patent(self, xml, callback=None, stop_event=None):
-        """Process a single patent document asynchronously."""
-        try:
-            # Check stop event
-            if stop_event and stop_event.is_set():
-                return None
-
-            if len(xml) <= 2000:
-                return None
-
-            loop = asyncio.get_running_loop()
-
-            # Fast pre-check for examples section
-            if all(i not in xml.upper() for i in ["EXAMPLES", "EXPERIMENTS", "TESTS"]):
-                return None
-
-            # Check stop event before heavy processing
-            if stop_event and stop_event.is_set():
-                return None
-
-            # Check for sequence listings
-            has_sequences = await loop.run_in_executor(
-                self.thread_pool,
-                lambda: bool(re.findall(r"<s\d+>.*?</s\d+>", xml))
-                or '<sequence-cwu id="SEQLST-0">' in xml
-                or "<!DOCTYPE sequence-cwu" in xml,
-            )
-            if has_sequences:
-                return None
-
-            # Check stop event before processing heading
-            if stop_event and stop_event.is_set():
-                return None
-
-            # Process heading and examples asynchronously
-            heading = await loop.run_in_executor(
-                self.thread_pool, extract_experiments_w_heading, xml
-            )
-
-            examples = []
-            if heading and len(heading) == 1:
-                examples = await loop.run_in_executor(
-                    self.thread_pool,
-                    extract_examples_start_w_word_all,
-                    heading[0].find_next_siblings(),
-                )
-                if not examples:
-                    soup = BeautifulSoup(xml, "xml")
-                    siblings = soup.find_all(["heading", "p"])
-                    examples = await loop.run_in_executor(
-                        self.thread_pool, extract_examples_start_w_word_all, siblings
-                    )
-            else:
-                soup = BeautifulSoup(xml, "xml")
-                siblings = soup.find_all(["heading", "p"])
-                examples = await loop.run_in_executor(
-                    self.thread_pool, extract_examples_start_w_word_all, siblings
-                )
-
-            # Check stop event before finalizing
-            if stop_event and stop_event.is_set():
-                return None
-
-            if examples:
-                doc_nums = await loop.run_in_executor(
-                    self.thread_pool, find_doc_number, xml
-                )
-                if doc_nums:
-                    doc_num = remove_leadiong_zeros(doc_nums[0])
-                    return (doc_num, examples)
-
-            return None
-
-        except Exception as e:
-            if callback:
-                callback(f"Error processing patent: {str(e)}")
+        # Registered so a stop request can cancel their work (see cancellation)
+        self.thread_pool = track_executor(
+            ThreadPoolExecutor(max_workers=max_workers), "processor threads"
+        )
+        self.process_pool = track_executor(
+            ProcessPoolExecutor(max_workers=max_workers), "extractors"
+        )
+        # Documents seen and the reasons documents were rejected
+        self.metrics = Counter()
+
+    def record(self, result):
+        """Count an extract_patent_examples result and return (doc_num, examples) or None."""
+        doc_num, examples, reason = result
+        self.metrics["documents"] += 1
+        if reason:
+            self.metrics[f"rejected_{reason}"] += 1
             return None
+        self.metrics["with_examples"] += 1
+        return (doc_num, examples)
 
-    async def process_batch(self, patents, callback=None, stop_event=None):
-        """Process a batch of patents using multiple CPU cores."""
-        batch_size = min(200, len(patents))
-        total_results = {}
-        total_patents = len(patents)
-        processed = 0
-        found = 0
-
-        # Create processing pools
-        loop = asyncio.get_running_loop()
-
-        # Process patents in parallel batches
-        for i in range(0, len(patents), batch_size):
-            # Check stop event at start of each batch
-            if stop_event and stop_event.is_set():
-                if callback:
-                    callback("Operation stopped by user")
-                break
-
-            batch = patents[i : i + batch_size]
-            tasks = []
-
-            # Create concurrent tasks for the batch
-            for patent in batch:
-                task = asyncio.create_task(
-                    self.process_patent(patent, callback, stop_event)
-                )
-                tasks.append(task)
-
-            # Process batch results
-            results = await asyncio.gather(*tasks)
-
-            valid_results = []
-            for result in results:
-                processed += 1
-                if isinstance(result, tuple) and result[0] is not None:
-                    doc_num, examples = result
-                    total_results[doc_num] = examples
-                    found += 1
-
-                if processed % 500 == 0 and callback:
-                    callback(
-                        f"Processed {processed}/{total_patents} patents - Found {found} with examples"
-                    )
-
-            # Check stop event after batch processing
-            if stop_event and stop_event.is_set():
-                if callback:
-                    callback("Operation stopped by user")
-                break
-
-            await asyncio.sleep(0)  # Allow other tasks to run
-
-        return total_results
+    def shutdown(self, wait=True):
+        for pool in (self.thread_pool, self.process_pool):
+            release_executor(pool)
+            pool.shutdown(wait=wait)
 
     def __del__(self):
-        self.thread_pool.shutdown()
-        self.process_pool.shutdown()
+        self.shutdown()
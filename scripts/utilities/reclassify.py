@@ -0,0 +1,320 @@
+import multiprocessing
+import os
+import sqlite3
+from concurrent.futures import BrokenExecutor, CancelledError, ProcessPoolExecutor
+from contextlib import closing
+
+from .database_utils import (
+    DEFAULT_DB_PATH,
+    database_operation_with_retry,
+    ensure_columns,
+    list_shards,
+)
+from .cancellation import cancel_when_set, release_executor, track_executor
+from .nlp_processing import classify_examples
+from .records import ExampleRecord
+
+# Stored examples read, classified and written back per transaction
+RECLASSIFY_CHUNK_SIZE = 2000
+
+# Last rowid written by an unfinished run, keyed by its filters
+PROGRESS_TABLE = "reclassify_progress"
+
+
+def _run_key(years, patent_range):
+    years_key = ",".join(str(year) for year in sorted(years)) if years else "all"
+    range_key = "-".join(str(int(n)) for n in patent_range) if patent_range else "all"
+    return f"years={years_key};patents={range_key}"
+
+
+def _example_filter(years, patent_range):
+    """WHERE fragment and parameters selecting the examples to reclassify."""
+    clauses = []
+    params = []
+    if years:
+        # patent_examples has no year; the statistics row of each patent carries it
+        placeholders = ", ".join("?" for _ in years)
+        clauses.append(
+            "patent_number IN (SELECT patent_number FROM patent_statistics "
+            f"WHERE year IN ({placeholders}))"
+        )
+        params.extend(int(year) for year in years)
+    if patent_range:
+        # Numbers are stored as text, where "10000000" sorts before "9000000";
+        # design/reissue numbers (D123456, RE12345) never fall in a range
+        clauses.append(
+            "patent_number NOT GLOB '*[^0-9]*' "
+            "AND CAST(patent_number AS INTEGER) BETWEEN ? AND ?"
+        )
+        params.extend(int(n) for n in patent_range)
+    return clauses, params
+
+
+def _has_table(conn, table):
+    return (
+        conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        is not None
+    )
+
+
+def _load_watermark(db_path, run_key, restart):
+    with database_operation_with_retry(db_path, "reclassify_watermark") as conn:
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (
+            run_key TEXT PRIMARY KEY,
+            last_rowid INTEGER NOT NULL
+        );""")
+        if restart:
+            conn.execute(f"DELETE FROM {PROGRESS_TABLE} WHERE run_key = ?", (run_key,))
+            return 0
+        row = conn.execute(
+            f"SELECT last_rowid FROM {PROGRESS_TABLE} WHERE run_key = ?", (run_key,)
+        ).fetchone()
+    return row[0] if row else 0
+
+
+def _read_chunk(db_path, after_rowid, clauses, params, chunk_size):
+    where = " AND ".join(["id > ?"] + clauses)
+    # Plain read connection: no write lock is held while reading
+    with closing(sqlite3.connect(db_path, timeout=20)) as conn:
+        return conn.execute(
+            f"""SELECT id, patent_number, example_name, example_content
+            FROM patent_examples WHERE {where} ORDER BY id LIMIT ?""",
+            [after_rowid] + params + [chunk_size],
+        ).fetchall()
+
+
+def _write_chunk(db_path, rowids, records, run_key):
+    """Update the tense columns of one chunk and move the watermark in one transaction."""
+    with database_operation_with_retry(db_path, "reclassify_write") as conn:
+        conn.execute("""CREATE TEMP TABLE reclassified (
+            id INTEGER PRIMARY KEY,
+            tense TEXT,
+            past_percentage REAL,
+            present_percentage REAL,
+            unknown_percentage REAL,
+            why_unknown TEXT,
+            tense_breakdown TEXT,
+            has_mixed INTEGER
+        );""")
+        conn.executemany(
+            "INSERT INTO reclassified VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    rowid,
+                    record.tense,
+                    record.past_percentage,
+                    record.present_percentage,
+                    record.unknown_percentage,
+                    record.why_unknown,
+                    record.tense_breakdown,
+                    int(record.has_mixed),
+                )
+                for rowid, record in zip(rowids, records)
+            ],
+        )
+        conn.execute("""UPDATE patent_examples SET
+            tense = r.tense,
+            past_percentage = r.past_percentage,
+            present_percentage = r.present_percentage,
+            unknown_percentage = r.unknown_percentage,
+            why_unknown = r.why_unknown,
+            tense_breakdown = r.tense_breakdown,
+            has_mixed = r.has_mixed
+            FROM reclassified AS r
+            WHERE patent_examples.id = r.id""")
+        conn.execute(
+            f"INSERT OR REPLACE INTO {PROGRESS_TABLE} (run_key, last_rowid) VALUES (?, ?)",
+            (run_key, rowids[-1]),
+        )
+
+
+def rebuild_statistics(db_path, years=None, patent_range=None):
+    """
+    Recompute patent_statistics from the stored example tenses.
+
+    The counts are aggregated with one GROUP BY in SQLite, so the examples
+    are never loaded into memory; the indicators follow statistics_frame.
+    Only existing statistics rows are updated, so their ``year`` is kept.
+
+    Returns:
+        int: Number of patents whose statistics were recomputed
+    """
+    clauses, params = _example_filter(years, patent_range)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with database_operation_with_retry(db_path, "rebuild_statistics") as conn:
+        if not _has_table(conn, "patent_statistics"):
+            return 0
+        # Tenses other than past/present, NULL included, count as unknown
+        conn.execute(
+            f"""CREATE TEMP TABLE rebuilt_statistics AS
+            SELECT patent_number,
+                prophetic,
+                nonprophetic,
+                total - prophetic - nonprophetic AS unknown,
+                mixed_tense_percentage,
+                prophetic = total AS all_prophetic,
+                prophetic > 0 AND prophetic < total AS some_prophetic,
+                prophetic = 0 AS no_prophetic
+            FROM (
+                SELECT patent_number,
+                    SUM(tense IS 'present') AS prophetic,
+                    SUM(tense IS 'past') AS nonprophetic,
+                    COUNT(*) AS total,
+                    AVG(COALESCE(has_mixed, 0) != 0) * 100.0
+                        AS mixed_tense_percentage
+                FROM patent_examples {where}
+                GROUP BY patent_number
+            )""",
+            params,
+        )
+        conn.execute("""UPDATE patent_statistics SET
+            prophetic = s.prophetic,
+            nonprophetic = s.nonprophetic,
+            unknown = s.unknown,
+            mixed_tense_percentage = s.mixed_tense_percentage,
+            all_prophetic = s.all_prophetic,
+            some_prophetic = s.some_prophetic,
+            no_prophetic = s.no_prophetic
+            FROM rebuilt_statistics AS s
+            WHERE patent_statistics.patent_number = s.patent_number""")
+        (patents,) = conn.execute("SELECT COUNT(*) FROM rebuilt_statistics").fetchone()
+    return patents
+
+
+def reclassify_database(
+    db_path,
+    years=None,
+    patent_range=None,
+    executor=None,
+    callback=None,
+    stop_event=None,
+    chunk_size=RECLASSIFY_CHUNK_SIZE,
+    restart=False,
+):
+    """
+    Re-run tense classification over the examples stored in one database file.
+
+    Rows are read in rowid order, ``chunk_size`` at a time, classified with
+    classify_examples and written back through a temp table with a single
+    UPDATE ... FROM. The last rowid written is kept in PROGRESS_TABLE, so an
+    interrupted run with the same filters resumes where it stopped; the
+    watermark is cleared once the statistics have been rebuilt.
+
+    Returns:
+        int: Number of examples reclassified by this call
+    """
+    if not os.path.exists(db_path):
+        return 0
+    with database_operation_with_retry(db_path, "reclassify_schema") as conn:
+        if not _has_table(conn, "patent_examples"):
+            return 0
+        # Years are looked up in patent_statistics; without it nothing matches
+        if years and not _has_table(conn, "patent_statistics"):
+            return 0
+        ensure_columns(conn.cursor(), "patent_examples", {"has_mixed": "INTEGER"})
+
+    run_key = _run_key(years, patent_range)
+    clauses, params = _example_filter(years, patent_range)
+    last_rowid = _load_watermark(db_path, run_key, restart)
+    if last_rowid and callback:
+        callback(f"Resuming {db_path} after row {last_rowid}")
+
+    reclassified = 0
+    while True:
+        if stop_event and stop_event.is_set():
+            if callback:
+                callback(f"Reclassification of {db_path} stopped at row {last_rowid}")
+            return reclassified
+        rows = _read_chunk(db_path, last_rowid, clauses, params, chunk_size)
+        if not rows:
+            break
+
+        records = [
+            ExampleRecord(patent_number, example_name or "", "", content or "")
+            for _, patent_number, example_name, content in rows
+        ]
+        try:
+            records = classify_examples(records, executor)
+        except (CancelledError, BrokenExecutor, RuntimeError):
+            # The pool was cancelled by a stop request; the watermark is intact
+            if not (stop_event and stop_event.is_set()):
+                raise
+            continue
+        rowids = [row[0] for row in rows]
+        _write_chunk(db_path, rowids, records, run_key)
+
+        last_rowid = rowids[-1]
+        reclassified += len(rows)
+        if callback:
+            callback(f"Reclassified {reclassified} examples in {db_path}")
+
+    patents = rebuild_statistics(db_path, years, patent_range)
+    with database_operation_with_retry(db_path, "reclassify_watermark") as conn:
+        conn.execute(f"DELETE FROM {PROGRESS_TABLE} WHERE run_key = ?", (run_key,))
+    if callback:
+        callback(f"Rebuilt statistics for {patents} patents in {db_path}")
+    return reclassified
+
+
+def reclassify(
+    db_path=None,
+    years=None,
+    patent_range=None,
+    callback=None,
+    stop_event=None,
+    max_workers=None,
+    chunk_size=RECLASSIFY_CHUNK_SIZE,
+    restart=False,
+):
+    """
+    Reclassify stored examples in the main database and its shards without reading XML.
+
+    Args:
+        db_path: Main database path (defaults to DEFAULT_DB_PATH)
+        years: Optional years to restrict to; also selects which shards are visited
+        patent_range: Optional (first, last) utility patent numbers, compared
+            as integers
+        callback: Optional status callback
+        stop_event: Optional event to stop after the current chunk
+        max_workers: Classifier processes (defaults to 3/4 of the CPUs)
+        chunk_size: Examples per read/classify/write round
+        restart: Ignore a saved watermark and start from the first row
+
+    Returns:
+        int: Total examples reclassified
+    """
+    db_path = db_path or DEFAULT_DB_PATH
+    targets = [db_path] + [path for _, _, path in list_shards(db_path, years)]
+    max_workers = max_workers or max(1, (multiprocessing.cpu_count() * 3) // 4)
+
+    total = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, cancel_when_set(
+        stop_event, callback=callback
+    ):
+        track_executor(executor, "reclassifiers")
+        try:
+            for target in targets:
+                count = reclassify_database(
+                    target,
+                    years=years,
+                    patent_range=patent_range,
+                    executor=executor,
+                    callback=callback,
+                    stop_event=stop_event,
+                    chunk_size=chunk_size,
+                    restart=restart,
+                )
+                total += count
+                if stop_event and stop_event.is_set():
+                    break
+        finally:
+            release_executor(executor)
+
+    if callback:
+        stopped = stop_event is not None and stop_event.is_set()
+        callback(
+            f"Reclassification {'stopped' if stopped else 'finished'}: {total} examples"
+        )
+    return total
@@ -0,0 +1,68 @@
+from typing import NamedTuple
+
+# Fields set by tense classification, in ExampleRecord order
+TENSE_FIELDS = (
+    "tense",
+    "tense_breakdown",
+    "why_unknown",
+    "past_percentage",
+    "present_percentage",
+    "unknown_percentage",
+    "has_mixed",
+)
+
+
+class ExampleRecord(NamedTuple):
+    """One extracted example; content paragraphs are joined once at extraction."""
+
+    patent_number: str
+    number: str
+    title: str
+    content: str
+    tense: str = ""
+    tense_breakdown: str = ""
+    why_unknown: str = ""
+    past_percentage: float = 0.0
+    present_percentage: float = 0.0
+    unknown_percentage: float = 0.0
+    has_mixed: bool = False
+
+    @property
+    def full_text(self):
+        """Title and content as classified and stored."""
+        return f"{self.title}.{self.content}" if self.title else self.content
+
+
+def example_record(patent_number, example):
+    """Build an ExampleRecord from an extracted {"number", "title", "content"} dict."""
+    content = example.get("content", [])
+    if isinstance(content, list):
+        content = " ".join(str(item) for item in content)
+    fields = {
+        field: example[field]
+        for field in TENSE_FIELDS
+        if field in example and example[field] is not None
+    }
+    if "tense_breakdown" not in fields and "breakdown_str" in example:
+        fields["tense_breakdown"] = example["breakdown_str"]
+    return ExampleRecord(
+        patent_number,
+        str(example.get("number", "")),
+        str(example.get("title", "")),
+        str(content),
+        **fields,
+    )
+
+
+def records_from_dict(doc_w_exp):
+    """Flatten {patent_number: [example dict, ...]} into a list of ExampleRecords."""
+    records = []
+    for patent_number, examples in doc_w_exp.items():
+        if not isinstance(examples, (list, tuple)):
+            continue
+        for example in examples:
+            if isinstance(example, ExampleRecord):
+                records.append(example)
+            elif isinstance(example, dict):
+                records.append(example_record(patent_number, example))
+    return records
@@ -1,5 +1,23 @@
+import math
+import multiprocessing
 import os
-from .utils_clean import find_doc_number, read_xlsb_file, save_as_pickle
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from .cancellation import release_executor, track_executor
+from .corpus import CORPUS_SUFFIX, Corpus, CorpusWriter
+from .document_source import XML_DECLARATION_BYTES, mapped_document_slices
+from .utils_clean import (
+    NON_UTILITY_NUMBER_RE,
+    normalize_patent_numbers,
+    read_xlsb_file,
+)
+
+FREILICH_DEFAULT_PATH = "Freilich.Data.Compressed.xlsb"
+
+# Columnar copy of the xlsb next to it, e.g. Freilich.Data.Compressed.xlsb.cache.db
+FREILICH_CACHE_SUFFIX = ".cache.db"
 
 
 def remove_leadiong_zeros(s):
@@ -10,96 +28,263 @@ def remove_leadiong_zeros(s):
     return s
 
 
-def process_large_xml_filtered(file_path, target_doc_numbers, xml_dict):
+# Doc numbers wanted by the extraction workers, set once per process
+_target_doc_numbers = frozenset()
+
+
+def _init_target_worker(target_doc_numbers):
+    global _target_doc_numbers
+    _target_doc_numbers = frozenset(target_doc_numbers)
+
+
+def _extract_targets(file_path):
     """
-    Reads a large XML file and extracts full XML content for specific document numbers.
+    The target documents of one weekly file.
 
-    Args:
-        file_path: Path to XML files
-        target_doc_numbers: List of document numbers we want to extract
-        xml_dict: Dictionary to store results {doc_number: xml_content}
+    Runs in a worker process. Numbers are read with the byte-level regex of
+    iter_document_slices and the documents that are kept are copied out of
+    the same mapping of the file; of repeated numbers the longest version is
+    kept.
+
+    Returns:
+        list: (doc_number, XML bytes including the declaration)
+    """
+    found = {}
+    with mapped_document_slices(file_path) as (buffer, slices):
+        for document, doc_number in slices:
+            if doc_number is None:
+                continue
+            doc_num = remove_leadiong_zeros(doc_number)
+            if doc_num in _target_doc_numbers and (
+                doc_num not in found or document.length > found[doc_num].length
+            ):
+                found[doc_num] = document
+        return [
+            (
+                doc_num,
+                XML_DECLARATION_BYTES
+                + buffer[document.offset : document.offset + document.length],
+            )
+            for doc_num, document in found.items()
+        ]
+
+
+def extract_target_documents(
+    path,
+    target_doc_numbers,
+    output_path,
+    max_workers=None,
+    callback=print,
+    metadata=None,
+):
+    """
+    Write the documents of ``target_doc_numbers`` found in ``path`` to a corpus.
+
+    The weekly XML files are shared out over a process pool and the matches
+    of each file are added to the corpus (see corpus.py) as soon as its
+    worker finishes, so at most a few files' matches are in memory at once.
+    Remaining files are cancelled once every target is found. A document
+    found in several files is kept once. ``metadata`` is stored with the
+    corpus.
+
+    Returns:
+        dict: {doc_number: weekly file name} of the documents written
+    """
+    target_doc_numbers = set(target_doc_numbers)
+    file_paths = sorted(
+        entry.path
+        for entry in os.scandir(path)
+        if entry.name.endswith(".xml") and entry.is_file()
+    )
+    max_workers = max_workers or max(1, multiprocessing.cpu_count() - 1)
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    found = {}
+    with CorpusWriter(output_path, metadata=metadata) as writer:
+        executor = track_executor(
+            ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_target_worker,
+                initargs=(target_doc_numbers,),
+            ),
+            "test dataset extractors",
+        )
+        try:
+            futures = {
+                executor.submit(_extract_targets, file_path): file_path
+                for file_path in file_paths
+            }
+            for future in as_completed(futures):
+                file_name = os.path.basename(futures.pop(future))
+                documents = future.result()
+                if callback:
+                    callback(f"Processed {file_name}: {len(documents)} targets")
+                for doc_num, xml in documents:
+                    if doc_num not in found:
+                        writer.add(doc_num, xml, source=file_name)
+                        found[doc_num] = file_name
+                if len(found) == len(target_doc_numbers):
+                    break
+        finally:
+            release_executor(executor)
+            executor.shutdown(cancel_futures=True)
+
+    if callback:
+        callback(f"Found {len(found)} out of {len(target_doc_numbers)} documents")
+    return found
+
+
+def iter_test_dataset(path):
+    """Stream (doc_number, xml) from a test dataset corpus."""
+    with Corpus(path) as corpus:
+        yield from corpus
+
+
+def load_test_dataset(path):
+    """A test dataset corpus as {doc_number: xml}, like the old pickles."""
+    return dict(iter_test_dataset(path))
+
+
+def _freilich_cache_path(freilich_data_path, cache_path=None):
+    return cache_path or freilich_data_path + FREILICH_CACHE_SUFFIX
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+
+def build_freilich_cache(freilich_data_path=FREILICH_DEFAULT_PATH, cache_path=None):
     """
-    xml_buffer = ""
-    inside_xml = False
-
-    with open(file_path, "r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip().startswith("<?xml"):  # Start of a new XML block
-                if xml_buffer:  # Process previous buffer if exists
-                    doc_num = remove_leadiong_zeros(find_doc_number(xml_buffer)[0])
-                    if doc_num and doc_num in target_doc_numbers:
-                        xml_dict[doc_num] = xml_buffer
-
-                xml_buffer = line  # Start new XML buffer
-                inside_xml = True
-            elif inside_xml:
-                xml_buffer += line  # Append line to current XML
-
-        # Process last XML section
-        if xml_buffer:
-            doc_num = remove_leadiong_zeros(find_doc_number(xml_buffer)[0])
-            if doc_num and doc_num in target_doc_numbers:
-                xml_dict[doc_num] = xml_buffer
-
-
-def find_doc_number_and_xml_content(path, target_doc_numbers):
+    Convert the Freilich xlsb into a SQLite cache and return the cache path.
+
+    The spreadsheet is read once; patent numbers are normalised to integers
+    with normalize_patent_numbers and the table is indexed by issue year and
+    patent number. The size and mtime of the xlsb are stored with it, so
+    load_freilich knows when to rebuild.
+    """
+    cache_path = _freilich_cache_path(freilich_data_path, cache_path)
+    signature = _source_signature(freilich_data_path)
+    df = read_xlsb_file(freilich_data_path)
+    df["patentnumber"] = normalize_patent_numbers(df["patentnumber"])
+    df["issueyear"] = pd.to_numeric(df["issueyear"], errors="coerce").astype("Int64")
+
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        df.to_sql("freilich", conn, index=False)
+        conn.execute("CREATE INDEX idx_freilich_year ON freilich (issueyear)")
+        conn.execute("CREATE INDEX idx_freilich_number ON freilich (patentnumber)")
+        conn.execute("CREATE TABLE freilich_source (size INTEGER, mtime REAL)")
+        conn.execute("INSERT INTO freilich_source VALUES (?, ?)", signature)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def _cache_is_current(freilich_data_path, cache_path):
+    if not os.path.exists(cache_path):
+        return False
+    if not os.path.exists(freilich_data_path):
+        # Only the cache was shipped; use it as is
+        return True
+    try:
+        conn = sqlite3.connect(f"file:{cache_path}?mode=ro", uri=True)
+        try:
+            cached = conn.execute("SELECT size, mtime FROM freilich_source").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return cached == _source_signature(freilich_data_path)
+
+
+def load_freilich(
+    year=None, freilich_data_path=FREILICH_DEFAULT_PATH, columns=None, cache_path=None
+):
     """
-    Extracts full XML content for specified document numbers.
+    Rows of the Freilich dataset, optionally for one issue year.
+
+    Served from the SQLite cache, which is (re)built from the xlsb on first
+    use and whenever the xlsb changes; ``patentnumber`` is an integer column.
 
     Args:
-        path: Directory containing XML files
-        target_doc_numbers: List of document numbers to extract
+        year: Issue year to select (all years if None)
+        columns: Columns to load (all if None)
+
     Returns:
-        Dictionary mapping document numbers to their XML content
+        pandas.DataFrame
     """
-    xml_dict = {}
+    cache_path = _freilich_cache_path(freilich_data_path, cache_path)
+    if not _cache_is_current(freilich_data_path, cache_path):
+        build_freilich_cache(freilich_data_path, cache_path)
 
-    with os.scandir(path) as entries:
-        for entry in entries:
-            if entry.name.endswith(".xml") and entry.is_file():
-                print(f"Processing {entry.name}")
-                process_large_xml_filtered(entry.path, target_doc_numbers, xml_dict)
+    select = ", ".join(f'"{column}"' for column in columns) if columns else "*"
+    query = f"SELECT {select} FROM freilich"
+    params = ()
+    if year is not None:
+        query += " WHERE issueyear = ?"
+        params = (int(year),)
+    conn = sqlite3.connect(f"file:{cache_path}?mode=ro", uri=True)
+    try:
+        return pd.read_sql(query, conn, params=params)
+    finally:
+        conn.close()
 
-                # Early exit if we found all documents
-                if len(xml_dict) == len(target_doc_numbers):
-                    break
 
-    print(f"Found {len(xml_dict)} out of {len(target_doc_numbers)} documents")
-    return xml_dict
+def freilich_patent_numbers(year, freilich_data_path=FREILICH_DEFAULT_PATH):
+    """Patent numbers of one issue year, as the strings XML doc numbers normalise to."""
+    df = load_freilich(year, freilich_data_path, columns=["patentnumber"])
+    return set(df["patentnumber"].astype(str))
 
 
 def create_test_dataset_from_freilich(
     year=2015,
-    freilich_data_path="Freilich.Data.Compressed.xlsb",
+    freilich_data_path=FREILICH_DEFAULT_PATH,
     path_to_all_xmls_for_chosen_year="patent_grants_2015",
+    output_path=None,
+    max_workers=None,
 ):
-    # Read and prepare Freilich dataset
-    df = read_xlsb_file(freilich_data_path)
-    df_year = df[df.issueyear == year]
-    df_year_doc_num_cleaned_freilich = [
-        str(i).replace(".0", "") for i in df_year.patentnumber.values
-    ]
+    """
+    Extract the Freilich patents of ``year`` from its weekly XML files.
 
-    # Get XML content for matching documents
-    test_dataset = find_doc_number_and_xml_content(
+    The documents are written to the corpus ``output_path``
+    (test_dataset_<year>.corpus by default); open it with corpus.Corpus for
+    random access or streaming, or pass its folder to the ingestion pipeline.
+
+    Returns:
+        dict: {doc_number: weekly file name} of the documents found
+    """
+    # Patent numbers of the year, from the cached copy of the Freilich dataset
+    target_doc_numbers = freilich_patent_numbers(year, freilich_data_path)
+
+    output_path = output_path or f"test_dataset_{year}{CORPUS_SUFFIX}"
+    test_dataset = extract_target_documents(
         path_to_all_xmls_for_chosen_year,
-        set(df_year_doc_num_cleaned_freilich),  # Convert to set for faster lookups
+        target_doc_numbers,
+        output_path,
+        max_workers=max_workers,
+        metadata={"year": year, "kind": "grant", "source": "freilich"},
     )
-
-    # Save results
-    save_as_pickle(test_dataset, f"test_dataset_{year}.pkl")
+    print(f"Saved as {output_path}")
     return test_dataset
 
 
 def clean_patent_number(x):
-    try:
-        # Remove any non-numeric characters and convert
-        if isinstance(x, str):
-            # Extract only numbers from string
-            nums = "".join(filter(str.isdigit, x))
-            return int(nums) if nums else 0
-        elif isinstance(x, (int, float)):
-            return int(x)
-        return 0
-    except (ValueError, TypeError):
+    """Single-value normalize_patent_numbers; use that for whole columns."""
+    if isinstance(x, str):
+        try:
+            x = float(x)
+        except ValueError:
+            if NON_UTILITY_NUMBER_RE.search(x):
+                return 0
+            digits = re.sub(r"\D", "", x)
+            return int(digits) if digits else 0
+    if not isinstance(x, (int, float)) or not math.isfinite(x):
         return 0
+    return int(x)
@@ -5,6 +5,17 @@ import json
 from collections import defaultdict
 import os
 import requests
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .cancellation import cancel_when_set, release_executor, track_executor
+from .ipc_titles import DEFAULT_IPC_PATH, load_ipc_titles
+from .document_source import find_ipc_classes, read_document, split_document_slices
+from .prefilter import has_examples_heading
+from .progress import STAGE_FILES, make_reporter
+
+# Date part of a weekly file name, e.g. 240102 in ipg240102.xml
+WEEKLY_FILE_RE = re.compile(r"ip[ga](\d{6})")
 
 
 def save_as_json(examples, filename="1200_patents_w_experiments.json"):
@@ -515,167 +526,219 @@ def read_xml_file(file_path):
     return content
 
 
-def extract_classify_num_patents_w_experiments(
-    folder_path="D:\\unzipped_patents_23_24",
+# https://dimensions.freshdesk.com/support/solutions/articles/23000018832-what-are-the-ipcr-and-cpc-patent-classifications- (IPCR AND CPC CLASSIFICATIONS)
+IPC_SECTORS = {
+    "A": "Human Necessities",
+    "B": "Performing Operations; Transporting",
+    "C": "Chemistry; Metallurgy",
+    "D": "Textiles; Paper",
+    "E": "Fixed Constructions",
+    "F": "Mechanical Engineering; Lighting; Heating",
+    "G": "Physics",
+    "H": "Electricity",
+}
+UNKNOWN_SECTOR = "Unknown Sector"
+SECTOR_NOT_FOUND = "Not Found"
+
+# Grouping levels of count_ipc_examples
+IPC_BY_SECTOR = "sector"
+IPC_BY_CLASS = "class"
+
+
+def _count_ipc_file(file_path, by):
+    """
+    Map step: count the patents of one weekly file with/without examples.
+
+    Runs in a worker process. Documents come from split_document_slices (the
+    ingestion pipeline's streamer, duplicates dropped) and are read from the
+    mapped file; the IPC codes and the examples heading are found on the raw
+    bytes, and only documents containing an examples keyword are searched
+    for the heading.
+
+    Returns:
+        (Counter {(key, "with_examples" | "without_examples"): count}, documents)
+        where key is the section letter (SECTOR_NOT_FOUND without one) or,
+        by class, each distinct section+class code such as "A61"
+    """
+    counts = Counter()
+    documents, _ = split_document_slices(file_path)
+    for document in documents or []:
+        has_examples, classes = read_document(document, _scan_document)
+        column = "with_examples" if has_examples else "without_examples"
+        if by == IPC_BY_SECTOR:
+            keys = [classes[0][0] if classes else SECTOR_NOT_FOUND]
+        else:
+            keys = {section + class_code for section, class_code in classes}
+        for key in keys:
+            counts[key, column] += 1
+    return counts, len(documents or [])
+
+
+def _scan_document(view):
+    return has_examples_heading(view), find_ipc_classes(view)
+
+
+def _xml_files(folder_path):
+    folders = [folder_path] if isinstance(folder_path, str) else list(folder_path)
+    return [
+        os.path.join(folder, file_name)
+        for folder in folders
+        for file_name in sorted(os.listdir(folder))
+        if file_name.endswith(".xml")
+    ]
+
+
+def count_ipc_examples(
+    folder_path,
+    by=IPC_BY_SECTOR,
+    max_workers=None,
+    callback=None,
+    stop_event=None,
+    progress=None,
 ):
-    # https://dimensions.freshdesk.com/support/solutions/articles/23000018832-what-are-the-ipcr-and-cpc-patent-classifications- (IPCR AND CPC CLASSIFICATIONS)
-
-    ipc_sector_map = {
-        "A": "Human Necessities",
-        "B": "Performing Operations; Transporting",
-        "C": "Chemistry; Metallurgy",
-        "D": "Textiles; Paper",
-        "E": "Fixed Constructions",
-        "F": "Mechanical Engineering; Lighting; Heating",
-        "G": "Physics",
-        "H": "Electricity",
-        "Unknown Sector": "Unknown Sector",
-        "Not Found": "Not Found",
-    }
-    ipc_dic = extract_ipc_dic()
+    """
+    Count patents with/without an examples section per IPC sector or class.
 
-    sectors_dict = {
-        sector: {"examples": 0, "without_examples": 0}
-        for sector in ipc_sector_map.values()
-    }
+    A map-reduce over the weekly XML files of ``folder_path`` (a directory or
+    a list of directories, e.g. two years): every file is counted by its own
+    worker process and the partial Counters are merged as they arrive.
+    Setting ``stop_event`` drops the files not started yet and returns the
+    counts so far; files still being read are cancelled like the pipeline's
+    (see cancellation).
 
-    file_names = os.listdir(folder_path)
-    total_num_of_patents = 0
-    for i, file in enumerate(file_names):
-        all_xml_parts = []
-        if file.endswith(".xml"):
-            print(f"Processing {file}... ({i + 1}/{len(file_names)})")
-            file_path = os.path.join(folder_path, file)
+    Returns:
+        (Counter {(key, column): count}, number of documents counted)
+    """
+    file_paths = _xml_files(folder_path)
+    max_workers = max_workers or max(1, multiprocessing.cpu_count() - 1)
+    reporter = make_reporter(progress)
+    totals = Counter()
+    documents = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, cancel_when_set(
+        stop_event, callback=callback
+    ):
+        track_executor(executor, "ipc counters")
+        futures = {
+            executor.submit(_count_ipc_file, file_path, by): file_path
+            for file_path in file_paths
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            if stop_event and stop_event.is_set():
+                # Leaving the block would otherwise wait for every queued file
+                executor.shutdown(wait=False, cancel_futures=True)
+                break
+            file_name = os.path.basename(futures[future])
             try:
-                with open(file_path, "r", encoding="utf-8") as file:
-                    content = file.read()
-                    parts = content.split('<?xml version="1.0" encoding="UTF-8"?>')
-                    parts = [p for p in parts if p.strip()]
-                    all_xml_parts.extend(parts)
+                counts, file_documents = future.result()
             except Exception as e:
-                print(f"Error processing {file}: {str(e)}")
-            # xml_no_dup = remove_duplicate_docs(all_xml_parts)
-            # print(f"Num of duplicates removed: {len(all_xml_parts) - len(xml_no_dup)} out of {len(all_xml_parts)}")
-            total_num_of_patents += len(all_xml_parts)
-            for j, xml in enumerate(all_xml_parts):
-                if j % 2000 == 0:
-                    total_without_examples = sum(
-                        sector["without_examples"] for sector in sectors_dict.values()
-                    )
-                    total_with_examples = sum(
-                        sector["examples"] for sector in sectors_dict.values()
-                    )
-                    print(
-                        f"Total without examples: {total_without_examples}, Total with examples: {total_with_examples}, Total patents: {total_num_of_patents}"
-                    )
-                    print(f"Processed {j} out of {len(all_xml_parts)}")
-
-                root = etree.fromstring(xml.encode(), etree.XMLParser(recover=True))
-                try:
-                    section = root.xpath(
-                        "//classifications-ipcr/classification-ipcr/section/text()"
-                    )[0]
-                    sector = ipc_sector_map.get(section, "Unknown Sector")
-
-                except IndexError:
-                    sector = "Not Found"
-
-                # Update the counts in the dictionary
-                if extract_experiments_w_heading(xml):
-                    sectors_dict[sector]["with_examples"] += 1
-                else:
-                    sectors_dict[sector]["without_examples"] += 1
+                if callback:
+                    callback(f"Error processing {file_name}: {str(e)}")
+                continue
+            # Reduce step
+            totals.update(counts)
+            documents += file_documents
+            if reporter:
+                reporter.update(
+                    STAGE_FILES,
+                    done=done,
+                    total=len(file_paths),
+                    file=file_name,
+                    unit="files",
+                )
+            elif callback:
+                callback(
+                    f"Processed {file_name} ({done}/{len(file_paths)}): "
+                    f"{documents} patents so far"
+                )
+        release_executor(executor)
+    if reporter:
+        reporter.finish(STAGE_FILES)
+    return totals, documents
+
+
+def _counts_table(totals, names):
+    """{name: {"with_examples", "without_examples"}} for the keys in ``names``."""
+    table = {}
+    for (key, column), count in totals.items():
+        name = names(key)
+        if name is None:
+            continue
+        row = table.setdefault(name, {"with_examples": 0, "without_examples": 0})
+        row[column] += count
+    return table
+
+
+def extract_classify_num_patents_w_experiments(
+    folder_path="D:\\unzipped_patents_23_24", max_workers=None, callback=print
+):
+    """
+    Patents with and without an examples section per IPC sector.
+
+    The sector is that of the patent's first IPC classification; patents
+    without one count as "Not Found".
+
+    Returns:
+        dict: {sector name: {"with_examples": n, "without_examples": n}}
+    """
+    totals, _ = count_ipc_examples(
+        folder_path, IPC_BY_SECTOR, max_workers=max_workers, callback=callback
+    )
+    sectors_dict = {
+        sector: {"with_examples": 0, "without_examples": 0}
+        for sector in list(IPC_SECTORS.values()) + [UNKNOWN_SECTOR, SECTOR_NOT_FOUND]
+    }
+    for name, row in _counts_table(
+        totals,
+        lambda key: (
+            key if key == SECTOR_NOT_FOUND else IPC_SECTORS.get(key, UNKNOWN_SECTOR)
+        ),
+    ).items():
+        sectors_dict[name] = row
     return sectors_dict
 
 
-def extract_ipc_dic(ipc_path="./EN_ipc_title_list_20250101"):
-    ipc_path = "./EN_ipc_title_list_20250101"
-    file_names = os.listdir(ipc_path)
-    ipc_dict = {}
-    for file_name in file_names:
-        with open(ipc_path + "/" + file_name, "r", encoding="utf-8") as file:
-            lines = file.readlines()  # each line becomes an element in a list
-            lines = [line.strip() for line in lines]
-        dic = {l.split("\t")[0]: l.split("\t")[1] for l in lines[1:] if "\t" in l[:4]}
-        ipc_dict[file_name.split("_")[3]] = dic
-    return ipc_dict
+def extract_ipc_dic(ipc_path=DEFAULT_IPC_PATH):
+    """
+    Section and class titles of the IPC title lists in ``ipc_path``.
+
+    Served from the cached lookup of load_ipc_titles, so only the first call
+    (per process, and per change of the lists) reads the text files.
+
+    Returns:
+        dict: {section: {code: title}} for section ("A") and class ("A61") codes
+    """
+    return load_ipc_titles(ipc_path).by_section(max_length=3)
 
 
 def extract_classify_num_patents_w_experiments_w_subclass(
-    folder_path="D:\\unzipped_patents_23_24",
+    folder_path="D:\\unzipped_patents_23_24", max_workers=None, callback=print
 ):
-    # https://dimensions.freshdesk.com/support/solutions/articles/23000018832-what-are-the-ipcr-and-cpc-patent-classifications- (IPCR AND CPC CLASSIFICATIONS)
+    """
+    Patents with and without an examples section per IPC class title.
 
-    ipc_dic = extract_ipc_dic()
-    subclass_dict = {}
-
-    file_names = os.listdir(folder_path)
-    total_num_of_patents = 0
-    for i, file_name in enumerate(file_names):
-        all_xml_parts = []
-        if file_name.endswith(".xml"):
-            print(f"Processing {file_name}... ({i + 1}/{len(file_names)})")
-            file_path = os.path.join(folder_path, file_name)
-            try:
-                with open(file_path, "r", encoding="utf-8") as file:
-                    content = file.read()
-                    parts = content.split('<?xml version="1.0" encoding="UTF-8"?>')
-                    parts = [p for p in parts if p.strip()]
-                    all_xml_parts.extend(parts)
-            except Exception as e:
-                print(f"Error processing {file}: {str(e)}")
-            # xml_no_dup = remove_duplicate_docs(all_xml_parts)
-            # print(f"Num of duplicates removed: {len(all_xml_parts) - len(xml_no_dup)} out of {len(all_xml_parts)}")
-            total_num_of_patents += len(all_xml_parts)
-            for j, xml in enumerate(all_xml_parts):
-                if j % 2000 == 0:
-                    print(f"Processing {j}/{len(all_xml_parts)}")
-                root = etree.fromstring(xml.encode(), etree.XMLParser(recover=True))
-                try:
-                    sections = root.xpath(
-                        "//classifications-ipcr/classification-ipcr/section"
-                    )
-                    classes = root.xpath(
-                        "//classifications-ipcr/classification-ipcr/class"
-                    )
-
-                    # Get unique subclass names for this patent
-                    this_subclass_names = set()
-                    for section_elem, class_elem in zip(sections, classes):
-                        section = section_elem.text
-                        class_code = class_elem.text
-                        full_code = section + class_code
-
-                        try:
-                            subclass_name = ipc_dic[section][full_code]
-                            this_subclass_names.add(subclass_name)
-                        except KeyError:
-                            continue
-
-                    # Update counts for each subclass found
-                    for subclass_name in this_subclass_names:
-                        if subclass_name not in subclass_dict:
-                            subclass_dict[subclass_name] = {
-                                "with_examples": 0,
-                                "without_examples": 0,
-                            }
-
-                        if extract_experiments_w_heading(xml):
-                            subclass_dict[subclass_name]["with_examples"] += 1
-                        else:
-                            subclass_dict[subclass_name]["without_examples"] += 1
-
-                except IndexError:
-                    continue
-            if i == 0:
-                start = file_name.split("a")[1].split(".")[0]
-                end = start
-            else:
-                end = file_name.split("a")[1].split(".")[0]
+    Each patent counts once for every distinct class among its IPC
+    classifications; classes missing from the IPC title list are left out.
+    The result is also saved as subclass_of_<patents>_Patents_<first>_<last>.json.
 
-            save_as_json(
-                subclass_dict,
-                f"subclass_of_{total_num_of_patents}_Patents_{start}_{end}.json",
-            )
+    Returns:
+        dict: {class title: {"with_examples": n, "without_examples": n}}
+    """
+    ipc_dic = extract_ipc_dic()
+    totals, total_num_of_patents = count_ipc_examples(
+        folder_path, IPC_BY_CLASS, max_workers=max_workers, callback=callback
+    )
+    subclass_dict = _counts_table(
+        totals, lambda code: ipc_dic.get(code[0], {}).get(code)
+    )
 
+    dates = [
+        match.group(1)
+        for match in map(WEEKLY_FILE_RE.search, _xml_files(folder_path))
+        if match
+    ]
+    if dates:
+        save_as_json(
+            subclass_dict,
+            f"subclass_of_{total_num_of_patents}_Patents_{dates[0]}_{dates[-1]}.json",
+        )
     return subclass_dict
@@ -2,6 +2,8 @@ from bs4 import BeautifulSoup
 from lxml import etree
 import re
 import os
+import pickle
+import pandas as pd
 
 
 def remove_leadiong_zeros(s):
@@ -15,7 +17,9 @@ def remove_leadiong_zeros(s):
 def find_doc_number(xml_part):
     """Find document number with improved error handling."""
     try:
-        root = etree.fromstring(xml_part.encode(), etree.XMLParser(recover=True))
+        # Accepts str or bytes-like documents (bytes, memoryview of a mapped file)
+        data = xml_part.encode() if isinstance(xml_part, str) else xml_part
+        root = etree.fromstring(data, etree.XMLParser(recover=True))
         if root is None:
             return []
 
@@ -121,3 +125,43 @@ def extract_examples_start_w_word_all(xml_siblings):
             current_example["content"].append(tag.text.strip())
 
     return examples
+
+
+def read_xlsb_file(file_path, sheet_name=0, **kwargs):
+    """Read a binary Excel (.xlsb) sheet into a DataFrame; needs the pyxlsb package."""
+    return pd.read_excel(file_path, sheet_name=sheet_name, engine="pyxlsb", **kwargs)
+
+
+def save_as_pickle(data, filename):
+    with open(filename, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"Saved as {filename}")
+
+
+# Design, reissue, plant, SIR and other lettered numbers, e.g. "D123", "US RE45,678"
+NON_UTILITY_NUMBER_RE = re.compile(
+    r"^\s*(?:US[\s-]*)?(?:RE|RX|PP|AI|D|H|T|X)\s*\d", re.IGNORECASE
+)
+
+
+def normalize_patent_numbers(values):
+    """
+    Patent numbers as int64, for a whole column at once.
+
+    Numbers (and strings holding one, e.g. "7654321.0" from a spreadsheet)
+    are truncated to integers; other strings keep their digits only, so
+    "US 7,654,321" becomes 7654321. Anything without digits becomes 0, and so
+    do non-utility numbers such as "D123" or "RE123", which would otherwise
+    collide with utility patent 123.
+
+    Returns:
+        pandas.Series of int64, aligned with ``values``
+    """
+    series = pd.Series(values)
+    numbers = pd.to_numeric(series, errors="coerce")
+    text = series[numbers.isna() & series.notna()].astype(str)
+    if len(text):
+        text = text[~text.str.contains(NON_UTILITY_NUMBER_RE)]
+        digits = text.str.replace(r"\D", "", regex=True)
+        numbers.loc[text.index] = pd.to_numeric(digits, errors="coerce")
+    return numbers.fillna(0).astype("int64")
@@ -0,0 +1,155 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Stages run one year at a time by default, so year N+1 downloads while N unzips
+DEFAULT_STAGE_LIMITS = {"download": 1, "unzip": 1, "process": 1}
+
+
+class YearPipelineScheduler:
+    """
+    Run per-year stages (download -> unzip -> process) pipelined across years.
+
+    Every year walks through the stages in order, and years enter each stage in
+    the order they were given, so with the default limits year N+1 downloads
+    while year N is unzipped and year N-1 is classified. Each stage has its own
+    concurrency limit and every running stage also takes its worker cost from a
+    shared worker budget. The stop event keeps the multiprocessing.Event
+    semantics used elsewhere: once set, no new stage is started and the running
+    stage functions receive it to stop themselves.
+
+    With a ``memory_governor`` (see memory.py) memory-bound stages only start
+    while the shared memory budget has room, unless no other stage is
+    running.
+    """
+
+    def __init__(
+        self,
+        stage_limits=None,
+        worker_budget=None,
+        stop_event=None,
+        callback=None,
+        memory_governor=None,
+    ):
+        self.stage_limits = dict(DEFAULT_STAGE_LIMITS)
+        self.stage_limits.update(stage_limits or {})
+        self.worker_budget = worker_budget
+        self.stop_event = stop_event
+        self.callback = callback
+        self.memory_governor = memory_governor
+
+        self._stages = []
+        self._semaphores = {}
+        self._turns = {}
+        self._turn_condition = threading.Condition()
+        self._budget_condition = threading.Condition()
+        self._workers_in_use = 0
+        self._running = 0
+        self._running_lock = threading.Lock()
+
+    def add_stage(self, name, func, workers=1, memory_bound=False):
+        """
+        Register a stage.
+
+        Args:
+            name: Stage name, used to look up its concurrency limit
+            func: Callable taking (year, stop_event) and returning True on success
+            workers: Worker cost the stage takes from the global budget while running
+            memory_bound: Wait for room in the memory budget before starting
+        """
+        limit = max(1, self.stage_limits.get(name, 1))
+        self._stages.append((name, func, workers, memory_bound))
+        self._semaphores[name] = threading.Semaphore(limit)
+        return self
+
+    def _stopped(self):
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def _wait_turn(self, name, position):
+        with self._turn_condition:
+            self._turn_condition.wait_for(lambda: self._turns[name] == position)
+
+    def _pass_turn(self, name):
+        with self._turn_condition:
+            self._turns[name] += 1
+            self._turn_condition.notify_all()
+
+    def _acquire_workers(self, workers):
+        if not self.worker_budget:
+            return 0
+        workers = min(workers, self.worker_budget)
+        with self._budget_condition:
+            self._budget_condition.wait_for(
+                lambda: self._workers_in_use + workers <= self.worker_budget
+            )
+            self._workers_in_use += workers
+        return workers
+
+    def _release_workers(self, workers):
+        if not workers:
+            return
+        with self._budget_condition:
+            self._workers_in_use -= workers
+            self._budget_condition.notify_all()
+
+    def _wait_for_memory(self, name, year):
+        # Nothing else running means nothing will free memory, so start anyway
+        self.memory_governor.wait(
+            f"[{year}] {name}", self.stop_event, busy=lambda: self._running > 0
+        )
+
+    def _set_running(self, change):
+        with self._running_lock:
+            self._running += change
+
+    def _run_year(self, position, year):
+        ok = True
+        for name, func, workers, memory_bound in self._stages:
+            # Keep the turn order even for failed years so later years don't block
+            self._wait_turn(name, position)
+            if ok and memory_bound and self.memory_governor is not None:
+                self._wait_for_memory(name, year)
+            if not ok or self._stopped():
+                self._pass_turn(name)
+                ok = False
+                continue
+
+            semaphore = self._semaphores[name]
+            semaphore.acquire()
+            self._pass_turn(name)
+            taken = self._acquire_workers(workers)
+            self._set_running(1)
+            try:
+                if self.callback:
+                    self.callback(f"[{year}] Starting {name}")
+                ok = bool(func(year, self.stop_event))
+                if not ok and self.callback:
+                    self.callback(f"[{year}] {name} failed, skipping remaining stages")
+            except Exception as e:
+                ok = False
+                if self.callback:
+                    self.callback(f"[{year}] Error during {name}: {str(e)}")
+            finally:
+                self._set_running(-1)
+                self._release_workers(taken)
+                semaphore.release()
+        return ok
+
+    def run(self, years):
+        """Run all stages for every year and return {year: success}."""
+        years = list(years)
+        if not years or not self._stages:
+            return {}
+
+        self._turns = {name: 0 for name, _, _, _ in self._stages}
+        with ThreadPoolExecutor(max_workers=len(years)) as executor:
+            futures = {
+                year: executor.submit(self._run_year, position, year)
+                for position, year in enumerate(years)
+            }
+            try:
+                return {year: future.result() for year, future in futures.items()}
+            except BaseException:
+                # e.g. Ctrl+C in the caller: stop the remaining stages before joining
+                if self.stop_event is not None:
+                    self.stop_event.set()
+                raise
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The utilities package is imported as the CLI scripts import it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts"))
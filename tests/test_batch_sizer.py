@@ -0,0 +1,59 @@
+import pytest
+
+from utilities.patent_processor import MAX_BATCH_STEP, AdaptiveBatchSizer
+
+
+def run(sizer, seconds_per_document, bytes_per_document, batches=10):
+    for _ in range(batches):
+        size = sizer.size
+        sizer.observe(size, size * bytes_per_document, size * seconds_per_document)
+    return sizer.size
+
+
+def test_initial_size_is_clamped():
+    assert AdaptiveBatchSizer(100, min_size=10, max_size=50).size == 50
+    assert AdaptiveBatchSizer(1, min_size=10, max_size=50).size == 10
+    assert AdaptiveBatchSizer(100).max_size == 400
+
+
+def test_converges_on_target_latency():
+    sizer = AdaptiveBatchSizer(100, max_size=10_000, target_seconds=2.0)
+    assert run(sizer, 0.01, 1000, batches=20) == pytest.approx(200, abs=2)
+
+
+def test_large_documents_are_limited_by_bytes():
+    sizer = AdaptiveBatchSizer(
+        100, max_size=10_000, target_seconds=2.0, target_bytes=1024**2
+    )
+    assert run(sizer, 0.001, 64 * 1024, batches=20) == 16
+
+
+def test_slow_documents_shrink_to_min_size():
+    sizer = AdaptiveBatchSizer(100, min_size=8, target_seconds=1.0)
+    assert run(sizer, 1.0, 1000) == 8
+
+
+def test_step_is_limited():
+    sizer = AdaptiveBatchSizer(100, max_size=10_000)
+    sizer.observe(100, 0, 0.001)
+    assert sizer.size == 100 * MAX_BATCH_STEP
+    sizer = AdaptiveBatchSizer(100, max_size=10_000)
+    sizer.observe(100, 0, 100.0)
+    assert sizer.size == 100 / MAX_BATCH_STEP
+
+
+def test_empty_batches_are_ignored_and_metrics_exposed():
+    sizer = AdaptiveBatchSizer(100)
+    assert sizer.observe(0, 0, 1.0) == 100
+    assert sizer.metrics["batches"] == 0
+    assert sizer.format() == "batch size 100"
+
+    sizer.observe(50, 50 * 2048, 0.5)
+    assert sizer.metrics == {
+        "batch_size": 200,
+        "batches": 1,
+        "last_batch_seconds": 0.5,
+        "seconds_per_document": 0.01,
+        "bytes_per_document": 2048.0,
+    }
+    assert "10.0 ms and 2.0 KB per document" in sizer.format()
@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from utilities.cancellation import ExecutorRegistry
+
+
+def wait_until(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_cancel_all_discards_queued_thread_tasks():
+    registry = ExecutorRegistry()
+    release = threading.Event()
+    executor = registry.register(ThreadPoolExecutor(max_workers=1), "threads")
+    running = executor.submit(release.wait)
+    wait_until(running.running)
+    queued = [executor.submit(time.sleep, 0) for _ in range(3)]
+
+    report = registry.cancel_all(grace_period=0)
+    release.set()
+
+    assert (report.executors, report.cancelled) == (1, 3)
+    assert all(future.cancelled() for future in queued)
+    assert running.result(timeout=5) is True
+    assert len(registry) == 0
+    # Released, so a second call has nothing to stop
+    assert registry.cancel_all().executors == 0
+
+
+def test_cancel_all_terminates_busy_process_workers():
+    registry = ExecutorRegistry()
+    messages = []
+    executor = registry.register(ProcessPoolExecutor(max_workers=1))
+    futures = [executor.submit(time.sleep, 30) for _ in range(4)]
+    wait_until(futures[0].running)
+
+    report = registry.cancel_all(grace_period=0.2, callback=messages.append)
+
+    # One task runs and one may already be in the call queue; the rest never start
+    assert report.terminated == 1
+    assert report.interrupted >= 1 and report.finished == 0
+    assert report.cancelled + report.interrupted == 4
+    assert 0.2 <= report.elapsed < 10
+    with pytest.raises(BrokenProcessPool):
+        futures[0].result(timeout=5)
+    assert futures[-1].cancelled()
+    assert messages[-1] == report.format()
+
+
+class OpaqueProcessPool(ProcessPoolExecutor):
+    """A pool without the private attributes cancel_all reads."""
+
+    def __init__(self):
+        self.shutdown_calls = []
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.shutdown_calls.append((wait, cancel_futures))
+
+
+def test_cancel_all_without_private_attributes_still_shuts_down():
+    registry = ExecutorRegistry()
+    pool = registry.register(OpaqueProcessPool())
+
+    report = registry.cancel_all(grace_period=0)
+
+    assert pool.shutdown_calls == [(False, True)]
+    assert (report.executors, report.cancelled, report.terminated) == (1, 0, 0)
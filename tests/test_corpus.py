@@ -0,0 +1,71 @@
+import os
+import pickle
+
+import pytest
+
+from utilities.corpus import Corpus, CorpusWriter, split_corpus
+
+
+def xml(number, section="A"):
+    return (
+        f"<us-patent-grant><doc-number>{number}</doc-number>"
+        "<classifications-ipcr><classification-ipcr>"
+        f"<section>{section}</section><class>61</class><subclass>K</subclass>"
+        "</classification-ipcr></classifications-ipcr>"
+        f"<p>Example text of {number} é</p></us-patent-grant>\n"
+    )
+
+
+@pytest.fixture
+def corpus_path(tmp_path):
+    path = str(tmp_path / "test_dataset_2020.corpus")
+    # Small chunks so the documents span several of them
+    with CorpusWriter(path, chunk_size=200, metadata={"year": 2020}) as writer:
+        for number in range(10):
+            writer.add(f"{number:08d}", xml(number), source="ipg200107.xml")
+        writer.add_all([("00000003", xml("replaced", "C"))])
+    return path
+
+
+def test_round_trip(corpus_path):
+    with Corpus(corpus_path) as corpus:
+        assert len(corpus) == 10
+        assert corpus.metadata == {"year": "2020"}
+        assert len(corpus.chunk_ids()) > 1
+        assert "00000005" in corpus and "99999999" not in corpus
+        assert corpus["00000005"] == xml(5)
+        assert corpus["00000003"] == xml("replaced", "C")
+        assert corpus.get("99999999") is None
+        with pytest.raises(KeyError):
+            corpus["99999999"]
+        streamed = dict(corpus)
+    assert streamed == {
+        f"{number:08d}": xml("replaced", "C") if number == 3 else xml(number)
+        for number in range(10)
+    }
+
+
+def test_documents_read_in_other_processes(corpus_path):
+    with Corpus(corpus_path) as corpus:
+        document = pickle.loads(pickle.dumps(corpus.document("00000007")))
+        copy = pickle.loads(pickle.dumps(corpus))
+    assert document.read(bytes).decode() == xml(7)
+    with copy:
+        assert copy["00000007"] == xml(7)
+
+
+def test_split_corpus_collects_ipc_codes(corpus_path):
+    classifications = {}
+    documents, total = split_corpus(corpus_path, classifications)
+    assert total == len(documents) == 10
+    assert classifications["00000001"] == [("A", "61", "K")]
+    assert classifications["00000003"] == [("C", "61", "K")]
+
+
+def test_writer_discards_the_file_on_error(tmp_path):
+    path = str(tmp_path / "broken.corpus")
+    with pytest.raises(RuntimeError):
+        with CorpusWriter(path) as writer:
+            writer.add("1", xml(1))
+            raise RuntimeError("interrupted")
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,78 @@
+import os
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from utilities.daemon import IncompleteIngestion, IngestionDaemon
+from utilities.sources import LocalDirectorySource
+
+FILE_NAME = "ipg200107.zip"
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    daemon = IngestionDaemon(
+        base_path=str(tmp_path),
+        year=2020,
+        source=LocalDirectorySource(str(tmp_path)),
+        max_workers=1,
+    )
+    daemon._start_pools()
+    yield daemon
+    daemon._stop_pools()
+
+
+def finished_pipeline(grand_total=2, **census):
+    counts = Counter(documents=10, no_examples=8, with_examples=2)
+    counts.update(census)
+    return SimpleNamespace(census=counts, grand_total=grand_total)
+
+
+def test_check_complete_accepts_a_fully_stored_file(daemon):
+    daemon._check_complete(FILE_NAME, finished_pipeline())
+
+
+@pytest.mark.parametrize(
+    "pipeline, reason",
+    [
+        (SimpleNamespace(census=Counter(), grand_total=0), "no documents"),
+        (finished_pipeline(failed=3), "3 of 13 documents failed"),
+        (finished_pipeline(grand_total=1), "stored 1 of 2"),
+    ],
+)
+def test_check_complete_rejects_partial_files(daemon, pipeline, reason):
+    with pytest.raises(IncompleteIngestion, match=reason):
+        daemon._check_complete(FILE_NAME, pipeline)
+
+
+def test_broken_pool_leaves_file_unmarked_and_is_replaced(daemon, monkeypatch):
+    # A worker that dies breaks the whole process pool
+    with pytest.raises(Exception):
+        daemon.processor.process_pool.submit(os._exit, 1).result()
+    assert daemon._broken_pools() == ["extraction"]
+
+    monkeypatch.setattr(daemon, "new_files", lambda year: [FILE_NAME])
+    monkeypatch.setattr(
+        daemon,
+        "_ingest_file",
+        lambda year, file_name: daemon._check_complete(file_name, finished_pipeline())
+        or 2,
+    )
+    # The pool broke while the file was ingested
+    monkeypatch.setattr(daemon, "_replace_broken_pools", lambda: None)
+    assert daemon.poll_once() == []
+    assert daemon.status["incomplete_files"] == [FILE_NAME]
+    assert daemon.ingested == {}
+
+    monkeypatch.undo()
+    monkeypatch.setattr(daemon, "new_files", lambda year: [FILE_NAME])
+    monkeypatch.setattr(
+        daemon,
+        "_ingest_file",
+        lambda year, file_name: daemon._check_complete(file_name, finished_pipeline())
+        or 2,
+    )
+    assert daemon.poll_once() == [FILE_NAME]
+    assert daemon._broken_pools() == []
+    assert daemon.ingested == {"2020": {"ipg200107": 0}}
@@ -0,0 +1,282 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from utilities import database_utils
+from utilities.database_utils import (
+    ReadConnectionCache,
+    connect_read,
+    get_shard_path,
+    kind_from_file_name,
+    list_shards,
+    resolve_db_path,
+    sector_prophetic_rates,
+    store_file_census,
+    store_patent_batch,
+    store_patent_ipc,
+    yearly_prophetic_rates,
+)
+from utilities.nlp_processing import tense_statistics
+from utilities.records import ExampleRecord
+
+
+def make_shard(path, rows, with_year=True):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    columns = "patent_number TEXT, year INTEGER" if with_year else "patent_number TEXT"
+    conn.execute(f"CREATE TABLE patent_statistics ({columns})")
+    conn.executemany(
+        "INSERT INTO patent_statistics VALUES " + ("(?, ?)" if with_year else "(?)"),
+        rows if with_year else [row[:1] for row in rows],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_kind_from_file_name():
+    assert kind_from_file_name("ipg200107.xml") == "grant"
+    assert kind_from_file_name("/data/ipa200109.xml") == "application"
+    assert kind_from_file_name("other.xml") is None
+
+
+def test_resolve_db_path(tmp_path):
+    db_path = str(tmp_path / "patents.db")
+    assert resolve_db_path(db_path, 2020, "grant") == db_path
+    assert resolve_db_path(db_path, 2020, "grant", sharded=True) == str(
+        tmp_path / "patents_shards" / "grant_2020.db"
+    )
+    assert get_shard_path(db_path).endswith("unknown_unknown.db")
+
+
+def test_list_shards_filters(tmp_path):
+    db_path = str(tmp_path / "patents.db")
+    for kind, year in [("grant", 2019), ("grant", 2020), ("application", 2020)]:
+        make_shard(get_shard_path(db_path, year, kind), [])
+
+    assert [(k, y) for k, y, _ in list_shards(db_path)] == [
+        ("application", "2020"),
+        ("grant", "2019"),
+        ("grant", "2020"),
+    ]
+    assert [(k, y) for k, y, _ in list_shards(db_path, years=[2020])] == [
+        ("application", "2020"),
+        ("grant", "2020"),
+    ]
+    assert [(k, y) for k, y, _ in list_shards(db_path, kinds=["grant"])] == [
+        ("grant", "2019"),
+        ("grant", "2020"),
+    ]
+
+
+def test_connect_read_without_shards(tmp_path):
+    db_path = str(tmp_path / "patents.db")
+    make_shard(db_path, [("1", 2020)])
+    with closing(connect_read(db_path)) as conn:
+        assert conn.execute("SELECT * FROM patent_statistics").fetchall() == [
+            ("1", 2020)
+        ]
+
+
+def test_connect_read_unions_main_and_shards(tmp_path):
+    db_path = str(tmp_path / "patents.db")
+    make_shard(db_path, [("1", 2018)])
+    make_shard(get_shard_path(db_path, 2019, "grant"), [("2", 2019)])
+    # A shard from an older schema without the year column
+    make_shard(get_shard_path(db_path, 2020, "grant"), [("3", 2020)], with_year=False)
+
+    conn = connect_read(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT patent_number, year FROM patent_statistics ORDER BY patent_number"
+        ).fetchall()
+    finally:
+        conn.close()
+    assert rows == [("1", 2018), ("2", 2019), ("3", None)]
+
+
+@pytest.mark.parametrize("years", [12, 25])
+def test_connect_read_more_shards_than_attach_limit(tmp_path, years):
+    db_path = str(tmp_path / "patents.db")
+    make_shard(db_path, [("0", 1999)])
+    for year in range(2000, 2000 + years):
+        make_shard(get_shard_path(db_path, year, "grant"), [(str(year), year)])
+
+    conn = connect_read(db_path)
+    try:
+        count, first, last = conn.execute(
+            "SELECT COUNT(*), MIN(year), MAX(year) FROM patent_statistics"
+        ).fetchone()
+        columns = [
+            row[1] for row in conn.execute("PRAGMA table_info(patent_statistics)")
+        ]
+    finally:
+        conn.close()
+    assert (count, first, last) == (years + 1, 1999, 1999 + years)
+    assert columns == ["patent_number", "year"]
+
+
+def test_connect_read_filters_shards(tmp_path):
+    db_path = str(tmp_path / "patents.db")
+    for year in range(2000, 2012):
+        make_shard(get_shard_path(db_path, year, "grant"), [(str(year), year)])
+    with closing(connect_read(db_path, years=[2003, 2004])) as conn:
+        years = [row[0] for row in conn.execute("SELECT year FROM patent_statistics")]
+    assert sorted(years) == [2003, 2004]
+
+
+def test_store_patent_batch_writes_examples_and_statistics(tmp_path):
+    db_path = str(tmp_path / "patents.db")
+    records = [
+        ExampleRecord("123", "1", "", "It was heated.", tense="past"),
+        ExampleRecord("123", "2", "", "It is mixed.", tense="present"),
+    ]
+    store_patent_batch(records, tense_statistics(records), db_path, 2020)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM patent_examples").fetchone() == (2,)
+        assert conn.execute(
+            "SELECT patent_number, year, prophetic, nonprophetic FROM patent_statistics"
+        ).fetchall() == [("123", 2020, 1, 1)]
+
+
+def test_store_patent_batch_is_one_transaction(tmp_path):
+    db_path = str(tmp_path / "patents.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE patent_statistics (unrelated TEXT)")
+    records = [ExampleRecord("123", "1", "", "It was heated.", tense="past")]
+    with pytest.raises(sqlite3.OperationalError):
+        store_patent_batch(records, tense_statistics(records), db_path, 2020)
+    with sqlite3.connect(db_path) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert "patent_examples" not in tables
+
+
+def test_yearly_prophetic_rates_filters_statistics_by_kind(tmp_path):
+    db_path = str(tmp_path / "patents.db")
+    census = {"documents": 10, "duplicates": 0, "with_examples": 1}
+    store_file_census("ipg200107.xml", census, db_path, 2020, "grant")
+    store_file_census("ipa200109.xml", census, db_path, 2020, "application")
+    grant = [ExampleRecord("7000001", "1", "", "It was heated.", tense="past")]
+    application = [ExampleRecord("20200001", "1", "", "It is mixed.", tense="present")]
+    store_patent_batch(grant, tense_statistics(grant), db_path, 2020, "grant")
+    store_patent_batch(
+        application, tense_statistics(application), db_path, 2020, "application"
+    )
+
+    columns = ["year", "files", "patents", "stored", "all_prophetic", "no_prophetic"]
+    grants = yearly_prophetic_rates(db_path, kinds=["grant"])
+    assert grants[columns].values.tolist() == [[2020, 1, 10, 1, 0, 1]]
+    assert grants["prophetic_rate"].tolist() == [0.0]
+    both = yearly_prophetic_rates(db_path)
+    assert both[columns].values.tolist() == [[2020, 2, 20, 2, 1, 1]]
+    assert both["prophetic_rate"].tolist() == [0.05]
+
+
+def test_store_patent_ipc(tmp_path):
+    db_path = str(tmp_path / "patents.db")
+    store_patent_ipc(
+        {"1": [("A", "61", "K"), ("C", "07", "")], "2": [("C", "07", "D")]},
+        db_path,
+        2020,
+    )
+    # Stored again: the old codes are replaced and no codes is one NULL row
+    store_patent_ipc({"2": [], "3": [("A", "01", "B")]}, db_path, 2021)
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT * FROM patent_ipc ORDER BY patent_number, position"
+        ).fetchall()
+    assert rows == [
+        ("1", 0, 2020, "A", "61", "K"),
+        ("1", 1, 2020, "C", "07", None),
+        ("2", 0, 2021, None, None, None),
+        ("3", 0, 2021, "A", "01", "B"),
+    ]
+    assert store_patent_ipc({}, db_path) is True
+
+
+def by_code(rates, level):
+    """Index sector rates by code, with "" for patents without one."""
+    return rates.assign(**{level: rates[level].fillna("")}).set_index(level)
+
+
+def test_sector_prophetic_rates(tmp_path):
+    db_path = str(tmp_path / "patents.db")
+    store_patent_ipc(
+        {
+            "1": [("A", "61", "K"), ("C", "07", "D")],
+            "2": [("A", "61", "P"), ("A", "61", "K")],
+            "3": [("C", "07", "D")],
+            "4": [],
+        },
+        db_path,
+        2020,
+    )
+    records = [
+        ExampleRecord("1", "1", "", "It is mixed.", tense="present"),
+        ExampleRecord("2", "1", "", "It was heated.", tense="past"),
+        ExampleRecord("2", "2", "", "It is mixed.", tense="present"),
+    ]
+    store_patent_batch(records, tense_statistics(records), db_path, 2020)
+
+    sections = by_code(sector_prophetic_rates(db_path), "section")
+    # By section each patent counts once, under its primary classification
+    assert sections["patents"].to_dict() == {"": 1, "A": 2, "C": 1}
+    assert sections.loc["A", "with_examples"] == 2
+    assert sections.loc["A", ["all_prophetic", "some_prophetic"]].tolist() == [1, 1]
+    assert sections.loc["A", "examples_rate"] == 1.0
+    assert sections.loc["C", "with_examples"] == 0
+    assert sections.loc["C", "all_prophetic_rate"] == 0.0
+
+    classes = by_code(sector_prophetic_rates(db_path, [2020], "class"), "class")
+    # By class a patent counts under each distinct code it carries
+    assert classes["patents"].to_dict() == {"": 1, "A61": 2, "C07": 2}
+    subclasses = by_code(sector_prophetic_rates(db_path, level="subclass"), "subclass")
+    assert subclasses["with_examples"].to_dict() == {
+        "": 0,
+        "A61K": 2,
+        "A61P": 1,
+        "C07D": 1,
+    }
+    assert sector_prophetic_rates(db_path, years=[2019])["patents"].tolist() == []
+    with pytest.raises(ValueError):
+        sector_prophetic_rates(db_path, level="group")
+
+
+def test_read_connection_cache_reuses_the_merged_shards(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "patents.db")
+    for year in range(2000, 2012):
+        make_shard(get_shard_path(db_path, year, "grant"), [(str(year), year)])
+    merges = []
+    merge_sources = database_utils._merge_sources
+    monkeypatch.setattr(
+        database_utils,
+        "_merge_sources",
+        lambda *args: merges.append(args) or merge_sources(*args),
+    )
+
+    cache = ReadConnectionCache()
+    try:
+        conn = cache.get(db_path)
+        assert cache.get(db_path) is conn
+        assert len(merges) == 1
+        assert conn.execute("SELECT COUNT(*) FROM patent_statistics").fetchone() == (
+            12,
+        )
+
+        # A write to a shard (or a new shard) opens a fresh connection
+        make_shard(get_shard_path(db_path, 2012, "grant"), [("2012", 2012)])
+        fresh = cache.get(db_path)
+        assert fresh is not conn and len(merges) == 2
+        assert fresh.execute("SELECT COUNT(*) FROM patent_statistics").fetchone() == (
+            13,
+        )
+        # Other filters are other connections
+        filtered = cache.get(db_path, years=[2005])
+        assert filtered.execute("SELECT year FROM patent_statistics").fetchall() == [
+            (2005,)
+        ]
+    finally:
+        cache.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        filtered.execute("SELECT 1")
@@ -0,0 +1,142 @@
+import pytest
+
+from utilities import document_source
+from utilities.document_source import (
+    XML_DECLARATION_BYTES,
+    DocumentSlice,
+    find_ipc_classes,
+    find_ipc_codes,
+    iter_document_slices,
+    read_document,
+    split_document_slices,
+)
+from utilities.utils_clean import find_doc_number
+
+DECLARATION = XML_DECLARATION_BYTES.decode()
+
+
+def document(number, text="text"):
+    reference = (
+        "<publication-reference><document-id>"
+        f"<doc-number> {number} </doc-number></document-id></publication-reference>"
+        if number
+        else ""
+    )
+    return f"\n<us-patent-grant>{reference}<p>{text}</p></us-patent-grant>\n"
+
+
+@pytest.fixture
+def week(tmp_path):
+    """A weekly file with a numberless, a blank and a repeated document."""
+    bodies = [
+        document("07000001"),
+        document(None),
+        "\n  \n",
+        document("07000002"),
+        document("07000001", "a longer version"),
+    ]
+    path = tmp_path / "ipg200107.xml"
+    path.write_text("".join(DECLARATION + body for body in bodies))
+    return str(path), bodies
+
+
+def test_iter_document_slices(week):
+    path, bodies = week
+    found = list(iter_document_slices(path))
+    assert [doc_number for _, doc_number in found] == [
+        "07000001",
+        None,
+        "07000002",
+        "07000001",
+    ]
+    # Slices cover the bytes after each declaration, blank documents skipped
+    data = open(path, "rb").read()
+    assert [data[s.offset : s.offset + s.length].decode() for s, _ in found] == [
+        bodies[0],
+        bodies[1],
+        bodies[3],
+        bodies[4],
+    ]
+    assert all(isinstance(s, DocumentSlice) and s.path == path for s, _ in found)
+
+
+def test_iter_document_slices_of_empty_files(tmp_path):
+    (tmp_path / "empty.xml").write_bytes(b"")
+    (tmp_path / "text.xml").write_text("no declaration here")
+    assert list(iter_document_slices(str(tmp_path / "empty.xml"))) == []
+    assert list(iter_document_slices(str(tmp_path / "text.xml"))) == []
+    assert split_document_slices(str(tmp_path / "text.xml")) == (None, 0)
+
+
+def test_split_document_slices_keeps_the_longest_version(week):
+    path, bodies = week
+    slices, total = split_document_slices(path)
+    assert total == 4
+    assert [read_document(s, bytes).decode() for s in slices] == [bodies[3], bodies[4]]
+
+
+def test_read_document_passes_a_view_of_the_mapped_file(week, monkeypatch):
+    monkeypatch.setattr(document_source, "_mapped_files", {})
+    path, _ = week
+    slices, _ = split_document_slices(path)
+    views = []
+
+    def parse(view):
+        views.append(type(view))
+        return find_doc_number(view)
+
+    numbers = [read_document(s, parse) for s in slices]
+    assert numbers == [[" 07000002 "], [" 07000001 "]]
+    assert views == [memoryview, memoryview]
+    # Both reads share one mapping of the file
+    assert list(document_source._mapped_files) == [path]
+
+
+def test_mapped_files_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_source, "_mapped_files", {})
+    paths = []
+    for week in range(3):
+        path = tmp_path / f"ipg2001{week:02d}.xml"
+        path.write_text(DECLARATION + document(f"0700000{week}"))
+        paths.append(str(path))
+        (document_slice,), _ = split_document_slices(str(path))
+        read_document(document_slice, bytes)
+    assert list(document_source._mapped_files) == paths[1:]
+
+
+def test_read_document_of_other_documents():
+    class Stored:
+        def read(self, func):
+            return func(b"<stored/>")
+
+    assert read_document(Stored(), bytes) == b"<stored/>"
+
+
+IPCR = b"""<classifications-ipcr>
+<classification-ipcr><ipc-version-indicator/><section>A</section>
+<class>61</class><subclass>K</subclass><main-group>9</main-group></classification-ipcr>
+<classification-ipcr><section> C </section><class>07</class></classification-ipcr>
+</classifications-ipcr>"""
+
+
+def test_find_ipc_codes():
+    data = b"<us-patent-grant>" + IPCR + b"</us-patent-grant>"
+    assert find_ipc_codes(data) == [("A", "61", "K"), ("C", "07", "")]
+    assert find_ipc_classes(memoryview(data)) == [("A", "61"), ("C", "07")]
+    assert find_ipc_codes(b"<us-patent-grant/>") == []
+    # Only the given range is searched
+    assert find_ipc_codes(b"<p/>" + data, 4) == find_ipc_codes(data)
+    assert find_ipc_codes(data, 0, len(data) // 2) == []
+
+
+def test_split_document_slices_collects_ipc_codes(tmp_path):
+    classified = document("07000001").replace("<p>", IPCR.decode() + "<p>")
+    path = tmp_path / "ipg200107.xml"
+    path.write_text(DECLARATION + classified + DECLARATION + document("07000002"))
+    classifications = {}
+    slices, total = split_document_slices(str(path), classifications)
+    assert total == 2
+    assert classifications == {
+        "07000001": [("A", "61", "K"), ("C", "07", "")],
+        "07000002": [],
+    }
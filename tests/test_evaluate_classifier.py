@@ -0,0 +1,119 @@
+import json
+import sys
+
+import pandas as pd
+import pytest
+
+import evaluate_classifier
+from evaluate_classifier import score
+from utilities.corpus import CorpusWriter
+
+EXAMPLES = """<heading id="h1" level="1">EXAMPLES</heading>
+<heading id="h2" level="2">Example 1</heading>
+<p id="p1">The mixture was heated to 50 C and stirred.</p>
+<heading id="h3" level="2">Example 2</heading>
+<p id="p2">A tablet is prepared by mixing the compound with lactose.</p>
+"""
+
+
+def document(number, examples=True):
+    body = '<p id="f">' + "lorem ipsum " * 250 + "</p>\n"
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<us-patent-grant lang="EN">\n<us-bibliographic-data-grant>\n'
+        "<publication-reference>\n<document-id>\n"
+        f"<doc-number>{number}</doc-number>\n"
+        "</document-id>\n</publication-reference>\n"
+        '</us-bibliographic-data-grant>\n<description id="description">\n'
+        f"{body}{EXAMPLES if examples else ''}</description>\n</us-patent-grant>\n"
+    )
+
+
+def fake_classify(records, executor=None):
+    """Tense from the text, so the test needs neither NLTK data nor workers."""
+    return [
+        record._replace(tense="present" if " is " in record.content else "past")
+        for record in records
+    ]
+
+
+def labels(rows):
+    return pd.DataFrame(
+        rows, columns=["patentnumber", "prophetic", "nonprophetic"]
+    ).set_index("patentnumber")
+
+
+def test_score_counts_the_overlap_per_patent():
+    predicted = pd.DataFrame(
+        {"past": [1, 1], "present": [1, 1], "unknown": [0, 2]},
+        index=["10000001", "10000002"],
+    )
+    metrics = score(
+        predicted,
+        labels([("10000001", 1, 1), ("10000002", 2, 0), ("10000003", 0, 0)]),
+    )
+
+    assert metrics["present"]["correct"] == 2
+    assert metrics["present"]["precision"] == 1.0
+    assert metrics["present"]["recall"] == pytest.approx(2 / 3)
+    assert metrics["past"]["precision"] == 0.5
+    assert metrics["past"]["recall"] == 1.0
+    assert metrics["past"]["f1"] == pytest.approx(2 / 3)
+    assert metrics["patents_scored"] == 3
+    assert metrics["unknown_examples"] == 2
+    # The unpredicted patent with no labelled examples matches exactly
+    assert metrics["exact_match"] == pytest.approx(2 / 3)
+
+
+def test_score_without_predictions_or_labels():
+    nothing = pd.DataFrame(columns=["past", "present", "unknown"])
+    metrics = score(nothing, labels([("10000001", 0, 2)]))
+    assert metrics["past"]["precision"] is None
+    assert metrics["past"]["recall"] == 0.0 and metrics["past"]["f1"] is None
+    assert metrics["present"]["recall"] is None
+    assert score(nothing, labels([]))["exact_match"] is None
+
+
+def test_evaluation_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(evaluate_classifier, "classify_examples", fake_classify)
+    freilich_calls = []
+
+    def load_freilich(year, path, columns):
+        freilich_calls.append((year, path, columns))
+        # 10000009 is not in the corpus and is left out of the scores
+        return labels(
+            [(10000001, 1, 1), (10000002, 2, 0), (10000003, 0, 0), (10000009, 5, 5)]
+        ).reset_index()
+
+    monkeypatch.setattr(evaluate_classifier, "load_freilich", load_freilich)
+    corpus_path = str(tmp_path / "test_dataset_2020.corpus")
+    with CorpusWriter(corpus_path, metadata={"year": 2020}) as writer:
+        for number in ("10000001", "10000002"):
+            writer.add(number, document(number))
+        writer.add("10000003", document("10000003", examples=False))
+    output = str(tmp_path / "report.json")
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["evaluate_classifier.py", "--corpus", corpus_path, "--workers", "1"]
+        + ["--freilich-path", "labels.xlsb", "--output", output],
+    )
+
+    evaluate_classifier.main()
+
+    with open(output) as f:
+        report = json.load(f)
+    assert freilich_calls == [
+        (2020, "labels.xlsb", ["patentnumber", "prophetic", "nonprophetic"])
+    ]
+    assert report["year"] == 2020 and report["workers"] == 1
+    assert report["counts"]["documents"] == 3
+    assert report["counts"]["patents_with_examples"] == 2
+    assert report["counts"]["examples"] == 4
+    assert sum(report["counts"]["rejected"].values()) == 1
+    accuracy = report["accuracy"]
+    assert accuracy["patents_scored"] == 3
+    assert (accuracy["present"]["predicted"], accuracy["present"]["labelled"]) == (2, 3)
+    assert accuracy["exact_match"] == pytest.approx(2 / 3)
+    assert report["throughput"]["patents_per_second"] > 0
+    assert set(report["peak_rss_mb"]) == {"self", "children"}
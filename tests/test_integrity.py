@@ -0,0 +1,77 @@
+import hashlib
+import os
+import zipfile
+
+import pytest
+
+from utilities.integrity import (
+    IntegrityError,
+    VerificationManifest,
+    extract_zip_verified,
+    file_sha256,
+    verify_directory,
+    write_stream,
+)
+
+
+def test_write_stream(tmp_path):
+    path = str(tmp_path / "ipg200107.zip")
+    result = write_stream([b"abc", b"", b"def"], path, expected_size=6)
+    assert result.size == 6
+    assert result.sha256 == hashlib.sha256(b"abcdef").hexdigest()
+    assert result.sha256 == file_sha256(path)
+    assert os.listdir(tmp_path) == ["ipg200107.zip"]
+
+
+def test_write_stream_rejects_a_truncated_transfer(tmp_path):
+    path = str(tmp_path / "ipg200107.zip")
+    with pytest.raises(IntegrityError, match="received 3 of 6 bytes"):
+        write_stream([b"abc"], path, expected_size=6)
+    assert os.listdir(tmp_path) == []
+
+
+def test_write_stream_removes_the_part_file_when_interrupted(tmp_path):
+    def chunks():
+        yield b"abc"
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        write_stream(chunks(), str(tmp_path / "ipg200107.zip"))
+    assert os.listdir(tmp_path) == []
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, "w") as zip_file:
+        for name, data in members.items():
+            zip_file.writestr(name, data)
+
+
+def test_extract_zip_verified(tmp_path):
+    zip_path = str(tmp_path / "ipg200107.zip")
+    make_zip(zip_path, {"ipg200107.xml": "<xml/>"})
+    unzip_path = tmp_path / "out"
+    assert extract_zip_verified(zip_path, str(unzip_path)) == ["ipg200107.xml"]
+    assert (unzip_path / "ipg200107.xml").read_text() == "<xml/>"
+
+
+def test_extract_zip_verified_refuses_unsafe_paths(tmp_path):
+    zip_path = str(tmp_path / "evil.zip")
+    make_zip(zip_path, {"../outside.xml": "<xml/>"})
+    with pytest.raises(zipfile.BadZipFile):
+        extract_zip_verified(zip_path, str(tmp_path / "out"))
+    assert not (tmp_path / "outside.xml").exists()
+
+
+def test_verify_directory_records_corrupt_files(tmp_path):
+    make_zip(str(tmp_path / "good.zip"), {"a.xml": "<xml/>" * 100})
+    make_zip(str(tmp_path / "bad.zip"), {"b.xml": "<xml/>" * 100})
+    data = bytearray((tmp_path / "bad.zip").read_bytes())
+    data[40] ^= 0xFF  # inside the stored member
+    (tmp_path / "bad.zip").write_bytes(bytes(data))
+
+    failed = verify_directory(str(tmp_path), max_workers=2)
+    assert list(failed) == ["bad.zip"]
+    manifest = VerificationManifest(str(tmp_path))
+    assert manifest.is_verified("good.zip")
+    assert not manifest.is_verified("bad.zip")
+    assert not manifest.is_downloaded("bad.zip")
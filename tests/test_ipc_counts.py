@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from utilities.utils import IPC_BY_SECTOR, count_ipc_examples
+
+
+def document(number, section, examples):
+    heading = '<heading id="h1" level="1">EXAMPLES</heading>\n' if examples else ""
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<us-patent-grant lang="EN">\n<us-bibliographic-data-grant>\n'
+        f"<publication-reference>\n<document-id>\n<doc-number>{number}</doc-number>\n"
+        "</document-id>\n</publication-reference>\n"
+        "<classifications-ipcr>\n<classification-ipcr>\n"
+        f"<section>{section}</section>\n<class>61</class>\n"
+        "</classification-ipcr>\n</classifications-ipcr>\n"
+        '</us-bibliographic-data-grant>\n<description id="description">\n'
+        f"{heading}</description>\n</us-patent-grant>\n"
+    )
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for week in range(4):
+        (tmp_path / f"ipg2001{week:02d}.xml").write_text(
+            document(f"{week}1", "A", True) + document(f"{week}2", "C", False)
+        )
+    return str(tmp_path)
+
+
+def test_count_ipc_examples(folder):
+    totals, documents = count_ipc_examples(folder, IPC_BY_SECTOR, max_workers=2)
+    assert documents == 8
+    assert totals == {("A", "with_examples"): 4, ("C", "without_examples"): 4}
+
+
+def test_count_ipc_examples_stops_after_the_current_file(folder):
+    stop_event = threading.Event()
+
+    def callback(message):
+        if message.startswith("Processed"):
+            stop_event.set()
+
+    totals, documents = count_ipc_examples(
+        folder,
+        IPC_BY_SECTOR,
+        max_workers=1,
+        callback=callback,
+        stop_event=stop_event,
+    )
+    assert documents == 2
+    assert sum(totals.values()) == 2
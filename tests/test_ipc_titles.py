@@ -0,0 +1,104 @@
+import os
+import pickle
+
+import pytest
+
+from utilities import ipc_titles as ipc_titles_module
+from utilities.ipc_titles import IPCTitles, load_ipc_titles, normalize_ipc_code
+
+SECTION_A = """﻿code\ttitle
+A\tHUMAN NECESSITIES
+A01\tAGRICULTURE; FORESTRY
+A01B\tSOIL WORKING IN AGRICULTURE OR FORESTRY
+A01B0001000000\tHand tools
+A01B0001020000\tSpades; Shovels
+"""
+SECTION_C = "C\tCHEMISTRY; METALLURGY\nC07\tORGANIC CHEMISTRY\n"
+
+
+@pytest.fixture
+def ipc_path(tmp_path):
+    path = tmp_path / "EN_ipc_title_list_20250101"
+    path.mkdir()
+    (path / "EN_ipc_section_A_title_list_20250101.txt").write_text(SECTION_A)
+    (path / "EN_ipc_section_C_title_list_20250101.txt").write_text(SECTION_C)
+    (path / "readme.md").write_text("not a title list")
+    return str(path)
+
+
+def test_normalize_ipc_code():
+    assert normalize_ipc_code("a01b 1/02") == "A01B0001020000"
+    assert normalize_ipc_code("A61K 9/2013") == "A61K0009201300"
+    assert normalize_ipc_code(" c07 ") == "C07"
+
+
+def test_lookup(ipc_path):
+    titles = IPCTitles(ipc_path).load()
+    assert len(titles) == 7
+    assert titles["A01"] == "AGRICULTURE; FORESTRY"
+    assert titles.get("a01b 1/02") == "Spades; Shovels"
+    assert "C07" in titles and "code" not in titles
+    assert titles.hierarchy("A01B 1/02") == [
+        ("A", "HUMAN NECESSITIES"),
+        ("A01", "AGRICULTURE; FORESTRY"),
+        ("A01B", "SOIL WORKING IN AGRICULTURE OR FORESTRY"),
+        ("A01B0001020000", "Spades; Shovels"),
+    ]
+    assert titles.by_section(max_length=3) == {
+        "A": {"A": "HUMAN NECESSITIES", "A01": "AGRICULTURE; FORESTRY"},
+        "C": {"C": "CHEMISTRY; METALLURGY", "C07": "ORGANIC CHEMISTRY"},
+    }
+
+
+def test_missing_codes_fall_back(ipc_path):
+    titles = IPCTitles(ipc_path)
+    assert titles.get("H99") is None
+    assert titles.get("H99", "unknown") == "unknown"
+    with pytest.raises(KeyError):
+        titles["A99"]
+    # Levels the lists don't have are left out of the hierarchy
+    assert titles.hierarchy("A01C 5/00") == [
+        ("A", "HUMAN NECESSITIES"),
+        ("A01", "AGRICULTURE; FORESTRY"),
+    ]
+
+
+def test_cache_file(ipc_path, monkeypatch):
+    titles = IPCTitles(ipc_path).load()
+    assert os.path.exists(ipc_path + ".cache.db")
+
+    def parse(path):
+        raise AssertionError("title lists parsed again")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ipc_titles_module, "parse_title_file", parse)
+        assert IPCTitles(ipc_path).titles == titles.titles
+
+    # A changed list rebuilds the cache
+    with open(
+        os.path.join(ipc_path, "EN_ipc_section_C_title_list_20250101.txt"), "a"
+    ) as f:
+        f.write("C08\tORGANIC MACROMOLECULAR COMPOUNDS\n")
+    assert IPCTitles(ipc_path).get("C08") == "ORGANIC MACROMOLECULAR COMPOUNDS"
+
+    # Without the lists the cache is used as it is
+    cache_path = os.path.join(os.path.dirname(ipc_path), "titles.cache.db")
+    IPCTitles(ipc_path, cache_path).load()
+    missing = os.path.join(os.path.dirname(ipc_path), "missing")
+    assert IPCTitles(missing, cache_path).get("C08") is not None
+    with pytest.raises(FileNotFoundError):
+        IPCTitles(missing).load()
+
+
+def test_pickles_as_paths(ipc_path):
+    titles = IPCTitles(ipc_path).load()
+    copy = pickle.loads(pickle.dumps(titles))
+    assert copy._titles is None
+    assert copy.get("C") == "CHEMISTRY; METALLURGY"
+
+
+def test_load_ipc_titles_is_shared(ipc_path, monkeypatch):
+    monkeypatch.setattr(ipc_titles_module, "_loaded", {})
+    titles = load_ipc_titles(ipc_path)
+    assert titles._titles is not None
+    assert load_ipc_titles(ipc_path + "/") is titles
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
+from utilities import memory
+from utilities.memory import MemoryGovernor, format_bytes, parse_memory_size
+
+
+@pytest.mark.parametrize(
+    "text, size",
+    [
+        ("8G", 8 * 1024**3),
+        ("512M", 512 * 1024**2),
+        ("512mb", 512 * 1024**2),
+        ("1.5GiB", int(1.5 * 1024**3)),
+        ("2 T", 2 * 1024**4),
+        ("64K", 64 * 1024),
+        ("1000", 1000),
+    ],
+)
+def test_parse_memory_size(text, size):
+    assert parse_memory_size(text) == size
+
+
+@pytest.mark.parametrize("text", ["", "8X", "G", "-1G", "0", "eight"])
+def test_parse_memory_size_rejects(text):
+    with pytest.raises(ValueError):
+        parse_memory_size(text)
+
+
+def test_format_bytes():
+    assert format_bytes(512) == "512 B"
+    assert format_bytes(1536) == "1.5 KB"
+    assert format_bytes(8 * 1024**3) == "8.0 GB"
+
+
+@pytest.fixture
+def no_rss(monkeypatch):
+    """Count only in-flight bytes, so pressure is under the test's control."""
+    monkeypatch.setattr(memory, "process_tree_rss", lambda pid=None: None)
+
+
+def test_process_tree_rss_measures_this_process():
+    assert memory.process_tree_rss() > 1024**2
+    # A process that doesn't exist can't be measured
+    assert memory.process_tree_rss(2**22 + 1) is None
+
+
+def test_batch_size_shrinks_with_pressure(no_rss):
+    governor = MemoryGovernor(1000)
+    assert governor.batch_size(100) == 100
+    governor.acquire(800)
+    assert governor.batch_size(100) == 50
+    governor.acquire(150)
+    assert governor.batch_size(100) == 25
+    assert governor.batch_size(2) == 1
+    governor.release(950)
+    assert governor.batch_size(100) == 100
+    assert governor.metrics["batch_cuts"] == 2
+    assert governor.metrics["peak_in_flight"] == 950
+
+
+def test_wait_admits_when_nothing_in_flight(no_rss):
+    governor = MemoryGovernor(1000)
+    governor.acquire(2000)
+    # Waiting can't free anything when the caller says nothing is busy
+    governor.wait("files", busy=lambda: False)
+    assert governor.metrics["throttles"] == 0
+
+
+def test_wait_async_resumes_when_memory_is_released(no_rss):
+    messages = []
+    governor = MemoryGovernor(1000, callback=messages.append)
+    governor.acquire(950)
+
+    async def release_later():
+        await asyncio.sleep(0.3)
+        governor.release(950)
+
+    async def main():
+        started = time.monotonic()
+        await asyncio.gather(governor.wait_async("documents"), release_later())
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.3
+    assert messages[0].startswith("Memory budget: RSS can't be measured")
+    assert messages[1].startswith("Memory budget: throttling documents")
+    assert messages[2].startswith("Memory budget: resumed documents after")
+    assert governor.throttled_seconds() >= 0.3
+
+
+def test_wait_returns_on_stop(no_rss):
+    class Stopped:
+        def is_set(self):
+            return True
+
+    governor = MemoryGovernor(1000)
+    governor.acquire(2000)
+    governor.wait("files", stop_event=Stopped())
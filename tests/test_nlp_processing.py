@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utilities import nlp_processing
+from utilities.nlp_processing import (
+    TIER_EMPTY,
+    TIER_LEXICAL,
+    TIER_TAGGER,
+    analyze_sentence_tense,
+    classify_examples,
+    get_tier_counts,
+)
+from utilities.records import ExampleRecord
+
+
+def fake_tagger(monkeypatch, tag):
+    """Tag every whitespace token with ``tag`` instead of loading NLTK data."""
+    calls = []
+
+    def pos_tag(tokens):
+        calls.append(tokens)
+        return [(token, tag) for token in tokens]
+
+    monkeypatch.setattr(nlp_processing, "word_tokenize", str.split)
+    monkeypatch.setattr(nlp_processing, "pos_tag", pos_tag)
+    return calls
+
+
+@pytest.fixture
+def no_tagger(monkeypatch):
+    def tag(text):
+        raise AssertionError(f"tagger called for {text!r}")
+
+    monkeypatch.setattr(nlp_processing, "_tag_sentence_tense", tag)
+
+
+def test_words_containing_was_are_not_past_auxiliaries(monkeypatch):
+    calls = fake_tagger(monkeypatch, "VBZ")
+    for text in ("The precipitate washed out", "The answer is clear"):
+        result = analyze_sentence_tense(text)
+        assert (result["tense"], result["resolved_by"]) == ("present", TIER_TAGGER)
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "The mixture was stirred overnight.",
+        "Prepared from compound 3 and sodium hydride.",
+        "Mixed with water, the solid dissolves.",
+        "The title compound is made according to Example 1.",
+        "The salt is obtained as described above.",
+    ],
+)
+def test_lexical_tier_resolves_without_the_tagger(no_tagger, text):
+    result = analyze_sentence_tense(text)
+    assert (result["tense"], result["resolved_by"]) == ("past", TIER_LEXICAL)
+
+
+def test_empty_text(no_tagger):
+    result = analyze_sentence_tense(" \n\t")
+    assert (result["tense"], result["why_unknown"]) == ("unknown", "empty_text")
+    assert result["resolved_by"] == TIER_EMPTY
+
+
+def test_classify_examples_tallies_each_tier(monkeypatch):
+    fake_tagger(monkeypatch, "VBZ")
+    monkeypatch.setattr(nlp_processing, "tier_counts", nlp_processing.Counter())
+    records = [
+        ExampleRecord("7000001", "1", "", text)
+        for text in (
+            "The solid was dried.",
+            "",
+            "The salt dissolves.",
+            "Heated to reflux.",
+        )
+    ]
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        classified = classify_examples(records, executor, chunk_size=3)
+        # Counts accumulate across calls
+        classify_examples(records[:1], executor)
+
+    assert [record.tense for record in classified] == [
+        "past",
+        "unknown",
+        "present",
+        "past",
+    ]
+    assert get_tier_counts() == {TIER_LEXICAL: 3, TIER_EMPTY: 1, TIER_TAGGER: 1}
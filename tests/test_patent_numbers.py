@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.test_dataset_utils import clean_patent_number
+from utilities.utils_clean import normalize_patent_numbers
+
+
+def test_normalize_patent_numbers():
+    values = pd.Series(
+        [7654321, 7654321.0, "7654321.0", "US 7,654,321", " 123 ", "RE", None, np.nan],
+        index=list("abcdefgh"),
+    )
+    numbers = normalize_patent_numbers(values)
+    assert numbers.dtype == "int64"
+    assert numbers.index.tolist() == list("abcdefgh")
+    assert numbers.tolist() == [7654321, 7654321, 7654321, 7654321, 123, 0, 0, 0]
+
+
+def test_normalize_patent_numbers_of_a_list():
+    assert normalize_patent_numbers(["123", 5]).tolist() == [123, 5]
+    assert normalize_patent_numbers([]).tolist() == []
+
+
+NON_UTILITY = ["D123", "RE123", "US RE12,3", "USD123", "PP 123", "H123", "t123"]
+
+
+def test_non_utility_numbers_do_not_collide_with_utility_numbers():
+    numbers = normalize_patent_numbers(NON_UTILITY + ["US123", "123"])
+    assert numbers.tolist() == [0] * len(NON_UTILITY) + [123, 123]
+
+
+@pytest.mark.parametrize(
+    "value",
+    [7654321, 7654321.9, "7654321.0", "US 7,654,321", " 123 ", "RE", None, np.nan]
+    + NON_UTILITY,
+)
+def test_clean_patent_number_matches_normalize_patent_numbers(value):
+    expected = normalize_patent_numbers([value]).iloc[0]
+    assert clean_patent_number(value) == expected
+    assert type(clean_patent_number(value)) is int
+
+
+def test_clean_patent_number():
+    assert clean_patent_number("US 7,654,321") == 7654321
+    assert clean_patent_number(7654321.9) == 7654321
+    assert clean_patent_number(None) == 0
+    assert clean_patent_number("D123") == 0
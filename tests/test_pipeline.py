@@ -0,0 +1,128 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from utilities import pipeline as pipeline_module
+from utilities.patent_processor import PatentProcessor
+from utilities.pipeline import IngestionPipeline
+
+EXAMPLES = """<heading id="h1" level="1">EXAMPLES</heading>
+<heading id="h2" level="2">Example 1</heading>
+<heading id="h3" level="2">Preparation of compound A</heading>
+<p id="p1">The mixture was heated to 50 C and stirred.</p>
+<heading id="h4" level="2">Example 2</heading>
+<heading id="h5" level="2">Prophetic formulation</heading>
+<p id="p2">A tablet is prepared by mixing the compound with lactose.</p>
+"""
+
+
+def document(number, section="C", examples=True, filler=3000):
+    body = '<p id="f">' + "lorem ipsum " * (filler // 12) + "</p>\n"
+    if examples:
+        body += EXAMPLES
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<!DOCTYPE us-patent-grant SYSTEM "x.dtd" [ ]>\n'
+        '<us-patent-grant lang="EN">\n<us-bibliographic-data-grant>\n'
+        "<publication-reference>\n<document-id>\n<country>US</country>\n"
+        f"<doc-number>{number:08d}</doc-number>\n<kind>B2</kind>\n"
+        "<date>20200107</date>\n</document-id>\n</publication-reference>\n"
+        "<classifications-ipcr>\n<classification-ipcr>\n"
+        f"<section>{section}</section>\n<class>07</class>\n<subclass>D</subclass>\n"
+        "</classification-ipcr>\n</classifications-ipcr>\n"
+        '</us-bibliographic-data-grant>\n<description id="description">\n'
+        f"{body}</description>\n</us-patent-grant>\n"
+    )
+
+
+def fake_classify(records, executor=None):
+    """Tense from the text, so the test needs neither NLTK data nor workers."""
+    return [
+        record._replace(tense="present" if " is " in record.content else "past")
+        for record in records
+    ]
+
+
+@pytest.fixture
+def folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_module, "classify_examples", fake_classify)
+    folder = tmp_path / "xml"
+    folder.mkdir()
+    # Per file: 4 with examples, 2 without, 1 too short and a duplicate
+    for week, start in enumerate((10000000, 10001000)):
+        documents = [document(start + i, section="AB"[i % 2]) for i in range(4)]
+        documents += [document(start + 4 + i, examples=False) for i in range(2)]
+        documents.append(document(start + 6, filler=0))
+        documents.append(document(start))
+        (folder / f"ipg2001{week:02d}.xml").write_text("".join(documents))
+    return folder
+
+
+def run_pipeline(folder, db_path, **kwargs):
+    processor = PatentProcessor(max_workers=1)
+    pipeline = IngestionPipeline(
+        str(folder),
+        processor,
+        max_workers=2,
+        db_path=db_path,
+        classify_workers=1,
+        **kwargs,
+    )
+    try:
+        stored = asyncio.run(pipeline.run())
+    finally:
+        processor.shutdown()
+    return pipeline, stored
+
+
+def test_pipeline_stores_examples_statistics_and_census(folder, tmp_path):
+    db_path = str(tmp_path / "patents.db")
+    pipeline, stored = run_pipeline(folder, db_path, classify_batch_size=3)
+
+    assert stored == pipeline.grand_total == 8
+    assert pipeline.census["documents"] == 16
+    assert pipeline.census["duplicates"] == 2
+    assert pipeline.census["with_examples"] == 8
+    assert pipeline.census["no_examples"] == 4
+    assert pipeline.census["too_short"] == 2
+    assert pipeline.census["failed"] == 0
+
+    with sqlite3.connect(db_path) as conn:
+        examples = conn.execute(
+            "SELECT patent_number, example_name, tense FROM patent_examples "
+            "WHERE patent_number = '10000000' ORDER BY example_name"
+        ).fetchall()
+        statistics = conn.execute(
+            "SELECT COUNT(*), SUM(prophetic), SUM(nonprophetic), SUM(some_prophetic),"
+            " MIN(year), MAX(year) FROM patent_statistics"
+        ).fetchone()
+        census = conn.execute(
+            "SELECT file_name, documents, with_examples FROM patent_census "
+            "ORDER BY file_name"
+        ).fetchall()
+        ipc = conn.execute(
+            "SELECT COUNT(DISTINCT patent_number) FROM patent_ipc"
+        ).fetchone()[0]
+
+    assert examples == [
+        ("10000000", "Example 1", "past"),
+        ("10000000", "Example 2", "present"),
+    ]
+    assert statistics == (8, 8, 8, 8, 2020, 2020)
+    assert census == [("ipg200100.xml", 8, 4), ("ipg200101.xml", 8, 4)]
+    assert ipc == 14
+
+
+def test_pipeline_sizes_classification_from_max_workers(tmp_path):
+    processor = PatentProcessor(max_workers=3)
+    try:
+        pipeline = IngestionPipeline(
+            str(tmp_path), processor, max_workers=5, classify_workers=2
+        )
+    finally:
+        processor.shutdown()
+    assert pipeline.num_splitters == 5
+    assert pipeline.num_extractors == 6
+    assert pipeline.num_classifiers == 5
+    assert pipeline.classify_workers == 2
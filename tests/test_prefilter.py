@@ -0,0 +1,62 @@
+import pytest
+
+from utilities.prefilter import (
+    MIN_DOCUMENT_LENGTH,
+    REJECT_NO_EXAMPLE_SECTION,
+    REJECT_SEQUENCE_LISTING,
+    REJECT_TOO_SHORT,
+    classify_document,
+    has_examples_heading,
+    has_sequence_listing,
+)
+
+FILLER = "<p>" + "lorem ipsum " * (MIN_DOCUMENT_LENGTH // 10) + "</p>"
+HEADING = '<heading id="h1" level="1">EXAMPLES</heading>'
+SEQUENCE = "<s1>ACGT</s1>"
+
+
+@pytest.mark.parametrize(
+    "document, expected",
+    [
+        (HEADING, REJECT_TOO_SHORT),
+        (FILLER, REJECT_NO_EXAMPLE_SECTION),
+        (FILLER + HEADING, None),
+        (FILLER + "examples" + FILLER, None),
+        (FILLER + SEQUENCE + HEADING, REJECT_SEQUENCE_LISTING),
+        (FILLER + HEADING + SEQUENCE, REJECT_SEQUENCE_LISTING),
+        (FILLER + HEADING + '<sequence-cwu id="SEQLST-0">', REJECT_SEQUENCE_LISTING),
+        ("<!DOCTYPE sequence-cwu>" + FILLER + HEADING, REJECT_SEQUENCE_LISTING),
+    ],
+)
+def test_classify_document(document, expected):
+    assert classify_document(document) == expected
+    assert classify_document(document.encode()) == expected
+
+
+def test_classify_document_inside_a_buffer():
+    document = FILLER + HEADING
+    buffer = (SEQUENCE + document + SEQUENCE).encode()
+    start = len(SEQUENCE)
+    assert classify_document(buffer, start, start + len(document)) is None
+    assert classify_document(memoryview(buffer), start, start + 10) == REJECT_TOO_SHORT
+
+
+@pytest.mark.parametrize(
+    "heading, expected",
+    [
+        (HEADING, True),
+        ('<heading id="h1">Experiments</heading>', True),
+        ('<heading id="h1"> <b>Tests</b> </heading>', True),
+        ('<heading id="h1">Comparative examples</heading>', False),
+        ("<p>EXAMPLES</p>", False),
+    ],
+)
+def test_has_examples_heading(heading, expected):
+    assert has_examples_heading(FILLER + heading) is expected
+    assert has_examples_heading((FILLER + heading).encode()) is expected
+
+
+def test_has_sequence_listing_window():
+    document = FILLER + SEQUENCE
+    assert has_sequence_listing(document)
+    assert not has_sequence_listing(document, endpos=len(FILLER))
@@ -0,0 +1,75 @@
+import pytest
+
+from utilities import progress as progress_module
+from utilities.progress import (
+    ProgressEvent,
+    ProgressReporter,
+    format_seconds,
+    make_reporter,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(progress_module.time, "monotonic", clock)
+    return clock
+
+
+def test_updates_are_throttled_per_stage(clock):
+    events = []
+    reporter = ProgressReporter(events.append, update_interval=1.0, scope=2020)
+
+    reporter.update("extract", advance=1, total=10, unit="docs")
+    reporter.update("extract", advance=1)
+    reporter.update("store", advance=5, unit="patents")
+    clock.now += 0.5
+    reporter.update("extract", advance=1)
+    assert [(event.stage, event.done) for event in events] == [
+        ("extract", 1),
+        ("store", 5),
+    ]
+
+    clock.now += 1.5
+    reporter.update("extract", advance=1, file="ipg200107.xml")
+    assert events[-1] == ProgressEvent(
+        "extract", 4, 10, "docs", "ipg200107.xml", 2.0, 3.0, False, 2020
+    )
+
+
+def test_finish_always_emits_and_forgets_the_stage(clock):
+    events = []
+    reporter = ProgressReporter(events.append, update_interval=1.0)
+    reporter.update("files", done=1, total=3)
+    reporter.update("files", done=3)
+    reporter.finish("files")
+    reporter.finish("files")
+    assert [(event.done, event.finished) for event in events] == [
+        (1, False),
+        (3, True),
+    ]
+    # Too early for a rate, so no ETA either
+    assert events[-1].rate is None and events[-1].eta is None
+
+
+def test_event_format():
+    event = ProgressEvent("extract", 1200, 5000, "docs", "f.xml", 350.0, 11.0)
+    assert event.format() == "extract: 1200/5000 docs (350.0/s, ETA 0:00:11) - f.xml"
+    assert ProgressEvent("store", 3, scope=2020).format() == "2020 store: 3 items"
+    assert format_seconds(3725) == "1:02:05"
+
+
+def test_make_reporter():
+    assert make_reporter(None) is None
+    reporter = ProgressReporter(print)
+    assert make_reporter(reporter) is reporter
+    wrapped = make_reporter(print, update_interval=2, scope="2021")
+    assert (wrapped.sink, wrapped.update_interval, wrapped.scope) == (print, 2, "2021")
@@ -0,0 +1,189 @@
+import sqlite3
+import threading
+
+import pandas as pd
+import pytest
+
+from utilities import reclassify as reclassify_module
+from utilities.cancellation import executors
+from utilities.database_utils import (
+    statistics_frame,
+    store_patent_examples,
+    store_patent_statistics,
+)
+from utilities.nlp_processing import aggregate_tense_statistics, tense_statistics
+from utilities.records import ExampleRecord
+from utilities.reclassify import (
+    PROGRESS_TABLE,
+    rebuild_statistics,
+    reclassify,
+    reclassify_database,
+)
+
+PATENTS = ["5000000", "9000000", "10000000", "10999999", "D123456"]
+
+
+def fake_classify(records, executor=None):
+    """Tense from the text, so the test needs neither NLTK data nor workers."""
+    return [
+        record._replace(tense="present" if "will" in record.content else "past")
+        for record in records
+    ]
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(reclassify_module, "classify_examples", fake_classify)
+    path = str(tmp_path / "patents.db")
+    records = [
+        ExampleRecord(number, str(i), "", text, tense="unknown")
+        for number in PATENTS
+        for i, text in enumerate(["The mixture was heated.", "The mixture will be"])
+    ]
+    store_patent_examples(records, path)
+    store_patent_statistics(tense_statistics(records), db_path=path, year=2020)
+    return path
+
+
+def tenses(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return dict(
+            conn.execute(
+                "SELECT patent_number, GROUP_CONCAT(tense) FROM patent_examples "
+                "GROUP BY patent_number"
+            ).fetchall()
+        )
+
+
+def test_reclassify_updates_tenses_and_statistics(db_path):
+    assert reclassify_database(db_path, chunk_size=3) == 2 * len(PATENTS)
+    assert set(tenses(db_path).values()) == {"past,present"}
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT prophetic, nonprophetic, unknown, some_prophetic "
+            "FROM patent_statistics"
+        ).fetchall()
+        watermarks = conn.execute(f"SELECT * FROM {PROGRESS_TABLE}").fetchall()
+    assert set(rows) == {(1, 1, 0, 1)}
+    assert watermarks == []
+
+
+@pytest.mark.parametrize(
+    "patent_range, expected",
+    [
+        (("9000000", "10999999"), {"9000000", "10000000", "10999999"}),
+        (("1000000", "2000000"), set()),
+        ((5000000, 5000000), {"5000000"}),
+    ],
+)
+def test_patent_range_compares_numbers(db_path, patent_range, expected):
+    reclassify_database(db_path, patent_range=patent_range)
+    changed = {
+        number
+        for number, tense in tenses(db_path).items()
+        if tense != "unknown,unknown"
+    }
+    assert changed == expected
+
+
+def test_stop_keeps_watermark_and_resume(db_path):
+    stop_event = threading.Event()
+    messages = []
+
+    def stop_after_first_chunk(message):
+        messages.append(message)
+        if message.startswith("Reclassified"):
+            stop_event.set()
+
+    first = reclassify_database(
+        db_path, chunk_size=4, callback=stop_after_first_chunk, stop_event=stop_event
+    )
+    assert first == 4
+    with sqlite3.connect(db_path) as conn:
+        (watermark,) = conn.execute(
+            f"SELECT last_rowid FROM {PROGRESS_TABLE}"
+        ).fetchone()
+    assert watermark == 4
+
+    messages.clear()
+    rest = reclassify_database(db_path, chunk_size=4, callback=messages.append)
+    assert rest == 2 * len(PATENTS) - 4
+    assert messages[0] == f"Resuming {db_path} after row 4"
+
+
+def test_restart_ignores_watermark(db_path):
+    stop_event = threading.Event()
+    reclassify_database(
+        db_path,
+        chunk_size=4,
+        callback=lambda message: stop_event.set(),
+        stop_event=stop_event,
+    )
+    assert reclassify_database(db_path, chunk_size=4, restart=True) == 2 * len(PATENTS)
+
+
+def test_rebuild_statistics_matches_statistics_frame(tmp_path):
+    path = str(tmp_path / "patents.db")
+    examples = pd.DataFrame(
+        [
+            ("1", "present", 1),
+            ("1", "present", 0),
+            ("2", "past", None),
+            ("2", None, 1),
+            ("2", "present", 0),
+            ("3", "unknown", 0),
+            ("4", "past", 0),
+        ],
+        columns=["patent_number", "tense", "has_mixed"],
+    )
+    store_patent_examples(
+        [
+            ExampleRecord(number, str(i), "", "text", tense=tense or "")
+            for i, (number, tense, _) in enumerate(examples.values)
+        ],
+        path,
+    )
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "UPDATE patent_examples SET tense = ?, has_mixed = ? WHERE id = ?",
+            [
+                (tense, mixed, i + 1)
+                for i, (_, tense, mixed) in enumerate(examples.values)
+            ],
+        )
+    store_patent_statistics(
+        {n: {"past": 0, "present": 0, "unknown": 0} for n in "1234"}, path, 2020
+    )
+
+    assert rebuild_statistics(path) == 4
+    expected = statistics_frame(aggregate_tense_statistics(examples))
+    with sqlite3.connect(path) as conn:
+        rebuilt = pd.read_sql(
+            "SELECT patent_number, nonprophetic AS past, prophetic AS present, "
+            "unknown, mixed_tense_percentage, all_prophetic, some_prophetic, "
+            "no_prophetic, year FROM patent_statistics ORDER BY patent_number",
+            conn,
+            index_col="patent_number",
+        )
+    assert rebuilt.pop("year").tolist() == [2020] * 4
+    pd.testing.assert_frame_equal(rebuilt, expected.sort_index(), check_names=False)
+
+
+def test_years_filter_without_statistics_table(tmp_path):
+    path = str(tmp_path / "patents.db")
+    store_patent_examples([ExampleRecord("1", "1", "", "It was heated.")], path)
+    assert reclassify_database(path, years=[2020]) == 0
+    assert rebuild_statistics(path, years=[2020]) == 0
+
+
+def test_reclassify_releases_its_executor_on_error(db_path, monkeypatch):
+    used = []
+
+    def fail(*args, executor=None, **kwargs):
+        used.append(executor)  # keep it alive; the registry only holds it weakly
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(reclassify_module, "reclassify_database", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        reclassify(db_path, max_workers=1)
+    assert used and len(executors) == 0
@@ -0,0 +1,46 @@
+from utilities.records import ExampleRecord, example_record, records_from_dict
+
+
+def test_example_record_joins_paragraphs_with_spaces():
+    record = example_record(
+        "123",
+        {
+            "number": 1,
+            "title": "Synthesis",
+            "content": ["It was mixed.", "Then dried."],
+        },
+    )
+    assert record == ExampleRecord("123", "1", "Synthesis", "It was mixed. Then dried.")
+    assert record.full_text == "Synthesis.It was mixed. Then dried."
+
+
+def test_example_record_keeps_tense_fields():
+    record = example_record(
+        "123",
+        {
+            "number": "2",
+            "content": "It is mixed.",
+            "tense": "present",
+            "breakdown_str": "present: 1",
+            "past_percentage": None,
+            "has_mixed": True,
+        },
+    )
+    assert record.title == ""
+    assert record.full_text == "It is mixed."
+    assert record.tense == "present"
+    assert record.tense_breakdown == "present: 1"
+    assert record.past_percentage == 0.0
+    assert record.has_mixed is True
+
+
+def test_records_from_dict_flattens_and_skips_malformed_entries():
+    existing = ExampleRecord("456", "1", "", "It was heated.")
+    records = records_from_dict(
+        {
+            "123": [{"number": "1", "content": ["A."]}, "not an example"],
+            "456": [existing],
+            "789": "not a list",
+        }
+    )
+    assert records == [ExampleRecord("123", "1", "", "A."), existing]
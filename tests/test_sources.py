@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from utilities import sources as sources_module
+from utilities.sources import (
+    CachedListingSource,
+    HttpSource,
+    ListingEntry,
+    LocalDirectorySource,
+    PatentSource,
+    parse_listing,
+    split_revision,
+)
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    year_dir = tmp_path / "mirror" / "grant" / "redbook" / "fulltext" / "2020"
+    year_dir.mkdir(parents=True)
+    (year_dir / "ipg200107.zip").write_bytes(b"week one")
+    (year_dir / "ipg200114_r1.zip").write_bytes(b"week two, re-released")
+    (year_dir / "notes.zip").write_bytes(b"not a weekly file")
+    (year_dir / "README.txt").write_text("ignored")
+    return LocalDirectorySource(str(tmp_path / "mirror"))
+
+
+class StubSource(PatentSource):
+    """Returns canned listings and records the validators it was asked with."""
+
+    def __init__(self, *listings):
+        self.listings = list(listings)
+        self.calls = []
+
+    def list_entries(self, year, kind, validators=None):
+        self.calls.append(validators)
+        return self.listings.pop(0)
+
+
+ENTRY = ListingEntry("ipg200107.zip", "ipg200107", 0, "10", "")
+
+
+def test_split_revision():
+    assert split_revision("ipg200107.zip") == ("ipg200107", 0)
+    assert split_revision("/x/ipa200109_r2.zip") == ("ipa200109", 2)
+    assert split_revision("notes.zip") is None
+
+
+def test_local_directory_lists_weekly_zips(mirror):
+    entries, validators = mirror.list_entries(2020, "grant")
+    assert [(e.file_name, e.base_name, e.revision) for e in entries] == [
+        ("ipg200107.zip", "ipg200107", 0),
+        ("ipg200114_r1.zip", "ipg200114", 1),
+    ]
+    assert entries[0].size == "8"
+    assert mirror.list_files(2020, "grant") == ["ipg200107.zip", "ipg200114_r1.zip"]
+    # An unchanged directory answers "not modified"
+    assert mirror.list_entries(2020, "grant", validators) == (None, validators)
+
+
+def test_local_directory_layouts(tmp_path):
+    (tmp_path / "grant" / "2019").mkdir(parents=True)
+    (tmp_path / "2018").mkdir()
+    source = LocalDirectorySource(str(tmp_path))
+    assert source.year_dir(2019, "grant") == str(tmp_path / "grant" / "2019")
+    assert source.year_dir(2018, "grant") == str(tmp_path / "2018")
+    assert source.year_dir(2017, "grant") is None
+    assert source.list_entries(2017, "grant") == ([], {})
+
+
+def test_local_directory_fetch(mirror, tmp_path):
+    download_path = str(tmp_path / "downloads")
+    result = mirror.fetch(2020, "grant", "ipg200107.zip", download_path)
+    assert result.size == result.expected_size == 8
+    assert result.sha256 == hashlib.sha256(b"week one").hexdigest()
+    assert os.listdir(download_path) == ["ipg200107.zip"]
+
+
+def test_local_directory_fetch_of_missing_files(mirror, tmp_path):
+    download_path = str(tmp_path / "downloads")
+    with pytest.raises(FileNotFoundError):
+        mirror.fetch(2020, "grant", "ipg200121.zip", download_path)
+    with pytest.raises(FileNotFoundError, match="No grant 2021 directory"):
+        mirror.fetch(2021, "grant", "ipg210105.zip", download_path)
+    assert os.listdir(download_path) == []
+
+
+def test_cached_listing_is_reused_within_max_age(tmp_path):
+    stub = StubSource(([ENTRY], {"etag": "v1"}))
+    source = CachedListingSource(stub, str(tmp_path), max_age=3600)
+    assert source.list_entries(2020, "grant") == ([ENTRY], {"etag": "v1"})
+    assert source.list_entries(2020, "grant") == ([ENTRY], {"etag": "v1"})
+    # A second instance reads the persisted listing
+    again = CachedListingSource(stub, str(tmp_path), max_age=3600)
+    assert again.list_files(2020, "grant") == ["ipg200107.zip"]
+    assert stub.calls == [None]
+
+
+def test_cached_listing_keeps_entries_when_not_modified(tmp_path, monkeypatch):
+    stub = StubSource(([ENTRY], {"etag": "v1"}), (None, {"etag": "v1"}))
+    source = CachedListingSource(stub, str(tmp_path), max_age=60)
+    source.list_entries(2020, "grant")
+    with open(source.cache_path(2020, "grant")) as f:
+        checked_at = json.load(f)["checked_at"]
+
+    now = sources_module.time.time() + 120
+    monkeypatch.setattr(sources_module.time, "time", lambda: now)
+    assert source.list_entries(2020, "grant") == ([ENTRY], {"etag": "v1"})
+    assert stub.calls == [None, {"etag": "v1"}]
+    with open(source.cache_path(2020, "grant")) as f:
+        assert json.load(f)["checked_at"] == now > checked_at
+
+
+def test_cached_listing_refresh_and_corrupt_cache(tmp_path):
+    newer = ENTRY._replace(file_name="ipg200107_r1.zip", revision=1)
+    stub = StubSource(([ENTRY], {}), ([newer], {}), ([ENTRY], {}))
+    source = CachedListingSource(stub, str(tmp_path), max_age=None)
+    source.list_entries(2020, "grant")
+    source.refresh(2020, "grant")
+    assert source.list_entries(2020, "grant") == ([newer], {})
+
+    with open(source.cache_path(2020, "grant"), "w") as f:
+        f.write("{not json")
+    assert source.list_entries(2020, "grant") == ([ENTRY], {})
+    assert stub.calls == [None, None, None]
+
+
+def test_cached_listing_over_a_mirror(mirror, tmp_path):
+    source = CachedListingSource(mirror, str(tmp_path / "cache"))
+    first, validators = source.list_entries(2020, "grant")
+    assert [entry.file_name for entry in first] == [
+        "ipg200107.zip",
+        "ipg200114_r1.zip",
+    ]
+    # max_age=0 revalidates every time; the unchanged mirror keeps the cache
+    assert source.list_entries(2020, "grant") == (first, validators)
+
+
+def test_parse_listing():
+    html = b"""<html><body><table>
+    <tr><td><a href="ipg200107.zip">ipg200107.zip</a></td>
+        <td>2020-01-07 10:11</td><td>123M</td></tr>
+    <tr><td><a href="../">Parent</a></td></tr>
+    </table><pre><a href="ipg200114_r1.zip">ipg200114_r1.zip</a> 14-Jan-2020 09:00  98M
+<a href="other.zip">other.zip</a></pre></body></html>"""
+    assert parse_listing(html) == [
+        ListingEntry("ipg200107.zip", "ipg200107", 0, "123M", "2020-01-07 10:11"),
+        ListingEntry("ipg200114_r1.zip", "ipg200114", 1, "98M", "14-Jan-2020 09:00"),
+    ]
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise sources_module.requests.HTTPError(str(self.status_code))
+
+
+@pytest.fixture
+def http_get(monkeypatch):
+    """Replace requests.get with a stub answering from ``http_get.responses``."""
+
+    def get(url, headers=None, timeout=None, **kwargs):
+        get.calls.append((url, headers))
+        return get.responses.pop(0)
+
+    get.calls = []
+    get.responses = []
+    monkeypatch.setattr(sources_module.requests, "get", get)
+    return get
+
+
+LISTING = b'<html><body><a href="ipg200107.zip">ipg200107.zip</a></body></html>'
+
+
+def test_http_listing_revalidates_with_the_stored_etag(http_get):
+    source = HttpSource("https://example.test/{kind}/{year}/")
+    http_get.responses = [
+        FakeResponse(200, LISTING, {"ETag": '"v1"', "Last-Modified": "Tue"}),
+        FakeResponse(304),
+        FakeResponse(200, LISTING, {"ETag": '"v2"'}),
+    ]
+
+    entries, validators = source.list_entries(2020, "grant")
+    assert [entry.file_name for entry in entries] == ["ipg200107.zip"]
+    assert validators == {"etag": '"v1"', "last_modified": "Tue"}
+    assert http_get.calls[0] == ("https://example.test/grant/2020/", {})
+
+    # Unchanged: the stored validators are sent and the listing isn't parsed
+    assert source.list_entries(2020, "grant", validators) == (None, validators)
+    assert http_get.calls[1][1] == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Tue",
+    }
+
+    # Changed: the new ETag replaces the stored one
+    entries, validators = source.list_entries(2020, "grant", validators)
+    assert [entry.file_name for entry in entries] == ["ipg200107.zip"]
+    assert validators == {"etag": '"v2"', "last_modified": None}
+
+
+def test_cached_http_listing_keeps_entries_on_304(http_get, tmp_path):
+    http_get.responses = [
+        FakeResponse(200, LISTING, {"ETag": '"v1"'}),
+        FakeResponse(304),
+        FakeResponse(500),
+    ]
+    source = CachedListingSource(HttpSource(), str(tmp_path))
+    first = source.list_entries(2020, "grant")
+    assert source.list_entries(2020, "grant") == first
+    assert http_get.calls[1][1] == {"If-None-Match": '"v1"'}
+    with pytest.raises(sources_module.requests.HTTPError):
+        source.list_entries(2020, "grant")
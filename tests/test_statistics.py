@@ -0,0 +1,66 @@
+import pandas as pd
+
+from utilities.database_utils import statistics_frame
+from utilities.nlp_processing import tense_statistics
+from utilities.records import ExampleRecord
+
+
+def record(patent_number, tense, has_mixed=False):
+    return ExampleRecord(
+        patent_number, "1", "", "text", tense=tense, has_mixed=has_mixed
+    )
+
+
+def test_statistics_frame_from_tense_statistics():
+    records = [
+        record("1", "present"),
+        record("1", "present"),
+        record("2", "present"),
+        record("2", "past", has_mixed=True),
+        record("3", "past"),
+        record("4", "unknown"),
+    ]
+    frame = statistics_frame(tense_statistics(records))
+    assert frame.loc["1"].to_dict() == {
+        "past": 0,
+        "present": 2,
+        "unknown": 0,
+        "mixed_tense_percentage": 0.0,
+        "all_prophetic": 1,
+        "some_prophetic": 0,
+        "no_prophetic": 0,
+    }
+    assert frame.loc["2", "mixed_tense_percentage"] == 50.0
+    assert frame.loc["2", "some_prophetic"] == 1
+    assert frame.loc["3", "no_prophetic"] == 1
+    # Only unknown examples count as no prophetic ones, as before the groupby
+    assert frame.loc["4", "no_prophetic"] == 1
+
+
+def test_statistics_frame_from_legacy_dict():
+    frame = statistics_frame(
+        {
+            "5": {
+                "past": 1,
+                "present": 3,
+                "unknown": 0,
+                "mixed_tense_percentage": "25%",
+            },
+            "6": {"past": 2, "present": 0, "unknown": 1},
+            "7": "invalid",
+        }
+    )
+    assert list(frame.index) == ["5", "6"]
+    assert frame["mixed_tense_percentage"].tolist() == [25.0, 0.0]
+    assert frame["some_prophetic"].tolist() == [1, 0]
+    assert frame["no_prophetic"].tolist() == [0, 1]
+
+
+def test_statistics_frame_without_mixed_column():
+    stats = pd.DataFrame(
+        {"past": [1], "present": [None], "unknown": [0]}, index=pd.Index([8])
+    )
+    frame = statistics_frame(stats)
+    assert frame.index.tolist() == ["8"]
+    assert frame.loc["8", "present"] == 0
+    assert frame.loc["8", "mixed_tense_percentage"] == 0.0
@@ -0,0 +1,67 @@
+from utilities import test_dataset_utils
+from utilities.corpus import Corpus
+from utilities.test_dataset_utils import (
+    _extract_targets,
+    _init_target_worker,
+    extract_target_documents,
+)
+
+DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
+def document(number, text="text"):
+    reference = (
+        "<publication-reference><document-id>"
+        f"<doc-number>{number}</doc-number></document-id></publication-reference>"
+        if number
+        else ""
+    )
+    return f"{DECLARATION}<us-patent-grant>{reference}<p>{text}</p></us-patent-grant>\n"
+
+
+def write_week(path, *documents):
+    path.write_text("".join(documents))
+    return str(path)
+
+
+def test_extract_targets_keeps_the_longest_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(test_dataset_utils, "_target_doc_numbers", frozenset())
+    file_path = write_week(
+        tmp_path / "ipg200107.xml",
+        document("07000001"),
+        document(None),
+        document("07000002"),
+        document("07000001", "a longer version"),
+    )
+    _init_target_worker({"7000001", "9999999"})
+    assert _extract_targets(file_path) == [
+        ("7000001", document("07000001", "a longer version").encode())
+    ]
+    assert _extract_targets(write_week(tmp_path / "empty.xml")) == []
+
+
+def test_extract_target_documents_writes_a_corpus(tmp_path):
+    xml_dir = tmp_path / "xml"
+    xml_dir.mkdir()
+    write_week(xml_dir / "ipg200107.xml", document("07000001"), document(None))
+    write_week(xml_dir / "ipg200114.xml", document("07000002"), document("07000003"))
+    output_path = str(tmp_path / "test_dataset_2020.corpus")
+    messages = []
+
+    found = extract_target_documents(
+        str(xml_dir),
+        ["7000001", "7000003", "7999999"],
+        output_path,
+        max_workers=1,
+        callback=messages.append,
+        metadata={"year": 2020},
+    )
+
+    assert found == {"7000001": "ipg200107.xml", "7000003": "ipg200114.xml"}
+    assert messages[-1] == "Found 2 out of 3 documents"
+    with Corpus(output_path) as corpus:
+        assert corpus.metadata == {"year": "2020"}
+        assert dict(corpus) == {
+            "7000001": document("07000001"),
+            "7000003": document("07000003"),
+        }
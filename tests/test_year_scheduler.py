@@ -0,0 +1,117 @@
+import threading
+import time
+
+from utilities.year_scheduler import YearPipelineScheduler
+
+
+class Recorder:
+    """Stage functions that log start/end and track concurrency per stage."""
+
+    def __init__(self, delay=0.02, fail=(), on_start=None):
+        self.delay = delay
+        self.fail = set(fail)
+        self.on_start = on_start
+        self.started = []
+        self.running = {}
+        self.peak = {}
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        def run(year, stop_event):
+            with self.lock:
+                self.started.append((year, name))
+                self.running[name] = self.running.get(name, 0) + 1
+                self.peak[name] = max(self.peak.get(name, 0), self.running[name])
+            if self.on_start:
+                self.on_start(year, name, stop_event)
+            time.sleep(self.delay)
+            with self.lock:
+                self.running[name] -= 1
+            if (year, name) in self.fail:
+                raise RuntimeError("boom")
+            return True
+
+        return run
+
+    def scheduler(self, stages=("download", "unzip", "process"), **kwargs):
+        scheduler = YearPipelineScheduler(**kwargs)
+        for name in stages:
+            scheduler.add_stage(name, self.stage(name))
+        return scheduler
+
+
+def test_stages_run_in_order_across_years():
+    recorder = Recorder()
+    results = recorder.scheduler().run([2018, 2019, 2020])
+    assert results == {2018: True, 2019: True, 2020: True}
+
+    for year in (2018, 2019, 2020):
+        assert [name for y, name in recorder.started if y == year] == [
+            "download",
+            "unzip",
+            "process",
+        ]
+    for name in ("download", "unzip", "process"):
+        assert [y for y, n in recorder.started if n == name] == [2018, 2019, 2020]
+    # Pipelined: a later year downloads before the first one is processed
+    assert recorder.started.index((2019, "download")) < recorder.started.index(
+        (2018, "process")
+    )
+
+
+def test_per_stage_concurrency_limits():
+    recorder = Recorder(delay=0.05)
+    scheduler = recorder.scheduler(
+        stages=("download", "process"),
+        stage_limits={"download": 3, "process": 2},
+    )
+    assert all(scheduler.run(range(2015, 2021)).values())
+    assert recorder.peak == {"download": 3, "process": 2}
+
+
+def test_worker_budget_is_shared_between_stages():
+    recorder = Recorder(delay=0.05)
+    scheduler = YearPipelineScheduler(
+        stage_limits={"download": 4, "process": 4}, worker_budget=3
+    )
+    scheduler.add_stage("download", recorder.stage("download"), workers=1)
+    scheduler.add_stage("process", recorder.stage("process"), workers=3)
+    assert all(scheduler.run(range(2017, 2021)).values())
+    # A running process stage takes the whole budget
+    assert recorder.peak["process"] == 1
+
+
+def test_a_failed_year_does_not_block_later_years():
+    messages = []
+    recorder = Recorder(fail={(2019, "download")})
+    results = recorder.scheduler(callback=messages.append).run([2018, 2019, 2020])
+
+    assert results == {2018: True, 2019: False, 2020: True}
+    assert [name for year, name in recorder.started if year == 2019] == ["download"]
+    assert [name for year, name in recorder.started if year == 2020] == [
+        "download",
+        "unzip",
+        "process",
+    ]
+    assert "[2019] Error during download: boom" in messages
+
+
+def test_stop_event_drains_cleanly():
+    stop_event = threading.Event()
+    seen = []
+
+    def stop_during_first_unzip(year, name, event):
+        seen.append(event)
+        if (year, name) == (2018, "unzip"):
+            event.set()
+
+    recorder = Recorder(on_start=stop_during_first_unzip)
+    scheduler = recorder.scheduler(stop_event=stop_event)
+    results = scheduler.run([2018, 2019, 2020])
+
+    # The running stage finishes; nothing new starts afterwards
+    assert results == {2018: False, 2019: False, 2020: False}
+    assert (2018, "process") not in recorder.started
+    assert all(name == "download" for year, name in recorder.started if year != 2018)
+    assert all(event is stop_event for event in seen)
+    assert recorder.running == {"download": 0, "unzip": 0}